@@ -0,0 +1,377 @@
+"""Browserless low-fidelity previews of Excalidraw scenes (PNG or SVG).
+
+Draws the common element types (rectangle, ellipse, diamond, arrow/line,
+text, freedraw, plus placeholders for images and frames) straight from the
+scene JSON, framed with ``compute_bounding_box``. There is no browser, font
+rasterizer or third-party dependency: PNG text is drawn as bars and the
+hand-drawn style is flattened to clean strokes. Use it for thumbnails and
+PR previews; final output should still go through render_excalidraw.py.
+
+Usage:
+    python excalidraw_preview.py diagram.excalidraw                 # diagram.preview.png
+    python excalidraw_preview.py docs/**/*.excalidraw --output-dir thumbs/ --width 240
+    python excalidraw_preview.py diagram.excalidraw --format svg -o preview.svg
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import struct
+import sys
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from render_excalidraw import SceneRenderError, compute_bounding_box, load_valid_scene
+
+# Margin around the bounding box, in scene units
+PADDING = 20
+DEFAULT_STROKE = "#1e1e1e"
+DEFAULT_BACKGROUND = "#ffffff"
+
+# Excalidraw's default arrowhead size and spread, in scene units / radians
+ARROWHEAD_LENGTH = 15
+ARROWHEAD_ANGLE = math.radians(25)
+
+Color = tuple[int, int, int]
+Point = tuple[float, float]
+
+
+@dataclass
+class Shape:
+    """A filled and/or stroked polygon or polyline in scene coordinates."""
+
+    points: list[Point]
+    closed: bool = True
+    fill: str | None = None
+    stroke: str | None = DEFAULT_STROKE
+    stroke_width: float = 1.0
+    opacity: float = 1.0
+
+
+@dataclass
+class TextBox:
+    """A block of text in scene coordinates (top-left anchored)."""
+
+    x: float
+    y: float
+    width: float
+    lines: list[str] = field(default_factory=list)
+    font_size: float = 20.0
+    color: str = DEFAULT_STROKE
+    align: str = "left"
+    opacity: float = 1.0
+
+
+def parse_color(value: str | None) -> Color | None:
+    """Parse "#rgb" / "#rrggbb" (alpha ignored). Returns None for transparent or unknown."""
+    if not value or not value.startswith("#"):
+        return None
+    digits = value[1:]
+    if len(digits) in (3, 4):
+        digits = "".join(c * 2 for c in digits[:3])
+    try:
+        return (int(digits[0:2], 16), int(digits[2:4], 16), int(digits[4:6], 16))
+    except ValueError:
+        return None
+
+
+def _rotate(points: list[Point], cx: float, cy: float, angle: float) -> list[Point]:
+    if not angle:
+        return points
+    cos_a, sin_a = math.cos(angle), math.sin(angle)
+    return [(cx + (px - cx) * cos_a - (py - cy) * sin_a, cy + (px - cx) * sin_a + (py - cy) * cos_a) for px, py in points]
+
+
+def _ellipse(x: float, y: float, w: float, h: float, segments: int = 32) -> list[Point]:
+    cx, cy, rx, ry = x + w / 2, y + h / 2, abs(w) / 2, abs(h) / 2
+    return [(cx + rx * math.cos(2 * math.pi * i / segments), cy + ry * math.sin(2 * math.pi * i / segments)) for i in range(segments)]
+
+
+def _arrowhead(tip: Point, tail: Point) -> list[Point]:
+    dx, dy = tip[0] - tail[0], tip[1] - tail[1]
+    length = math.hypot(dx, dy)
+    if not length:
+        return []
+    size = min(ARROWHEAD_LENGTH, length / 2)
+    base = math.atan2(dy, dx) + math.pi
+    wing = [(tip[0] + size * math.cos(base + s * ARROWHEAD_ANGLE), tip[1] + size * math.sin(base + s * ARROWHEAD_ANGLE)) for s in (-1, 1)]
+    return [wing[0], tip, wing[1]]
+
+
+def scene_shapes(elements: list[dict]) -> list[Shape | TextBox]:
+    """Translate scene elements into drawable shapes, in z-order."""
+    shapes: list[Shape | TextBox] = []
+    for el in elements:
+        if el.get("isDeleted"):
+            continue
+        kind = el.get("type")
+        x, y = el.get("x", 0), el.get("y", 0)
+        w, h = el.get("width", 0), el.get("height", 0)
+        cx, cy = x + w / 2, y + h / 2
+        angle = el.get("angle", 0) or 0
+        opacity = (el.get("opacity", 100) or 0) / 100
+        stroke = el.get("strokeColor") or DEFAULT_STROKE
+        stroke_width = el.get("strokeWidth", 1) or 1
+        fill = el.get("backgroundColor")
+        style = {"stroke": stroke, "stroke_width": stroke_width, "opacity": opacity}
+
+        if kind in ("rectangle", "diamond", "ellipse", "image", "frame", "magicframe", "embeddable", "iframe"):
+            if kind == "ellipse":
+                outline = _ellipse(x, y, w, h)
+            elif kind == "diamond":
+                outline = [(cx, y), (x + w, cy), (cx, y + h), (x, cy)]
+            else:
+                outline = [(x, y), (x + w, y), (x + w, y + h), (x, y + h)]
+            if kind in ("image", "embeddable", "iframe"):
+                # Placeholder: the payload lives in ``files`` and is never decoded here
+                style = {"stroke": "#adb5bd", "stroke_width": 1, "opacity": opacity}
+                fill = "#e9ecef"
+            elif kind in ("frame", "magicframe"):
+                style = {"stroke": "#bbbbbb", "stroke_width": 1, "opacity": opacity}
+                fill = None
+            shapes.append(Shape(_rotate(outline, cx, cy, angle), fill=fill, **style))
+
+        elif kind in ("arrow", "line", "freedraw"):
+            points = [(x + px, y + py) for px, py in el.get("points") or []]
+            if len(points) < 2:
+                continue
+            points = _rotate(points, cx, cy, angle)
+            closed = kind == "line" and points[0] == points[-1] and fill not in (None, "transparent")
+            shapes.append(Shape(points, closed=closed, fill=fill if closed else None, **style))
+            if kind == "arrow":
+                if el.get("endArrowhead", "arrow"):
+                    shapes.append(Shape(_arrowhead(points[-1], points[-2]), closed=False, **style))
+                if el.get("startArrowhead"):
+                    shapes.append(Shape(_arrowhead(points[0], points[1]), closed=False, **style))
+
+        elif kind == "text":
+            shapes.append(TextBox(
+                x, y, w,
+                lines=str(el.get("text", "")).split("\n"),
+                font_size=el.get("fontSize", 20) or 20,
+                color=stroke,
+                align=el.get("textAlign", "left"),
+                opacity=opacity,
+            ))
+    return shapes
+
+
+def _frame(elements: list[dict], width: int) -> tuple[float, float, float, int, int]:
+    """Return (origin_x, origin_y, scale, width_px, height_px) fitting the scene into ``width``."""
+    min_x, min_y, max_x, max_y = compute_bounding_box(elements)
+    min_x, min_y = min_x - PADDING, min_y - PADDING
+    scene_w = max(max_x + PADDING - min_x, 1)
+    scene_h = max(max_y + PADDING - min_y, 1)
+    scale = width / scene_w
+    return min_x, min_y, scale, width, max(1, math.ceil(scene_h * scale))
+
+
+# ---------------------------------------------------------------------------
+# SVG backend
+# ---------------------------------------------------------------------------
+
+
+def preview_svg(data: dict, width: int = 320) -> str:
+    """Render a scene to a standalone SVG preview string."""
+    elements = data.get("elements", [])
+    origin_x, origin_y, scale, width_px, height_px = _frame(elements, width)
+    background = (data.get("appState") or {}).get("viewBackgroundColor") or DEFAULT_BACKGROUND
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width_px}" height="{height_px}" '
+        f'viewBox="{origin_x:.1f} {origin_y:.1f} {width_px / scale:.1f} {height_px / scale:.1f}">',
+        f'<rect x="{origin_x:.1f}" y="{origin_y:.1f}" width="100%" height="100%" fill="{escape(background)}"/>',
+    ]
+    for shape in scene_shapes(elements):
+        if isinstance(shape, TextBox):
+            anchor = {"center": "middle", "right": "end"}.get(shape.align, "start")
+            tx = shape.x + {"middle": shape.width / 2, "end": shape.width}.get(anchor, 0)
+            for i, line in enumerate(shape.lines):
+                parts.append(
+                    f'<text x="{tx:.1f}" y="{shape.y + (i + 0.8) * shape.font_size * 1.25:.1f}" '
+                    f'font-family="sans-serif" font-size="{shape.font_size:.1f}" text-anchor="{anchor}" '
+                    f'fill="{escape(shape.color)}" opacity="{shape.opacity:g}">{escape(line)}</text>'
+                )
+            continue
+        coords = " ".join(f"{px:.1f},{py:.1f}" for px, py in shape.points)
+        tag = "polygon" if shape.closed else "polyline"
+        fill = shape.fill if shape.closed and parse_color(shape.fill) else "none"
+        stroke = shape.stroke if parse_color(shape.stroke) else "none"
+        parts.append(
+            f'<{tag} points="{coords}" fill="{escape(fill)}" stroke="{escape(stroke)}" '
+            f'stroke-width="{shape.stroke_width:g}" stroke-linejoin="round" stroke-linecap="round" '
+            f'opacity="{shape.opacity:g}"/>'
+        )
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+# ---------------------------------------------------------------------------
+# PNG backend
+# ---------------------------------------------------------------------------
+
+
+class _Canvas:
+    """An opaque RGB raster with span fills; opacity is pre-mixed against the background."""
+
+    def __init__(self, width: int, height: int, background: Color) -> None:
+        self.width = width
+        self.height = height
+        self.background = background
+        self.pixels = bytearray(bytes(background) * (width * height))
+
+    def mix(self, color: Color, opacity: float) -> bytes:
+        if opacity >= 1:
+            return bytes(color)
+        return bytes(round(c * opacity + b * (1 - opacity)) for c, b in zip(color, self.background))
+
+    def span(self, y: int, x0: int, x1: int, rgb: bytes) -> None:
+        if y < 0 or y >= self.height:
+            return
+        x0, x1 = max(x0, 0), min(x1, self.width)
+        if x1 > x0:
+            start = (y * self.width + x0) * 3
+            self.pixels[start:start + (x1 - x0) * 3] = rgb * (x1 - x0)
+
+    def fill_polygon(self, points: list[Point], rgb: bytes) -> None:
+        """Even-odd scanline fill."""
+        if len(points) < 3:
+            return
+        edges = list(zip(points, points[1:] + points[:1]))
+        top = max(0, math.floor(min(p[1] for p in points)))
+        bottom = min(self.height - 1, math.ceil(max(p[1] for p in points)))
+        for row in range(top, bottom + 1):
+            sy = row + 0.5
+            xs = sorted(
+                x0 + (sy - y0) * (x1 - x0) / (y1 - y0)
+                for (x0, y0), (x1, y1) in edges
+                if (y0 <= sy < y1) or (y1 <= sy < y0)
+            )
+            for left, right in zip(xs[::2], xs[1::2]):
+                self.span(row, round(left), round(right), rgb)
+
+    def stroke(self, points: list[Point], closed: bool, width: float, rgb: bytes) -> None:
+        """Stamp square pens along each segment."""
+        size = max(1, round(width))
+        half = size // 2
+        pen = rgb * size
+        row_bytes = self.width * 3
+        pixels = self.pixels
+        segments = list(zip(points, points[1:] + (points[:1] if closed else [])))
+        for (x0, y0), (x1, y1) in segments:
+            steps = max(1, math.ceil(max(abs(x1 - x0), abs(y1 - y0))))
+            dx, dy = (x1 - x0) / steps, (y1 - y0) / steps
+            last = None
+            for i in range(steps + 1):
+                px = int(x0 + dx * i + 0.5) - half
+                py = int(y0 + dy * i + 0.5) - half
+                if (px, py) == last:
+                    continue
+                last = (px, py)
+                if 0 <= px and px + size <= self.width and 0 <= py and py + size <= self.height:
+                    start = py * row_bytes + px * 3
+                    for _ in range(size):
+                        pixels[start:start + size * 3] = pen
+                        start += row_bytes
+                else:
+                    for row in range(py, py + size):
+                        self.span(row, px, px + size, rgb)
+
+    def encode_png(self) -> bytes:
+        stride = self.width * 3
+        raw = b"".join(b"\x00" + bytes(self.pixels[y * stride:(y + 1) * stride]) for y in range(self.height))
+
+        def chunk(tag: bytes, body: bytes) -> bytes:
+            return struct.pack(">I", len(body)) + tag + body + struct.pack(">I", zlib.crc32(tag + body))
+
+        header = struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)
+        return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+
+
+def preview_png(data: dict, width: int = 320) -> bytes:
+    """Render a scene to PNG bytes. Text is drawn as bars, one per line."""
+    elements = data.get("elements", [])
+    origin_x, origin_y, scale, width_px, height_px = _frame(elements, width)
+    background = parse_color((data.get("appState") or {}).get("viewBackgroundColor")) or parse_color(DEFAULT_BACKGROUND)
+    canvas = _Canvas(width_px, height_px, background)
+
+    def to_px(points: list[Point]) -> list[Point]:
+        return [((px - origin_x) * scale, (py - origin_y) * scale) for px, py in points]
+
+    for shape in scene_shapes(elements):
+        if isinstance(shape, TextBox):
+            color = parse_color(shape.color) or parse_color(DEFAULT_STROKE)
+            # Lighter than the real glyphs so bars read as text, not as solid blocks
+            rgb = canvas.mix(color, shape.opacity * 0.6)
+            line_height = shape.font_size * 1.25
+            for i, line in enumerate(shape.lines):
+                if not line.strip():
+                    continue
+                bar_w = min(len(line) * shape.font_size * 0.55, shape.width or len(line) * shape.font_size * 0.55)
+                left = shape.x + {"center": (shape.width - bar_w) / 2, "right": shape.width - bar_w}.get(shape.align, 0)
+                top = shape.y + i * line_height + line_height * 0.25
+                bar = [(left, top), (left + bar_w, top), (left + bar_w, top + line_height * 0.5), (left, top + line_height * 0.5)]
+                canvas.fill_polygon(to_px(bar), rgb)
+            continue
+
+        points = to_px(shape.points)
+        fill = parse_color(shape.fill) if shape.closed else None
+        if fill is not None:
+            canvas.fill_polygon(points, canvas.mix(fill, shape.opacity))
+        stroke = parse_color(shape.stroke)
+        if stroke is not None:
+            canvas.stroke(points, shape.closed, shape.stroke_width * scale, canvas.mix(stroke, shape.opacity))
+
+    return canvas.encode_png()
+
+
+def write_preview(excalidraw_path: Path, output_path: Path, width: int = 320) -> Path:
+    """Write a PNG or SVG preview (chosen by ``output_path``'s suffix). Returns the output path.
+
+    Raises SceneRenderError for an unreadable or invalid scene.
+    """
+    data = load_valid_scene(excalidraw_path)
+    if output_path.suffix == ".svg":
+        output_path.write_text(preview_svg(data, width), encoding="utf-8")
+    else:
+        output_path.write_bytes(preview_png(data, width))
+    return output_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Render fast, browserless previews of Excalidraw scenes")
+    parser.add_argument("input", type=Path, nargs="+", help="Path(s) to .excalidraw JSON files")
+    parser.add_argument("--output", "-o", type=Path, default=None, help="Output path for a single input (default: <name>.preview.<format>)")
+    parser.add_argument("--output-dir", type=Path, default=None, help="Directory for previews (default: next to each input)")
+    parser.add_argument("--format", "-f", choices=("png", "svg"), default="png", help="Preview format (default: png)")
+    parser.add_argument("--width", "-w", type=int, default=320, help="Preview width in pixels (default: 320)")
+    args = parser.parse_args()
+
+    if args.width < 1:
+        parser.error("--width must be at least 1")
+    if args.output is not None and len(args.input) > 1:
+        parser.error("--output takes a single input; use --output-dir")
+    if args.output_dir is not None:
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    for path in args.input:
+        if not path.exists():
+            print(f"ERROR: File not found: {path}", file=sys.stderr)
+            sys.exit(1)
+        output = args.output or (args.output_dir or path.parent) / f"{path.stem}.preview.{args.format}"
+        try:
+            print(str(write_preview(path, output, args.width)))
+        except SceneRenderError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            sys.exit(1)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"{len(args.input)} preview(s) in {elapsed_ms:.0f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
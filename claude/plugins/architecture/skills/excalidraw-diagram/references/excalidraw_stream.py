@@ -0,0 +1,204 @@
+"""Incremental reader for very large .excalidraw files.
+
+Scenes with embedded images keep megabytes of base64 in the top-level
+``files`` object. ``load_scene_skeleton`` reads the file in chunks, decodes
+``elements`` one element at a time and skips ``files`` without building
+it, so peak memory follows the element metadata rather than the image
+payload. The result is a normal scene dict (minus the skipped keys) that
+``validate_excalidraw`` and ``compute_bounding_box`` accept unchanged.
+
+Usage:
+    from excalidraw_stream import load_scene_skeleton
+
+    scene, skipped = load_scene_skeleton(Path("big.excalidraw"))
+    # scene["elements"] is fully parsed, skipped == {"files": <entry count>}
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from pathlib import Path
+from typing import TextIO
+
+# Next character that matters outside a JSON string
+_STRUCTURAL = re.compile(r'[\[\]{},"]')
+_WHITESPACE = " \t\r\n"
+_SCALAR_END = re.compile(r"[,\]}\s]")
+
+
+class _ChunkReader:
+    """A sliding window over a text stream, refilled on demand."""
+
+    def __init__(self, stream: TextIO, chunk_size: int) -> None:
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, min_chunk: int | None = None) -> bool:
+        """Drop consumed text and append the next chunk. Returns False at EOF."""
+        if self.eof:
+            return False
+        chunk = self.stream.read(max(self.chunk_size, min_chunk or 0))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.buf, min(self.pos, len(self.buf)))
+
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it ("" at EOF)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise self.error(f"Expected '{char}'")
+        self.pos += 1
+
+    def decode(self, decoder: json.JSONDecoder) -> object:
+        """Decode one complete JSON value, reading more input while it is truncated."""
+        first = self.peek()
+        grow = self.chunk_size
+        if first not in "{[\"":
+            # Bare scalars (numbers, literals) may continue into the next chunk
+            while _SCALAR_END.search(self.buf, self.pos) is None and self.fill(grow):
+                pass
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill(grow):
+                    raise
+                grow *= 2
+                continue
+            self.pos = end
+            return value
+
+    def skip_value(self) -> int:
+        """Skip one JSON value without building it. Returns the entry count of objects/arrays."""
+        first = self.peek()
+        if first not in "{[\"":
+            # Scalar: small by definition, decoding it is cheapest
+            self.decode(json.JSONDecoder())
+            return 0
+
+        depth = 0
+        entries = 0
+        in_string = False
+        while True:
+            if in_string:
+                # str.find runs at memchr speed over multi-megabyte base64 payloads
+                quote = self.buf.find('"', self.pos)
+                if quote < 0:
+                    # Keep a trailing run of backslashes so escapes stay decidable
+                    self.pos = len(self.buf.rstrip("\\"))
+                    if not self.fill():
+                        raise self.error("Unterminated string")
+                    continue
+                backslashes = 0
+                while quote > backslashes and self.buf[quote - 1 - backslashes] == "\\":
+                    backslashes += 1
+                self.pos = quote + 1
+                if backslashes % 2:
+                    continue
+                in_string = False
+                if depth == 0:
+                    return entries
+                continue
+
+            match = _STRUCTURAL.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self.fill():
+                    raise self.error("Unexpected end of file")
+                continue
+
+            char = match.group()
+            self.pos = match.end()
+            if depth == 1 and char == ",":
+                entries += 1
+            if char == '"':
+                in_string = True
+            elif char in "{[":
+                depth += 1
+                # The first entry may be a scalar, which has no structural character
+                if depth == 1 and self.peek() not in ("]", "}", ""):
+                    entries = 1
+            elif char in "]}":
+                depth -= 1
+                if depth == 0:
+                    return entries
+
+
+def load_scene_skeleton(
+    path: Path,
+    skip_keys: tuple[str, ...] = ("files",),
+    chunk_size: int = 1 << 20,
+) -> tuple[dict, dict[str, int]]:
+    """Stream-parse an .excalidraw file, skipping heavy top-level keys.
+
+    Returns (scene, skipped) where ``scene`` holds every other top-level key
+    fully parsed (``elements`` decoded element by element) and ``skipped``
+    maps each skipped key to its number of entries. Raises
+    json.JSONDecodeError on malformed input.
+    """
+    decoder = json.JSONDecoder()
+    scene: dict = {}
+    skipped: dict[str, int] = {}
+
+    with path.open("r", encoding="utf-8") as stream:
+        reader = _ChunkReader(stream, chunk_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return scene, skipped
+
+        while True:
+            key = reader.decode(decoder)
+            if not isinstance(key, str):
+                raise reader.error("Expected object key")
+            reader.expect(":")
+
+            if key in skip_keys:
+                skipped[key] = reader.skip_value()
+            elif key == "elements" and reader.peek() == "[":
+                scene[key] = _read_array(reader, decoder)
+            else:
+                scene[key] = reader.decode(decoder)
+
+            separator = reader.peek()
+            reader.pos += 1
+            if separator == "}":
+                break
+            if separator != ",":
+                raise reader.error("Expected ',' or '}'")
+
+    return scene, skipped
+
+
+def _read_array(reader: _ChunkReader, decoder: json.JSONDecoder) -> list:
+    """Decode a JSON array item by item so it never needs to fit one window."""
+    reader.expect("[")
+    items: list = []
+    if reader.peek() == "]":
+        reader.pos += 1
+        return items
+    while True:
+        items.append(reader.decode(decoder))
+        separator = reader.peek()
+        reader.pos += 1
+        if separator == "]":
+            return items
+        if separator != ",":
+            raise reader.error("Expected ',' or ']'")
@@ -1,9 +1,38 @@
 """Render Excalidraw JSON to PNG using Playwright + headless Chromium.
 
+When the Mermaid skill is installed alongside this one, rendering goes through
+its shared render engine (mermaid/scripts/render_engine.py), so Excalidraw and
+Mermaid diagrams share one warm browser within a process, and PNGs are
+only re-rendered when the scene changed in a way that can show: edits that
+only touch ``updated``/``versionNonce``, element order or editor state keep
+the image (see mermaid/scripts/diagram_canonical.py). From the command
+line, a re-rendered PNG that looks the same as the existing one is not
+written either (see mermaid/scripts/visual_diff.py; --diff-dir for heatmaps
+of the images that did change).
+
 Usage:
     cd .claude/skills/excalidraw-diagram/references
     uv run python render_excalidraw.py <path-to-file.excalidraw> [--output path.png] [--scale 2] [--width 1920]
 
+    # Per-phase timing breakdown (JSON on stderr) and a Chrome trace
+    uv run python render_excalidraw.py diagram.excalidraw --profile --trace-events trace.json
+
+    # Capture the SVG element instead of Excalidraw's canvas export
+    uv run python render_excalidraw.py diagram.excalidraw --raster screenshot
+
+    # One PNG per frame, or every frame of several scenes in one multi-page PDF
+    uv run python render_excalidraw.py deck.excalidraw --frames --output-dir figures/
+    uv run python render_excalidraw.py a.excalidraw b.excalidraw --frames --pdf figures.pdf
+
+    # Stream-parse a scene with large embedded images (automatic above 32 MB)
+    uv run python render_excalidraw.py big.excalidraw --stream
+
+    # Second of four CI shards of a scene batch, with a mergeable report
+    uv run python render_excalidraw.py scenes/*.excalidraw --output-dir out/ --shard 2/4 --report shard-2.json
+
+    # Recompress the PNGs after rendering and add WebP copies (mermaid/scripts/image_optimize.py)
+    uv run python render_excalidraw.py deck.excalidraw --frames --output-dir figures/ --optimize --webp
+
 First-time setup:
     cd .claude/skills/excalidraw-diagram/references
     uv sync
@@ -13,10 +42,69 @@ First-time setup:
 from __future__ import annotations
 
 import argparse
+import asyncio
+import base64
+import contextvars
 import json
+import os
+import re
 import sys
+import time
 from pathlib import Path
 
+from excalidraw_stream import load_scene_skeleton
+
+# Shared tooling lives alongside the Mermaid skill scripts in this plugin
+_SHARED_SCRIPTS = Path(__file__).resolve().parents[2] / "mermaid" / "scripts"
+if _SHARED_SCRIPTS.is_dir() and str(_SHARED_SCRIPTS) not in sys.path:
+    sys.path.append(str(_SHARED_SCRIPTS))
+
+try:
+    from diagram_trace import add_profile_arguments, configure_profiling, tracer
+except ImportError:  # skill installed on its own: profiling becomes a no-op
+    from contextlib import nullcontext
+
+    class _NoTracer:
+        def span(self, name: str, **args: object) -> nullcontext:
+            return nullcontext()
+
+        def diagram(self, label: str) -> nullcontext:
+            return nullcontext()
+
+    tracer = _NoTracer()
+
+    def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+        pass
+
+    def configure_profiling(args: argparse.Namespace) -> None:
+        pass
+
+try:
+    import render_engine
+except ImportError:  # skill installed on its own: launch a dedicated browser per render
+    render_engine = None
+
+try:
+    import diagram_shards
+except ImportError:  # skill installed on its own: no --shard/--report
+    diagram_shards = None
+
+try:
+    from diagram_canonical import excalidraw_key
+    from resilient_diagram import ArtifactWriter
+except ImportError:  # skill installed on its own: every run renders
+    ArtifactWriter = None
+
+try:
+    import image_optimize
+except ImportError:  # skill installed on its own: no --optimize
+    image_optimize = None
+
+try:
+    from visual_diff import VisualGate, add_visual_diff_arguments, visual_gate_from_args
+except ImportError:  # skill installed on its own: existing PNGs are always overwritten
+    VisualGate = None
+
 
 def validate_excalidraw(data: dict) -> list[str]:
     """Validate Excalidraw JSON structure. Returns list of errors (empty = valid)."""
@@ -69,120 +157,578 @@ def compute_bounding_box(elements: list[dict]) -> tuple[float, float, float, flo
     return (min_x, min_y, max_x, max_y)
 
 
+# Files larger than this are stream-parsed so the ``files`` blob never lands in memory
+STREAM_THRESHOLD_BYTES = 32 * 1024 * 1024
+
+PLAYWRIGHT_SETUP = "cd .claude/skills/excalidraw-diagram/references && uv sync && uv run playwright install chromium"
+CHROMIUM_SETUP = "cd .claude/skills/excalidraw-diagram/references && uv run playwright install chromium"
+
+
+class SceneRenderError(Exception):
+    """A scene could not be loaded or rendered; the message says why."""
+
+
+def load_scene(excalidraw_path: Path, stream: bool | None = None) -> dict:
+    """Parse a scene for validation and sizing.
+
+    With ``stream`` (default: on for files above STREAM_THRESHOLD_BYTES) the
+    file is read incrementally and the ``files`` blob is skipped, so memory
+    follows the element metadata instead of the embedded image payload.
+    Raises json.JSONDecodeError on malformed input.
+    """
+    if stream is None:
+        stream = excalidraw_path.stat().st_size > STREAM_THRESHOLD_BYTES
+
+    if stream:
+        with tracer.span("stream_parse"):
+            data, _ = load_scene_skeleton(excalidraw_path)
+        return data
+
+    with tracer.span("read_file"):
+        raw = excalidraw_path.read_text(encoding="utf-8")
+    with tracer.span("json_parse"):
+        return json.loads(raw)
+
+
+def load_valid_scene(excalidraw_path: Path, stream: bool | None = None) -> dict:
+    """Load and validate a scene. Raises SceneRenderError if it is unusable."""
+    try:
+        data = load_scene(excalidraw_path, stream)
+    except json.JSONDecodeError as e:
+        raise SceneRenderError(f"Invalid JSON in {excalidraw_path}: {e}") from e
+
+    with tracer.span("validate"):
+        errors = validate_excalidraw(data)
+    if errors:
+        raise SceneRenderError("\n".join([f"Invalid Excalidraw file {excalidraw_path}:"] + [f"  - {err}" for err in errors]))
+    return data
+
+
+def list_frames(data: dict) -> list[dict]:
+    """Frames in scene order as {"id", "name"}; unnamed frames are numbered."""
+    frames: list[dict] = []
+    for el in data.get("elements", []):
+        if el.get("type") in ("frame", "magicframe") and not el.get("isDeleted"):
+            frames.append({"id": el["id"], "name": el.get("name") or f"Frame {len(frames) + 1}"})
+    return frames
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "frame"
+
+
+# Virtual URLs the page fetches scenes from; Playwright serves the file bytes
+SCENE_BASE = "https://scene.excalidraw.invalid/"
+SCENE_URL = SCENE_BASE + "scene.json"
+
+
+def route_scene(page: object, scene_path: Path) -> None:
+    """Serve ``scene_path`` to the page at SCENE_URL straight from disk."""
+    page.route(
+        SCENE_URL,
+        lambda route: route.fulfill(
+            path=str(scene_path),
+            content_type="application/json",
+            headers={"Access-Control-Allow-Origin": "*"},
+        ),
+    )
+
+
 def render(
     excalidraw_path: Path,
     output_path: Path | None = None,
     scale: int = 2,
     max_width: int = 1920,
+    stream: bool | None = None,
+    raster: str = "canvas",
+    visual_gate: VisualGate | None = None,
 ) -> Path:
-    """Render an .excalidraw file to PNG. Returns the output PNG path."""
-    # Import playwright here so validation errors show before import errors
-    try:
-        from playwright.sync_api import sync_playwright
-    except ImportError:
-        print("ERROR: playwright not installed.", file=sys.stderr)
-        print("Run: cd .claude/skills/excalidraw-diagram/references && uv sync && uv run playwright install chromium", file=sys.stderr)
-        sys.exit(1)
+    """Render an .excalidraw file to PNG. Returns the output PNG path.
 
-    # Read and validate
-    raw = excalidraw_path.read_text(encoding="utf-8")
-    try:
-        data = json.loads(raw)
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Invalid JSON in {excalidraw_path}: {e}", file=sys.stderr)
-        sys.exit(1)
+    ``raster="canvas"`` encodes the PNG in the page with Excalidraw's
+    exportToBlob at ``scale``, so the image is exactly scene-sized and no
+    viewport has to be guessed. ``raster="screenshot"`` captures the SVG
+    element from a viewport sized by compute_bounding_box. With a
+    ``visual_gate``, an existing PNG the new render does not visibly change
+    is kept as it is.
+    """
+    with tracer.diagram(excalidraw_path.name):
+        return _render(excalidraw_path, output_path, scale, max_width, stream, raster, visual_gate)
 
-    errors = validate_excalidraw(data)
-    if errors:
-        print(f"ERROR: Invalid Excalidraw file:", file=sys.stderr)
-        for err in errors:
-            print(f"  - {err}", file=sys.stderr)
-        sys.exit(1)
 
-    # Compute viewport size from element bounding box
-    elements = [e for e in data["elements"] if not e.get("isDeleted")]
-    min_x, min_y, max_x, max_y = compute_bounding_box(elements)
-    padding = 80
-    diagram_w = max_x - min_x + padding * 2
-    diagram_h = max_y - min_y + padding * 2
+async def render_async(
+    excalidraw_path: Path,
+    output_path: Path | None = None,
+    scale: int = 2,
+    stream: bool | None = None,
+    raster: str = "canvas",
+) -> Path:
+    """Async render() for event loops, on the loop's shared AsyncRenderEngine.
 
-    # Cap viewport width, let height be natural
-    vp_width = min(int(diagram_w), max_width)
-    vp_height = max(int(diagram_h), 600)
+    Raises instead of exiting: ValueError for an unreadable or invalid scene,
+    render_engine.RenderError if rendering fails. The scene is parsed in a
+    worker thread; cancelling the task abandons the render in the page.
+    """
+    if render_engine is None:
+        raise RuntimeError("render_async needs the shared render engine (mermaid/scripts/render_engine.py)")
+
+    with tracer.diagram(excalidraw_path.name):
+        try:
+            # run_in_executor rather than asyncio.to_thread (3.9+); the copied context keeps the trace label
+            data = await asyncio.get_running_loop().run_in_executor(
+                None, contextvars.copy_context().run, load_scene, excalidraw_path, stream
+            )
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON in {excalidraw_path}: {e}") from e
+        with tracer.span("validate"):
+            errors = validate_excalidraw(data)
+        if errors:
+            raise ValueError(f"Invalid Excalidraw file {excalidraw_path}: {'; '.join(errors)}")
+
+        png = await render_engine.get_async_engine().render(
+            "excalidraw", excalidraw_path, {"scale": scale, "raster": raster}
+        )
+        if output_path is None:
+            output_path = excalidraw_path.with_suffix(".png")
+        with tracer.span("write_image"):
+            output_path.write_bytes(png)
+    return output_path
+
+
+def render_key(scene_path: Path, data: dict, stream: bool | None, **options: object) -> str | None:
+    """Render-equivalence key of a scene plus render options.
+
+    None when renders cannot be skipped: without the Mermaid skill's shared
+    scripts, or for stream-parsed scenes, whose embedded files were never read.
+    """
+    if ArtifactWriter is None:
+        return None
+    if stream is None:
+        stream = scene_path.stat().st_size > STREAM_THRESHOLD_BYTES
+    if stream:
+        return None
+    return ArtifactWriter.render_key(excalidraw_key(data).encode("utf-8"), kind="excalidraw", **options)
+
+
+def _render(
+    excalidraw_path: Path,
+    output_path: Path | None,
+    scale: int,
+    max_width: int,
+    stream: bool | None,
+    raster: str,
+    visual_gate: VisualGate | None = None,
+) -> Path:
+    # Read and validate
+    data = load_valid_scene(excalidraw_path, stream)
 
     # Output path
     if output_path is None:
         output_path = excalidraw_path.with_suffix(".png")
 
+    key = render_key(excalidraw_path, data, stream, scale=scale, raster=raster,
+                     width=max_width if raster == "screenshot" else None)
+    writer = ArtifactWriter() if key else None
+    if writer is not None and writer.is_up_to_date(output_path, key):
+        return output_path
+
+    if visual_gate is not None and visual_gate.applies(output_path):
+        temp_path = ArtifactWriter.temp_path(output_path)
+        try:
+            _render_scene(excalidraw_path, data, temp_path, scale, max_width, raster)
+            visual_gate.commit(temp_path, output_path)
+        finally:
+            temp_path.unlink(missing_ok=True)
+    else:
+        output_path = _render_scene(excalidraw_path, data, output_path, scale, max_width, raster)
+    if writer is not None:
+        writer.record(output_path, key)
+    return output_path
+
+
+def _render_scene(
+    excalidraw_path: Path,
+    data: dict,
+    output_path: Path,
+    scale: int,
+    max_width: int,
+    raster: str,
+) -> Path:
+    # Import playwright here so validation errors show before import errors
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        raise SceneRenderError(f"playwright not installed.\nRun: {PLAYWRIGHT_SETUP}")
+
+    # Prefer the shared engine: one warm browser for Excalidraw and Mermaid
+    if render_engine is not None:
+        try:
+            options = {"scale": scale, "raster": raster}
+            if raster == "screenshot":
+                options["width"] = max_width
+            png = render_engine.render("excalidraw", excalidraw_path, options)
+        except render_engine.RenderError as e:
+            raise SceneRenderError(f"Render failed: {e}") from e
+        with tracer.span("write_image"):
+            output_path.write_bytes(png)
+        return output_path
+
+    if raster == "canvas":
+        # Canvas export sizes the image itself; any viewport will do
+        vp_width, vp_height, page_scale = 800, 600, 1
+    else:
+        # Compute viewport size from element bounding box
+        with tracer.span("bounding_box"):
+            elements = [e for e in data["elements"] if not e.get("isDeleted")]
+            min_x, min_y, max_x, max_y = compute_bounding_box(elements)
+        padding = 80
+        diagram_w = max_x - min_x + padding * 2
+        diagram_h = max_y - min_y + padding * 2
+
+        # Cap viewport width, let height be natural
+        vp_width = min(int(diagram_w), max_width)
+        vp_height = max(int(diagram_h), 600)
+        page_scale = scale
+
     # Template path (same directory as this script)
     template_path = Path(__file__).parent / "render_template.html"
     if not template_path.exists():
-        print(f"ERROR: Template not found at {template_path}", file=sys.stderr)
-        sys.exit(1)
+        raise SceneRenderError(f"Template not found at {template_path}")
 
     template_url = template_path.as_uri()
 
     with sync_playwright() as p:
         try:
-            browser = p.chromium.launch(headless=True)
+            with tracer.span("browser_launch"):
+                browser = p.chromium.launch(headless=True)
         except Exception as e:
             if "Executable doesn't exist" in str(e) or "browserType.launch" in str(e):
-                print("ERROR: Chromium not installed for Playwright.", file=sys.stderr)
-                print("Run: cd .claude/skills/excalidraw-diagram/references && uv run playwright install chromium", file=sys.stderr)
-                sys.exit(1)
+                raise SceneRenderError(f"Chromium not installed for Playwright.\nRun: {CHROMIUM_SETUP}")
             raise
 
-        page = browser.new_page(
-            viewport={"width": vp_width, "height": vp_height},
-            device_scale_factor=scale,
-        )
-
-        # Load the template
-        page.goto(template_url)
-
-        # Wait for the ES module to load (imports from esm.sh)
-        page.wait_for_function("window.__moduleReady === true", timeout=30000)
-
-        # Inject the diagram data and render
-        json_str = json.dumps(data)
-        result = page.evaluate(f"window.renderDiagram({json_str})")
+        with tracer.span("new_page"):
+            page = browser.new_page(
+                viewport={"width": vp_width, "height": vp_height},
+                device_scale_factor=page_scale,
+            )
+
+        # Load the template and wait for the ES module to load (imports from esm.sh)
+        with tracer.span("template_load"):
+            page.goto(template_url)
+            page.wait_for_function("window.__moduleReady === true", timeout=30000)
+
+        # Let the page fetch the raw file: no re-serialization or JS source parsing
+        route_scene(page, excalidraw_path)
+
+        if raster == "canvas":
+            with tracer.span("render", raster="canvas"):
+                result = page.evaluate(
+                    "([url, options]) => window.exportDiagramPngFromUrl(url, options)",
+                    [SCENE_URL, {"scale": scale}],
+                )
+            with tracer.span("browser_close"):
+                browser.close()
+            if not result or not result.get("success"):
+                error_msg = result.get("error", "Unknown render error") if result else "exportDiagramPng returned null"
+                raise SceneRenderError(f"Render failed: {error_msg}")
+            with tracer.span("write_image"):
+                output_path.write_bytes(base64.b64decode(result["png"]))
+            return output_path
+
+        with tracer.span("render"):
+            result = page.evaluate("url => window.renderDiagramFromUrl(url)", SCENE_URL)
 
         if not result or not result.get("success"):
             error_msg = result.get("error", "Unknown render error") if result else "renderDiagram returned null"
-            print(f"ERROR: Render failed: {error_msg}", file=sys.stderr)
             browser.close()
-            sys.exit(1)
+            raise SceneRenderError(f"Render failed: {error_msg}")
 
         # Wait for render completion signal
-        page.wait_for_function("window.__renderComplete === true", timeout=15000)
+        with tracer.span("render_complete"):
+            page.wait_for_function("window.__renderComplete === true", timeout=15000)
 
         # Screenshot the SVG element
         svg_el = page.query_selector("#root svg")
         if svg_el is None:
-            print("ERROR: No SVG element found after render.", file=sys.stderr)
             browser.close()
-            sys.exit(1)
+            raise SceneRenderError("No SVG element found after render.")
 
-        svg_el.screenshot(path=str(output_path))
-        browser.close()
+        with tracer.span("screenshot"):
+            svg_el.screenshot(path=str(output_path))
+        with tracer.span("browser_close"):
+            browser.close()
 
     return output_path
 
 
+def render_figures(
+    scene_paths: list[Path],
+    output_dir: Path | None = None,
+    per_frame: bool = False,
+    pdf_path: Path | None = None,
+    scale: int = 2,
+    stream: bool | None = None,
+    visual_gate: VisualGate | None = None,
+) -> list[Path]:
+    """Export several scenes, or every frame of them, in one browser session.
+
+    Each scene becomes one figure, or with ``per_frame`` one figure per frame
+    (scenes without frames still export whole). Figures are written as
+    ``<scene>.png`` / ``<scene>-<frame>.png`` into ``output_dir`` (default:
+    next to each scene), or with ``pdf_path`` into a single PDF with one page
+    per figure. PNGs already rendered from an equivalent scene (see
+    render_key()) are kept, and so are PNGs a re-render does not visibly
+    change when a ``visual_gate`` is given. Returns the written paths.
+    """
+    figures: list[tuple[Path, str | None]] = []
+    outputs: list[Path] = []
+    keys: list[str | None] = []
+    for scene_path in scene_paths:
+        with tracer.diagram(scene_path.name):
+            data = load_valid_scene(scene_path, stream)
+        frames = list_frames(data) if per_frame else []
+        target_dir = output_dir or scene_path.parent
+        scene_key = render_key(scene_path, data, stream, scale=scale) if pdf_path is None else None
+        if not frames:
+            figures.append((scene_path, None))
+            outputs.append(target_dir / f"{scene_path.stem}.png")
+            keys.append(scene_key)
+        for frame in frames:
+            name = f"{scene_path.stem}-{_slug(frame['name'])}"
+            while target_dir / f"{name}.png" in outputs:
+                name += f"-{frame['id'][:8]}"
+            figures.append((scene_path, frame["id"]))
+            outputs.append(target_dir / f"{name}.png")
+            keys.append(f"{scene_key}#{frame['id']}" if scene_key else None)
+
+    writer = ArtifactWriter() if any(keys) else None
+    stale = [
+        i for i, (path, key) in enumerate(zip(outputs, keys))
+        if writer is None or key is None or not writer.is_up_to_date(path, key)
+    ]
+    if pdf_path is None and not stale:
+        return outputs
+
+    if pdf_path is None:
+        figures = [figures[i] for i in stale]
+    if render_engine is not None:
+        engine = render_engine.get_engine()
+        try:
+            if pdf_path is not None:
+                images = [engine.render_figures_pdf(figures)]
+            else:
+                images = engine.render_figures(figures, {"format": "png", "scale": scale})
+        except render_engine.RenderError as e:
+            raise SceneRenderError(f"Render failed: {e}") from e
+    else:
+        images = _render_figures_standalone(figures, scale, pdf_path is not None)
+
+    if pdf_path is not None:
+        with tracer.span("write_image", count=1):
+            pdf_path.parent.mkdir(parents=True, exist_ok=True)
+            pdf_path.write_bytes(images[0])
+        return [pdf_path]
+    with tracer.span("write_image", count=len(stale)):
+        for i, image in zip(stale, images):
+            outputs[i].parent.mkdir(parents=True, exist_ok=True)
+            if visual_gate is not None:
+                visual_gate.write_bytes(outputs[i], image)
+            else:
+                outputs[i].write_bytes(image)
+            if keys[i]:
+                writer.record(outputs[i], keys[i])
+    return outputs
+
+
+def _render_figures_standalone(figures: list[tuple[Path, str | None]], scale: int, pdf: bool) -> list[bytes]:
+    """render_figures() without the shared engine: one dedicated browser and template load."""
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        raise SceneRenderError(f"playwright not installed.\nRun: {PLAYWRIGHT_SETUP}")
+
+    template_path = Path(__file__).parent / "render_template.html"
+    urls: dict[Path, str] = {}
+    specs = []
+    for scene_path, frame_id in figures:
+        url = urls.setdefault(scene_path, f"{SCENE_BASE}{len(urls)}.json")
+        specs.append({"url": url, "frameId": frame_id})
+    paths = {url: path for path, url in urls.items()}
+
+    with sync_playwright() as p:
+        try:
+            with tracer.span("browser_launch"):
+                browser = p.chromium.launch(headless=True)
+        except Exception as e:
+            if "Executable doesn't exist" in str(e) or "browserType.launch" in str(e):
+                raise SceneRenderError(f"Chromium not installed for Playwright.\nRun: {CHROMIUM_SETUP}")
+            raise
+
+        with tracer.span("new_page"):
+            page = browser.new_page()
+        with tracer.span("template_load"):
+            page.goto(template_path.as_uri())
+            page.wait_for_function("window.__moduleReady === true", timeout=30000)
+
+        page.route(
+            SCENE_BASE + "**",
+            lambda route: route.fulfill(
+                path=str(paths[route.request.url]),
+                content_type="application/json",
+                headers={"Access-Control-Allow-Origin": "*"},
+            ),
+        )
+        with tracer.span("render", figures=len(specs)):
+            result = page.evaluate(
+                "([specs, options]) => window.exportFigures(specs, options)",
+                [specs, {"format": "pdf" if pdf else "png", "scale": scale}],
+            )
+        if not result or not result.get("success"):
+            error_msg = result.get("error", "Unknown render error") if result else "exportFigures returned null"
+            browser.close()
+            raise SceneRenderError(f"Render failed: {error_msg}")
+
+        if pdf:
+            with tracer.span("pdf"):
+                images = [page.pdf(prefer_css_page_size=True, print_background=True)]
+        else:
+            images = [base64.b64decode(figure["png"]) for figure in result["figures"]]
+        with tracer.span("browser_close"):
+            browser.close()
+    return images
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Render Excalidraw JSON to PNG")
-    parser.add_argument("input", type=Path, help="Path to .excalidraw JSON file")
+    parser.add_argument("input", type=Path, nargs="+", help="Path to .excalidraw JSON file(s)")
     parser.add_argument("--output", "-o", type=Path, default=None, help="Output PNG path (default: same name with .png)")
+    parser.add_argument("--frames", action="store_true", help="Export each frame as its own figure")
+    parser.add_argument("--output-dir", type=Path, default=None, help="Directory for per-figure PNGs (default: next to each input)")
+    parser.add_argument("--pdf", type=Path, default=None, help="Write all figures into one multi-page PDF instead of PNGs")
     parser.add_argument("--scale", "-s", type=int, default=2, help="Device scale factor (default: 2)")
     parser.add_argument("--width", "-w", type=int, default=1920, help="Max viewport width (default: 1920)")
+    parser.add_argument(
+        "--stream",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="Stream-parse the scene without loading embedded files (default: auto above 32 MB)",
+    )
+    parser.add_argument(
+        "--raster",
+        choices=("canvas", "screenshot"),
+        default="canvas",
+        help="PNG path: Excalidraw canvas export or SVG element screenshot (default: canvas)",
+    )
+    if diagram_shards is not None:
+        diagram_shards.add_shard_arguments(parser)
+    if image_optimize is not None:
+        parser.add_argument("--optimize", "-O", action="store_true", help="Losslessly recompress the PNGs after rendering")
+        parser.add_argument("--quantize", action="store_true", help="With --optimize: try a 256-color palette, kept when smaller (lossy)")
+        parser.add_argument("--webp", action="store_true", help="With --optimize: also write a lossless .webp next to every PNG")
+    if VisualGate is not None:
+        add_visual_diff_arguments(parser)
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    single = len(args.input) == 1 and not (args.frames or args.pdf or args.output_dir)
+    sharded = bool(getattr(args, "shard", None) or getattr(args, "report", None))
+    if getattr(args, "shard", None) and single:
+        parser.error("--shard splits several scenes; use --output-dir to render a batch")
+    if args.output is not None and not single:
+        parser.error("--output takes a single figure; use --output-dir or --pdf")
+    if sharded and args.pdf:
+        parser.error("--shard and --report write one output per scene; they cannot be combined with --pdf")
+    configure_profiling(args)
+    visual_gate = visual_gate_from_args(args) if VisualGate is not None else None
+
+    for path in args.input:
+        if not path.exists():
+            print(f"ERROR: File not found: {path}", file=sys.stderr)
+            sys.exit(1)
 
-    if not args.input.exists():
-        print(f"ERROR: File not found: {args.input}", file=sys.stderr)
+    try:
+        _run(args, single, sharded, visual_gate)
+    except SceneRenderError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
         sys.exit(1)
 
-    png_path = render(args.input, args.output, args.scale, args.width)
-    print(str(png_path))
+
+def _run(args: argparse.Namespace, single: bool, sharded: bool, visual_gate: VisualGate | None) -> None:
+    """Render what main() validated. Raises SceneRenderError on the first failure."""
+    if single:
+        png_path = render(args.input[0], args.output, args.scale, args.width, args.stream, args.raster, visual_gate)
+        _report_visual_diff(visual_gate)
+        _optimize([png_path], args)
+        print(str(png_path))
+        return
+
+    if sharded:
+        _render_sharded(args, visual_gate)
+        _report_visual_diff(visual_gate)
+        return
+
+    paths = render_figures(args.input, args.output_dir, args.frames, args.pdf, args.scale, args.stream, visual_gate)
+    _report_visual_diff(visual_gate)
+    _optimize(paths, args)
+    for path in paths:
+        print(str(path))
+
+
+def _report_visual_diff(visual_gate: VisualGate | None) -> None:
+    if visual_gate is not None and visual_gate.summary():
+        print(visual_gate.summary(), file=sys.stderr)
+
+
+def _optimize(paths: list[Path], args: argparse.Namespace) -> None:
+    """Shrink rendered PNGs in place when --optimize/--quantize/--webp was given."""
+    if not (getattr(args, "optimize", False) or getattr(args, "quantize", False) or getattr(args, "webp", False)):
+        return
+    images = [path for path in paths if path.suffix == ".png"]
+    if not images:
+        return
+    optimizer = image_optimize.ImageOptimizer(quantize=args.quantize, webp=args.webp)
+    for warning in optimizer.warnings:
+        print(f"WARNING: {warning}", file=sys.stderr)
+    with tracer.span("optimize"):
+        results = optimizer.optimize_files(images)
+    for result in results:
+        if result.error:
+            print(f"WARNING: Not optimized: {result.path}: {result.error}", file=sys.stderr)
+    print(image_optimize.format_summary(results), file=sys.stderr)
+
+
+def _render_sharded(args: argparse.Namespace, visual_gate: VisualGate | None = None) -> None:
+    """Render this shard's scenes one by one, timing each for the report."""
+    scenes = diagram_shards.select(
+        sorted(args.input), _scene_key, args.shard, diagram_shards.load_weights(args.shard_weights)
+    )
+    if args.shard:
+        print(f"Shard {args.shard}: {len(scenes)} of {len(args.input)} scene(s)", file=sys.stderr)
+
+    report = diagram_shards.ShardReport("render_excalidraw", args.shard)
+    for scene_path in scenes:
+        start = time.perf_counter()
+        try:
+            paths = render_figures(
+                [scene_path], args.output_dir, args.frames, None, args.scale, args.stream, visual_gate
+            )
+        except SceneRenderError as e:
+            # Record the failure and carry on with the rest of the shard
+            print(f"ERROR: {e}", file=sys.stderr)
+            report.add(_scene_key(scene_path), False, (time.perf_counter() - start) * 1000, str(e))
+            continue
+        report.add(_scene_key(scene_path), True, (time.perf_counter() - start) * 1000)
+        _optimize(paths, args)
+        for path in paths:
+            print(str(path))
+
+    if args.report:
+        report.write(args.report)
+    if report.to_dict()["summary"]["failed"]:
+        sys.exit(1)
+
+
+def _scene_key(scene_path: Path) -> str:
+    return Path(os.path.relpath(scene_path)).as_posix()
 
 
 if __name__ == "__main__":
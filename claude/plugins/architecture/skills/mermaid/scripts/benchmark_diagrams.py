@@ -0,0 +1,664 @@
+#!/usr/bin/env python3
+"""
+Benchmark the diagram toolchain on synthetic corpora.
+
+Generates reproducible corpora (Mermaid diagrams with mixed types and
+preambles, Markdown documents with N Mermaid blocks, Excalidraw scenes with
+N elements) and times the hot paths of the Mermaid scripts and
+render_excalidraw.py. Rendering is replaced by local stand-ins, a stub
+``mmdc`` on PATH and an in-process fake Playwright browser, so the suite runs
+offline and measures Python overhead rather than Chromium.
+
+Usage:
+    # Run the whole suite
+    python benchmark_diagrams.py
+
+    # Bigger corpora, JSON results, compare against a saved baseline
+    python benchmark_diagrams.py --scale 5 --output results.json --baseline baseline.json
+
+    # Save the current results as the new baseline
+    python benchmark_diagrams.py --save-baseline baseline.json
+
+    # Only some benchmarks
+    python benchmark_diagrams.py --only extract,bounding_box
+
+Requirements:
+    - Python 3.7+ (stdlib only, no external dependencies)
+    - A POSIX shell for the stub mmdc
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+from typing import Callable, Dict, List, Any, Optional
+
+from resilient_diagram import DiagramType, ResilientDiagramGenerator, TroubleshootingParser
+
+EXCALIDRAW_REFERENCES = Path(__file__).resolve().parents[2] / "excalidraw-diagram" / "references"
+
+
+# Header line for each synthetic diagram type
+DIAGRAM_HEADERS = {
+    DiagramType.FLOWCHART: ['flowchart TD', 'graph LR', 'flowchart-elk TB'],
+    DiagramType.SEQUENCE: ['sequenceDiagram'],
+    DiagramType.CLASS: ['classDiagram', 'classDiagram-v2'],
+    DiagramType.STATE: ['stateDiagram-v2'],
+    DiagramType.ER: ['erDiagram'],
+    DiagramType.GANTT: ['gantt'],
+    DiagramType.PIE: ['pie title Pets'],
+    DiagramType.MINDMAP: ['mindmap'],
+    DiagramType.TIMELINE: ['timeline'],
+    DiagramType.QUADRANT: ['quadrantChart'],
+    DiagramType.REQUIREMENT: ['requirementDiagram'],
+    DiagramType.JOURNEY: ['journey'],
+    DiagramType.C4: ['C4Context', 'C4Container'],
+    DiagramType.GITGRAPH: ['gitGraph'],
+    DiagramType.SANKEY: ['sankey-beta'],
+    DiagramType.XYCHART: ['xychart-beta'],
+    DiagramType.BLOCK: ['block-beta'],
+    DiagramType.PACKET: ['packet-beta'],
+    DiagramType.KANBAN: ['kanban'],
+    DiagramType.ARCHITECTURE: ['architecture-beta'],
+}
+
+PREAMBLES = [
+    '',
+    '%% generated diagram\n',
+    '%%{init: {"theme": "dark"}}%%\n',
+    '---\ntitle: Synthetic\nconfig:\n  theme: forest\n---\n',
+    '\n\n%% leading blank lines and a comment\n',
+]
+
+# Error messages resembling mmdc output, for troubleshooting search
+SAMPLE_ERRORS = [
+    "Parse error on line {n}:\n...A --> end\n---------------^\nExpecting 'AMP', got 'end'",
+    "Syntax error in text\nmermaid version 11.4.0",
+    "Parse error on line {n}: ... got 'DEFAULT'",
+    "Lexical error on line {n}. Unrecognized text.\n...classDef myClass {{",
+    "Error: Evaluation failed: missing end for alt block at line {n}",
+    "Parse error on line {n}: Expecting 'SOLID_ARROW', got 'NEWLINE'",
+]
+
+# Stand-in for mermaid-cli: writes a tiny SVG to the -o path
+STUB_MMDC = """#!/bin/sh
+out=""
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --version) echo "stub-mmdc 0.0.0"; exit 0 ;;
+        -o) out="$2"; shift ;;
+    esac
+    shift
+done
+printf '<svg xmlns="http://www.w3.org/2000/svg"/>' > "$out"
+"""
+
+
+def generate_corpus(count: int, max_body_lines: int = 400, seed: int = 1) -> List[str]:
+    """
+    Build a reproducible list of synthetic Mermaid diagrams.
+
+    Args:
+        count: Number of diagrams to generate
+        max_body_lines: Upper bound on body lines per diagram
+        seed: Random seed for reproducibility
+
+    Returns:
+        List of Mermaid source strings
+    """
+    rng = random.Random(seed)
+    types_ = list(DIAGRAM_HEADERS)
+    corpus = []
+    for i in range(count):
+        diagram_type = rng.choice(types_)
+        header = rng.choice(DIAGRAM_HEADERS[diagram_type])
+        body_lines = rng.randint(1, max_body_lines)
+        body = '\n'.join(f'    N{i}_{n} --> N{i}_{n + 1}' for n in range(body_lines))
+        corpus.append(f'{rng.choice(PREAMBLES)}{header}\n{body}\n')
+    return corpus
+
+
+def generate_markdown(blocks: int, max_body_lines: int = 40, seed: int = 1) -> str:
+    """Build a Markdown document with ``blocks`` Mermaid code blocks between prose sections."""
+    rng = random.Random(seed)
+    parts = ['# Synthetic design document\n']
+    for i, diagram in enumerate(generate_corpus(blocks, max_body_lines, seed), start=1):
+        prose = ' '.join(rng.choice(['lorem', 'ipsum', 'dolor', 'sit', 'amet']) for _ in range(60))
+        parts.append(f'\n## Section {i}\n\n{prose}\n\n```mermaid\n{diagram}```\n')
+    return ''.join(parts)
+
+
+def generate_scene(elements: int, points: int = 8, seed: int = 1) -> Dict[str, Any]:
+    """Build an Excalidraw scene with ``elements`` shapes, text and multi-point arrows."""
+    rng = random.Random(seed)
+    scene_elements = []
+    for i in range(elements):
+        kind = rng.choice(['rectangle', 'ellipse', 'diamond', 'text', 'arrow', 'line'])
+        element = {
+            "id": f"el{i}",
+            "type": kind,
+            "x": rng.uniform(-5000, 5000),
+            "y": rng.uniform(-5000, 5000),
+            "width": rng.uniform(10, 400),
+            "height": rng.uniform(10, 300),
+            "isDeleted": rng.random() < 0.05,
+            "strokeColor": "#1e1e1e",
+            "backgroundColor": "transparent",
+        }
+        if kind in ('arrow', 'line'):
+            element["points"] = [[rng.uniform(-300, 300), rng.uniform(-300, 300)] for _ in range(points)]
+        if kind == 'text':
+            element["text"] = f"Label {i}"
+        scene_elements.append(element)
+    return {"type": "excalidraw", "version": 2, "elements": scene_elements, "appState": {}, "files": {}}
+
+
+def time_callable(func: Callable[[], Any], repeat: int, items: int) -> Dict[str, float]:
+    """
+    Time ``func`` ``repeat`` times.
+
+    Returns:
+        Dict with best/median wall time in seconds and best per-item microseconds
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    return {
+        "items": items,
+        "best_s": round(best, 6),
+        "median_s": round(statistics.median(timings), 6),
+        "per_item_us": round(best / max(items, 1) * 1e6, 3),
+    }
+
+
+# Type patterns of the split-and-loop detector that the single-pass pattern replaced
+LEGACY_DIAGRAM_TYPE_PATTERNS = {
+    DiagramType.FLOWCHART: [
+        r'^flowchart\s+(TB|TD|BT|RL|LR)',
+        r'^graph\s+(TB|TD|BT|RL|LR)',
+    ],
+    DiagramType.SEQUENCE: [r'^sequenceDiagram'],
+    DiagramType.CLASS: [r'^classDiagram'],
+    DiagramType.STATE: [r'^stateDiagram(-v2)?'],
+    DiagramType.ER: [r'^erDiagram'],
+    DiagramType.GANTT: [r'^gantt'],
+    DiagramType.PIE: [r'^pie'],
+    DiagramType.MINDMAP: [r'^mindmap'],
+    DiagramType.TIMELINE: [r'^timeline'],
+    DiagramType.QUADRANT: [r'^quadrantChart'],
+    DiagramType.REQUIREMENT: [r'^requirementDiagram'],
+    DiagramType.JOURNEY: [r'^journey'],
+    DiagramType.C4: [r'^C4Context', r'^C4Container', r'^C4Component', r'^C4Deployment'],
+}
+
+# Preambles with no diagram type after them: the single-pass pattern must
+# reject these in linear time (a line of '%' once backtracked exponentially,
+# leading whitespace quadratically)
+ADVERSARIAL_SOURCES = [
+    '%' * 18,
+    '%' * 4000,
+    '%%\n' * 2000 + 'not a diagram',
+    '%% comment %% with %% markers\n' * 500,
+    '%%{init: {"theme": "dark"}}%%' + '%' * 2000,
+    '%%{}%%' * 2000,
+    ' ' * 5000,
+    '\n' * 5000,
+    '\r\n' * 5000,
+    ' \t\r\n' * 2000 + 'not a diagram',
+    '---\r\ntitle: x\r\n---\r\n' + ' ' * 5000,
+]
+
+# Preambles the single-pass pattern must see through, CRLF line endings included
+PREAMBLE_SOURCES = [
+    ('%%{init: {}}%%\r\ngraph TD\r\n    A --> B', DiagramType.FLOWCHART),
+    ('---\r\ntitle: Flow\r\n---\r\nsequenceDiagram\r\n    A->>B: hi', DiagramType.SEQUENCE),
+    ('\r\n  %% note\r\n\r\n%%{init: {"theme": "dark"}}%%\r\nerDiagram', DiagramType.ER),
+    ('%%{init: {}}%%  classDiagram', DiagramType.CLASS),
+]
+
+
+# Sources that differ only in indentation, which is structure for these types:
+# each pair must get two different canonical keys
+INDENTED_PAIRS = [
+    ('mindmap\n  root\n    a\n      b', 'mindmap\n  root\n    a\n    b'),
+    ('kanban\n  todo\n    task\n  done', 'kanban\n  todo\n    task\n    done'),
+    ('treemap-beta\n"Root"\n    "A": 1\n    "B": 2', 'treemap-beta\n"Root"\n    "A": 1\n"B": 2'),
+    ('treemap\n"Root"\n  "Child"\n    "Leaf": 3', 'treemap\n"Root"\n  "Child"\n  "Leaf": 3'),
+]
+
+
+def legacy_detect(mermaid_code: str) -> DiagramType:
+    """The split-and-loop detector the single-pass pattern replaced, for comparison."""
+    lines = mermaid_code.strip().split('\n')
+    first_line = ""
+    for line in lines:
+        stripped = line.strip()
+        if stripped and not stripped.startswith('%%'):
+            first_line = stripped
+            break
+
+    for diagram_type, patterns in LEGACY_DIAGRAM_TYPE_PATTERNS.items():
+        for pattern in patterns:
+            if re.match(pattern, first_line, re.IGNORECASE):
+                return diagram_type
+
+    return DiagramType.UNKNOWN
+
+
+@contextlib.contextmanager
+def stub_mmdc(workdir: Path):
+    """Put a stub ``mmdc`` first on PATH for the duration of the block."""
+    bin_dir = workdir / 'bin'
+    bin_dir.mkdir(exist_ok=True)
+    stub = bin_dir / 'mmdc'
+    stub.write_text(STUB_MMDC)
+    stub.chmod(0o755)
+
+    old_path = os.environ.get('PATH', '')
+    os.environ['PATH'] = f"{bin_dir}{os.pathsep}{old_path}"
+    try:
+        yield stub
+    finally:
+        os.environ['PATH'] = old_path
+
+
+@contextlib.contextmanager
+def stub_playwright():
+    """Install a fake ``playwright.sync_api`` whose browser does no real work."""
+
+    class FakeElement:
+        def screenshot(self, path: Optional[str] = None, **kwargs) -> bytes:
+            data = b'\x89PNG\r\n\x1a\n'
+            if path:
+                Path(path).write_bytes(data)
+            return data
+
+    class FakePage:
+        viewport_size = {"width": 800, "height": 600}
+
+        def goto(self, url, **kwargs):
+            pass
+
+        def wait_for_function(self, expression, **kwargs):
+            pass
+
+        def set_viewport_size(self, size):
+            self.viewport_size = size
+
+        def route(self, url, handler):
+            pass
+
+        def unroute(self, url, handler=None):
+            pass
+
+        def evaluate(self, expression, arg=None):
+            if 'outerHTML' in expression:
+                return '<svg xmlns="http://www.w3.org/2000/svg"/>'
+            if 'exportDiagramPng' in expression:
+                return {"success": True, "png": "iVBORw0KGgo=", "width": 800, "height": 600}
+            if 'exportFigures' in expression:
+                figure = {"png": "iVBORw0KGgo=", "svg": "<svg/>", "width": 800, "height": 600}
+                return {"success": True, "figures": [figure] * len(arg[0])}
+            return {"success": True, "svg": "<svg/>", "width": 800, "height": 600}
+
+        def query_selector(self, selector):
+            return FakeElement()
+
+        def pdf(self, **kwargs) -> bytes:
+            return b'%PDF-1.4\n'
+
+        def close(self):
+            pass
+
+    class FakeBrowser:
+        def new_page(self, **kwargs):
+            return FakePage()
+
+        def close(self):
+            pass
+
+    class FakePlaywright:
+        chromium = types.SimpleNamespace(launch=lambda **kwargs: FakeBrowser())
+
+        def start(self):
+            return self
+
+        def stop(self):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    package = types.ModuleType('playwright')
+    sync_api = types.ModuleType('playwright.sync_api')
+    sync_api.sync_playwright = FakePlaywright
+    package.sync_api = sync_api
+
+    saved = {name: sys.modules.get(name) for name in ('playwright', 'playwright.sync_api')}
+    sys.modules.update({'playwright': package, 'playwright.sync_api': sync_api})
+    try:
+        yield
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+
+def import_render_excalidraw():
+    """Import render_excalidraw.py from the sibling excalidraw-diagram skill."""
+    if str(EXCALIDRAW_REFERENCES) not in sys.path:
+        sys.path.append(str(EXCALIDRAW_REFERENCES))
+    import render_excalidraw
+    return render_excalidraw
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks: each takes (args, workdir) and returns a timing dict
+# ---------------------------------------------------------------------------
+
+def bench_detect(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """Diagram type detection, compared against the legacy detector."""
+    corpus = generate_corpus(args.diagrams * args.scale, args.max_lines, args.seed)
+    generator = ResilientDiagramGenerator(troubleshooting_path=None)
+
+    def run(detect):
+        return lambda: [detect(code) for code in corpus]
+
+    current = time_callable(run(generator.detect_diagram_type), args.repeat, len(corpus))
+    legacy = time_callable(run(legacy_detect), args.repeat, len(corpus))
+    current["legacy_best_s"] = legacy["best_s"]
+    current["speedup_vs_legacy"] = round(legacy["best_s"] / current["best_s"], 2) if current["best_s"] else None
+
+    # Regression guard: pathological preambles must stay linear
+    start = time.perf_counter()
+    misdetected = [code[:20] for code in ADVERSARIAL_SOURCES
+                   if generator.detect_diagram_type(code) != DiagramType.UNKNOWN]
+    current["adversarial_s"] = round(time.perf_counter() - start, 6)
+    misdetected += [code[:20] for code, expected in PREAMBLE_SOURCES
+                    if generator.detect_diagram_type(code) != expected]
+    if misdetected or current["adversarial_s"] > 1.0:
+        raise RuntimeError(f"detect_diagram_type regressed on adversarial preambles: "
+                           f"{current['adversarial_s']}s, misdetected {misdetected}")
+    return current
+
+
+def bench_canonical(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """Canonical render-equivalence keys of Mermaid sources."""
+    from diagram_canonical import mermaid_key
+
+    corpus = generate_corpus(args.diagrams * args.scale, args.max_lines, args.seed)
+    result = time_callable(lambda: [mermaid_key(code) for code in corpus], args.repeat, len(corpus))
+
+    # Regression guard: moving a node to another level must change the key
+    merged = [first.split('\n', 1)[0] for first, second in INDENTED_PAIRS if mermaid_key(first) == mermaid_key(second)]
+    if merged:
+        raise RuntimeError(f"mermaid_key ignores indentation for: {', '.join(merged)}")
+    return result
+
+
+def bench_extract(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """MermaidExtractor on Markdown documents with many Mermaid blocks."""
+    from extract_mermaid import MermaidExtractor
+
+    blocks = args.blocks * args.scale
+    document = workdir / 'document.md'
+    document.write_text(generate_markdown(blocks, seed=args.seed), encoding='utf-8')
+
+    def run():
+        extractor = MermaidExtractor(document)
+        extractor.replace_with_images()
+
+    return time_callable(run, args.repeat, blocks)
+
+
+def bench_bounding_box(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """compute_bounding_box over a large Excalidraw scene."""
+    render_excalidraw = import_render_excalidraw()
+    scene = generate_scene(args.elements * args.scale, args.points, args.seed)
+    elements = [e for e in scene["elements"] if not e.get("isDeleted")]
+    return time_callable(lambda: render_excalidraw.compute_bounding_box(elements), args.repeat, len(elements))
+
+
+def bench_troubleshooting(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """Troubleshooting guide parse plus search over many error messages."""
+    guide = Path(__file__).resolve().parent.parent / 'references' / 'guides' / 'troubleshooting.md'
+    rng = random.Random(args.seed)
+    errors = [
+        (rng.choice(SAMPLE_ERRORS).format(n=rng.randint(1, 200)), rng.choice(list(DIAGRAM_HEADERS)))
+        for _ in range(args.searches * args.scale)
+    ]
+
+    def run():
+        parser = TroubleshootingParser(guide)
+        for message, diagram_type in errors:
+            parser.search(message, diagram_type)
+
+    result = time_callable(run, args.repeat, len(errors))
+    result["guide_entries"] = len(TroubleshootingParser(guide).entries)
+    return result
+
+
+def bench_validate(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """MermaidExtractor.validate_diagrams with the stub mmdc."""
+    from extract_mermaid import MermaidExtractor
+
+    blocks = args.render_items * args.scale
+    document = workdir / 'validate.md'
+    document.write_text(generate_markdown(blocks, seed=args.seed), encoding='utf-8')
+    extractor = MermaidExtractor(document)
+    return time_callable(extractor.validate_diagrams, args.repeat, blocks)
+
+
+def bench_batch_render(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """MermaidRenderer.batch_render over a directory of .mmd files with the stub mmdc."""
+    from mermaid_to_image import MermaidRenderer
+
+    count = args.render_items * args.scale
+    input_dir = workdir / 'mmd'
+    input_dir.mkdir(exist_ok=True)
+    for i, code in enumerate(generate_corpus(count, 40, args.seed)):
+        (input_dir / f'diagram-{i:04d}.mmd').write_text(code, encoding='utf-8')
+
+    renderer = MermaidRenderer()
+    return time_callable(lambda: renderer.batch_render(input_dir, workdir / 'out'), args.repeat, count)
+
+
+def bench_excalidraw_render(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """render_excalidraw.render() end to end with a fake browser (Python overhead only)."""
+    scene_path = workdir / 'scene.excalidraw'
+    scene_path.write_text(json.dumps(generate_scene(args.elements * args.scale, args.points, args.seed)))
+
+    with stub_playwright():
+        render_excalidraw = import_render_excalidraw()
+        return time_callable(lambda: render_excalidraw.render(scene_path, workdir / 'scene.png'), args.repeat, 1)
+
+
+def bench_excalidraw_preview(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """excalidraw_preview.preview_png(): browserless thumbnail of one scene."""
+    scene = generate_scene(args.elements * args.scale, args.points, args.seed)
+    import_render_excalidraw()
+    import excalidraw_preview
+    return time_callable(lambda: excalidraw_preview.preview_png(scene), args.repeat, 1)
+
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace, Path], Dict[str, Any]]] = {
+    "detect_diagram_type": bench_detect,
+    "canonical_key": bench_canonical,
+    "extract": bench_extract,
+    "bounding_box": bench_bounding_box,
+    "troubleshooting_search": bench_troubleshooting,
+    "validate": bench_validate,
+    "batch_render": bench_batch_render,
+    "excalidraw_render": bench_excalidraw_render,
+    "excalidraw_preview": bench_excalidraw_preview,
+}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    """
+    Compare best times against a baseline run.
+
+    Args:
+        results: Current benchmark results
+        baseline: Results loaded from a previous run
+        threshold: Relative slowdown treated as a regression (0.1 = 10%)
+
+    Returns:
+        Dict mapping benchmark name to ratio and status
+    """
+    comparison = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get("best_s"):
+            comparison[name] = {"status": "new"}
+            continue
+        ratio = current["best_s"] / previous["best_s"]
+        status = "ok"
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 - threshold:
+            status = "improvement"
+        comparison[name] = {
+            "baseline_best_s": previous["best_s"],
+            "best_s": current["best_s"],
+            "ratio": round(ratio, 3),
+            "status": status,
+        }
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the diagram toolchain on synthetic corpora',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"""
+Benchmarks:
+  {', '.join(BENCHMARKS)}
+
+Examples:
+  # Run everything and keep the results as a baseline
+  python benchmark_diagrams.py --save-baseline baseline.json
+
+  # Later: compare, failing on >15% slowdowns
+  python benchmark_diagrams.py --baseline baseline.json --threshold 0.15 --fail-on-regression
+        """
+    )
+    parser.add_argument('--only', type=str, default=None,
+                        help='Comma-separated benchmark names to run (default: all)')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='Multiply every corpus size by this factor (default: 1)')
+    parser.add_argument('--diagrams', '-n', type=int, default=20000,
+                        help='Diagrams in the detection corpus (default: 20000)')
+    parser.add_argument('--max-lines', type=int, default=400,
+                        help='Maximum body lines per detection diagram (default: 400)')
+    parser.add_argument('--blocks', type=int, default=500,
+                        help='Mermaid blocks in the extraction document (default: 500)')
+    parser.add_argument('--elements', type=int, default=20000,
+                        help='Elements in the Excalidraw scene (default: 20000)')
+    parser.add_argument('--points', type=int, default=8,
+                        help='Points per arrow/line element (default: 8)')
+    parser.add_argument('--searches', type=int, default=2000,
+                        help='Troubleshooting searches (default: 2000)')
+    parser.add_argument('--render-items', type=int, default=20,
+                        help='Diagrams for validate/batch render with the stub mmdc (default: 20)')
+    parser.add_argument('--repeat', '-r', type=int, default=3,
+                        help='Timing repetitions, best is reported (default: 3)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Corpus random seed (default: 1)')
+    parser.add_argument('--output', '-o', type=Path,
+                        help='Write results JSON to this file')
+    parser.add_argument('--baseline', type=Path,
+                        help='Compare against a results JSON from a previous run')
+    parser.add_argument('--save-baseline', type=Path,
+                        help='Also write the results to this baseline file')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative slowdown reported as a regression (default: 0.10)')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='Exit with status 1 if any benchmark regressed')
+    parser.add_argument('--json', '-j', action='store_true',
+                        help='Print results as JSON')
+    args = parser.parse_args()
+
+    selected = list(BENCHMARKS)
+    if args.only:
+        selected = [name.strip() for name in args.only.split(',') if name.strip()]
+        unknown = [name for name in selected if name not in BENCHMARKS]
+        if unknown:
+            print(f"ERROR: Unknown benchmark(s): {', '.join(unknown)}", file=sys.stderr)
+            sys.exit(1)
+
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = Path(tmpdir)
+        with stub_mmdc(workdir):
+            for name in selected:
+                bench_dir = workdir / name
+                bench_dir.mkdir()
+                # The scripts print progress; keep it out of the report
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results[name] = BENCHMARKS[name](args, bench_dir)
+                if not args.json:
+                    r = results[name]
+                    print(f"  {name:<24} best {r['best_s']:.4f}s  median {r['median_s']:.4f}s  "
+                          f"({r['per_item_us']} us/item, {r['items']:,} items)")
+
+    report: Dict[str, Any] = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "config": {
+            key: getattr(args, key)
+            for key in ('scale', 'diagrams', 'max_lines', 'blocks', 'elements', 'points',
+                        'searches', 'render_items', 'repeat', 'seed')
+        },
+        "results": results,
+    }
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        report["comparison"] = compare(results, baseline.get("results", {}), args.threshold)
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + '\n', encoding='utf-8')
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(report, indent=2) + '\n', encoding='utf-8')
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    elif "comparison" in report:
+        print("\nComparison with baseline:")
+        for name, entry in report["comparison"].items():
+            if entry["status"] == "new":
+                print(f"  {name:<24} (not in baseline)")
+            else:
+                print(f"  {name:<24} {entry['ratio']:.3f}x  {entry['status']}")
+
+    regressions = [name for name, entry in report.get("comparison", {}).items()
+                   if entry["status"] == "regression"]
+    if args.fail_on_regression and regressions:
+        print(f"\nRegressions: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
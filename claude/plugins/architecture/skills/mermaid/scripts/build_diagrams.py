@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Incremental, make-style build of the Mermaid diagrams in a Markdown tree.
+
+Models each source Markdown file, the .mmd files extracted from it, the
+images rendered from those and the rewritten Markdown that references the
+images as a dependency graph, stored as a manifest in the output tree. A
+build only redoes stale nodes:
+
+- Markdown whose mtime and size match the manifest (with all outputs
+  present) is skipped without being read
+- .mmd files and rewritten Markdown are only written when their content changed
+- an image is re-rendered only when its canonical source (diagram_canonical.py:
+  whitespace, comments and line endings ignored) or the render options changed;
+  a diagram that only moved (its file name carries its position) gets a copy
+  of the image already rendered for the same render key
+- independent renders run in parallel (--jobs), the most expensive first
+- with --optimize, each render is recompressed/minified (image_optimize.py)
+  before it is compared with the image on disk, so unchanged images stay put
+- a re-rendered PNG that looks the same as the one on disk (visual_diff.py)
+  is not written, so encoder noise does not churn the output tree
+- outputs of deleted Markdown files and diagrams are garbage-collected
+
+Layout for docs/guide/setup.md built with --output build/:
+
+    build/guide/setup.md                          rewritten Markdown
+    build/guide/diagrams/setup-001-1a2b3c4d.mmd   extracted diagram source
+    build/guide/diagrams/setup-001-1a2b3c4d.png   rendered image
+    build/.diagram-build.json                     manifest
+    build/.diagram-timings.json                   render timings for scheduling
+
+Only Markdown and diagram artifacts are written to the output tree; copy
+other assets separately.
+
+Usage:
+    python build_diagrams.py docs/ --output build/
+    python build_diagrams.py docs/ --output build/ --format svg --theme dark --jobs 8
+    python build_diagrams.py docs/ --output build/ --dry-run
+    python build_diagrams.py docs/ --output build/ --optimize
+
+Requirements:
+    - mermaid-cli (npm install -g @mermaid-js/mermaid-cli)
+      or, with --engine browser, playwright (see render_engine.py)
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Optional, List, Dict, Any, Tuple
+
+from diagram_canonical import canonical_mermaid
+from diagram_inventory import markdown_files
+from diagram_trace import tracer, add_profile_arguments, configure_profiling
+from extract_mermaid import MermaidExtractor
+from image_optimize import ImageOptimizer
+from mermaid_to_image import MermaidRenderer
+from render_cost import CostModel, TIMINGS_NAME, render_profile
+from resilient_diagram import ArtifactWriter
+from visual_diff import VisualGate, add_visual_diff_arguments, visual_gate_from_args
+
+
+MANIFEST_NAME = '.diagram-build.json'
+MANIFEST_VERSION = 2
+
+
+@dataclass
+class RenderJob:
+    """One stale image node and the .mmd node it is built from."""
+    source: str
+    mmd_path: Path
+    image_path: Path
+    key: str
+
+
+@dataclass
+class SourcePlan:
+    """Everything a changed Markdown file contributes to the build."""
+    key: str
+    stamp: Dict[str, Any]
+    markdown_path: Path
+    markdown: str
+    outputs: List[str] = field(default_factory=list)
+    jobs: List[RenderJob] = field(default_factory=list)
+    reused: List[str] = field(default_factory=list)
+
+
+class DiagramBuild:
+    """Plan and run an incremental build of one Markdown tree into an output tree."""
+
+    def __init__(
+        self,
+        source_dir: Path,
+        output_dir: Path,
+        image_format: str = 'png',
+        image_dir: str = 'diagrams',
+        jobs: Optional[int] = None,
+        engine: str = 'mmdc',
+        render_options: Optional[Dict[str, Any]] = None,
+        optimizer: Optional[ImageOptimizer] = None,
+        visual_gate: Optional[VisualGate] = None
+    ):
+        """
+        Initialize a build.
+
+        Args:
+            source_dir: Root of the Markdown tree
+            output_dir: Root of the output tree (holds the manifest)
+            image_format: Rendered image format (png, svg or pdf)
+            image_dir: Directory for diagram artifacts, next to each rewritten Markdown file
+            jobs: Parallel renders (default: CPU count; always 1 with the browser engine)
+            engine: 'mmdc' or 'browser' (see MermaidRenderer)
+            render_options: MermaidRenderer options (theme, background, width, height, scale, config_file)
+            optimizer: Optimize every rendered PNG/SVG before it is written (see image_optimize.py)
+            visual_gate: Keep existing PNGs that a re-render does not visibly change
+                (see visual_diff.py); None compares bytes only
+        """
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self.image_format = image_format
+        self.image_dir = image_dir
+        self.engine = engine
+        # The sync browser engine is single-threaded
+        self.jobs = 1 if engine == 'browser' else max(1, jobs or os.cpu_count() or 1)
+        self.render_options = dict(render_options or {})
+        self.optimizer = optimizer
+        self.visual_gate = visual_gate
+        self.writer = ArtifactWriter()
+        self.options = self._output_options()
+        self.options_key = ArtifactWriter.render_key(b'', image_dir=image_dir, **self.options)
+        self.manifest_path = output_dir / MANIFEST_NAME
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        empty = {'version': MANIFEST_VERSION, 'sources': {}, 'images': {}}
+        try:
+            manifest = json.loads(self.manifest_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return empty
+        return manifest if manifest.get('version') == MANIFEST_VERSION else empty
+
+    def _rel(self, path: Path) -> str:
+        return path.relative_to(self.output_dir).as_posix()
+
+    def _output_options(self) -> Dict[str, Any]:
+        """Every build option that changes what an image looks like."""
+        options = {
+            key: value for key, value in self.render_options.items() if key != 'config_file'
+        }
+        config_file = self.render_options.get('config_file')
+        if config_file:
+            options['config'] = ArtifactWriter.file_hash(Path(config_file))
+        if self.optimizer is not None:
+            options['optimize'] = self.optimizer.options(self.image_format)
+        return {'engine': self.engine, 'format': self.image_format, **options}
+
+    def _render_key(self, content: str) -> str:
+        return ArtifactWriter.render_key(canonical_mermaid(content).encode('utf-8'), **self.options)
+
+    def _is_fresh(self, key: str, stat: os.stat_result) -> bool:
+        """
+        True if a source's stamp and build options match and every output it produced still exists.
+
+        A source built with other options (format, theme, size, config, ...) is stale,
+        as is one whose diagrams have no image with the current format's suffix.
+        """
+        entry = self.manifest['sources'].get(key)
+        if not entry or entry.get('mtime_ns') != stat.st_mtime_ns or entry.get('size') != stat.st_size:
+            return False
+        if entry.get('options_key') != self.options_key:
+            return False
+        outputs = set(entry['outputs'])
+        images = {
+            PurePosixPath(output).with_suffix(f'.{self.image_format}').as_posix()
+            for output in outputs if output.endswith('.mmd')
+        }
+        if not images <= outputs:
+            return False
+        return all((self.output_dir / output).exists() for output in outputs)
+
+    def _plan_source(self, key: str, md_file: Path, stat: os.stat_result, dry_run: bool) -> SourcePlan:
+        """Extract a changed Markdown file, write its .mmd nodes and list its stale images."""
+        extractor = MermaidExtractor(md_file)
+        markdown_path = self.output_dir / key
+        artifact_dir = markdown_path.parent / self.image_dir
+        stem = md_file.stem
+
+        plan = SourcePlan(
+            key=key,
+            stamp={'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'options_key': self.options_key},
+            markdown_path=markdown_path,
+            markdown=extractor.replace_with_images(self.image_format, self.image_dir, prefix=stem),
+            outputs=[key],
+        )
+
+        for diagram in extractor.diagrams:
+            mmd_path = artifact_dir / diagram.get_filename(prefix=stem, extension='mmd')
+            image_path = artifact_dir / diagram.get_filename(prefix=stem, extension=self.image_format)
+            plan.outputs += [self._rel(mmd_path), self._rel(image_path)]
+
+            if not dry_run:
+                artifact_dir.mkdir(parents=True, exist_ok=True)
+                with tracer.span("write_mmd"):
+                    self.writer.write_text(mmd_path, diagram.content)
+
+            render_key = self._render_key(diagram.content)
+            rel = self._rel(image_path)
+            if self.manifest['images'].get(rel) == render_key and image_path.exists():
+                continue
+            if self._reuse_image(render_key, image_path, dry_run):
+                plan.reused.append(rel)
+            else:
+                plan.jobs.append(RenderJob(key, mmd_path, image_path, render_key))
+
+        return plan
+
+    def _reuse_image(self, render_key: str, image_path: Path, dry_run: bool) -> bool:
+        """
+        Copy an image already rendered for ``render_key`` to ``image_path``.
+
+        Inserting or removing a diagram renumbers the ones after it; their images
+        are still valid for their render key, only the file name changed.
+
+        Returns:
+            True if an existing image was (or, in a dry run, would be) reused
+        """
+        for other_rel, other_key in self.manifest['images'].items():
+            other_path = self.output_dir / other_rel
+            if other_key != render_key or other_path == image_path or not other_path.exists():
+                continue
+            if not dry_run:
+                with tracer.span("reuse_image"):
+                    self.writer.write_bytes(image_path, other_path.read_bytes())
+                self.manifest['images'][self._rel(image_path)] = render_key
+            return True
+        return False
+
+    def build(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Bring the output tree up to date.
+
+        Args:
+            dry_run: Only report what is stale; write nothing
+
+        Returns:
+            Build statistics, including the stale images and any failures
+        """
+        start = time.perf_counter()
+        stats: Dict[str, Any] = {
+            'sources': 0, 'up_to_date': 0, 'rebuilt': 0, 'rendered': 0, 'unchanged_images': 0, 'reused': 0,
+            'markdown_written': 0, 'removed': 0, 'failed': [], 'stale': [],
+        }
+
+        output_root = self.output_dir.resolve()
+        with tracer.span("discover"):
+            sources = {
+                md_file.relative_to(self.source_dir).as_posix(): md_file
+                for md_file in markdown_files(self.source_dir)
+                # An output tree inside the source tree is not a source
+                if output_root not in md_file.resolve().parents
+            }
+        stats['sources'] = len(sources)
+
+        new_sources: Dict[str, Dict[str, Any]] = {}
+        plans: List[SourcePlan] = []
+        for key, md_file in sources.items():
+            stat = md_file.stat()
+            if self._is_fresh(key, stat):
+                new_sources[key] = self.manifest['sources'][key]
+                stats['up_to_date'] += 1
+                continue
+            with tracer.diagram(key):
+                plans.append(self._plan_source(key, md_file, stat, dry_run))
+
+        jobs = [job for plan in plans for job in plan.jobs]
+        stats['reused'] = sum(len(plan.reused) for plan in plans)
+        stats['stale'] = [self._rel(job.image_path) for job in jobs]
+        if dry_run:
+            stats['rebuilt'] = len(plans)
+            stats['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            return stats
+
+        failed_sources = self._render(jobs, stats)
+
+        for plan in plans:
+            if plan.key in failed_sources:
+                # Keep old and new outputs alive and leave the source stale so it is retried
+                previous = self.manifest['sources'].get(plan.key, {}).get('outputs', [])
+                new_sources[plan.key] = {'mtime_ns': None, 'size': None,
+                                         'outputs': sorted(set(previous) | set(plan.outputs))}
+                continue
+            plan.markdown_path.parent.mkdir(parents=True, exist_ok=True)
+            with tracer.span("write_markdown"):
+                if self.writer.write_text(plan.markdown_path, plan.markdown):
+                    stats['markdown_written'] += 1
+            new_sources[plan.key] = {**plan.stamp, 'outputs': plan.outputs}
+            stats['rebuilt'] += 1
+
+        with tracer.span("gc"):
+            stats['removed'] = self._collect_garbage(new_sources)
+
+        self.manifest['sources'] = new_sources
+        if plans or stats['removed']:
+            with tracer.span("write_manifest"):
+                self.output_dir.mkdir(parents=True, exist_ok=True)
+                ArtifactWriter().write_text(self.manifest_path, json.dumps(self.manifest, indent=2, sort_keys=True) + '\n')
+
+        stats['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return stats
+
+    def _render(self, jobs: List[RenderJob], stats: Dict[str, Any]) -> set:
+        """Render stale images in parallel. Returns the sources with a failed render."""
+        failed_sources = set()
+        if not jobs:
+            return failed_sources
+
+        renderer = MermaidRenderer(engine=self.engine, **self.render_options)
+
+        # Longest first, so no big diagram is left running alone at the end
+        profile = render_profile(self.engine, [self.image_format], [self.render_options.get('theme', 'default')])
+        model = CostModel(self.output_dir / TIMINGS_NAME, profile=profile)
+        sources = {job.mmd_path: job.mmd_path.read_text(encoding='utf-8') for job in jobs}
+        if self.jobs > 1:
+            jobs = model.longest_first(jobs, lambda job: sources[job.mmd_path])
+
+        def run(job: RenderJob) -> Tuple[bool, Path, float]:
+            temp_path = ArtifactWriter.temp_path(job.image_path)
+            start = time.perf_counter()
+            with tracer.diagram(self._rel(job.image_path)):
+                ok = renderer.render(job.mmd_path, temp_path)
+                duration_ms = (time.perf_counter() - start) * 1000
+                if ok and self.optimizer is not None:
+                    self.optimizer.optimize_file(temp_path)
+            return ok, temp_path, duration_ms
+
+        print(f"Rendering {len(jobs)} stale diagram(s) with {self.jobs} job(s)...")
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = {pool.submit(run, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                rel = self._rel(job.image_path)
+                ok, temp_path, duration_ms = future.result()
+                if not ok:
+                    temp_path.unlink(missing_ok=True)
+                    failed_sources.add(job.source)
+                    stats['failed'].append(rel)
+                    print(f"  ❌ {rel}")
+                    continue
+                model.record(sources[job.mmd_path], duration_ms)
+                commit = self.visual_gate.commit if self.visual_gate is not None else self.writer.commit
+                if commit(temp_path, job.image_path):
+                    stats['rendered'] += 1
+                else:
+                    stats['unchanged_images'] += 1
+                self.manifest['images'][rel] = job.key
+                print(f"  ✅ {rel}")
+        model.save()
+        return failed_sources
+
+    def _collect_garbage(self, new_sources: Dict[str, Dict[str, Any]]) -> int:
+        """Delete outputs no source produces any more. Returns the number of files removed."""
+        live = {output for entry in new_sources.values() for output in entry['outputs']}
+        old = {output for entry in self.manifest['sources'].values() for output in entry['outputs']}
+
+        removed = 0
+        for output in sorted(old - live):
+            path = self.output_dir / output
+            if path.exists():
+                path.unlink()
+                removed += 1
+                # Drop directories the build emptied (e.g. a diagrams/ folder)
+                parent = path.parent
+                while parent != self.output_dir and parent.is_dir() and not any(parent.iterdir()):
+                    parent.rmdir()
+                    parent = parent.parent
+
+        self.manifest['images'] = {k: v for k, v in self.manifest['images'].items() if k in live}
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Incrementally build the Mermaid diagrams of a Markdown tree',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Build docs/ into build/ (re-renders only what changed)
+  python build_diagrams.py docs/ --output build/
+
+  # SVGs with the dark theme, 8 renders at a time
+  python build_diagrams.py docs/ --output build/ --format svg --theme dark --jobs 8
+
+  # Show which images are stale without building
+  python build_diagrams.py docs/ --output build/ --dry-run
+
+  # Smaller images: recompressed PNGs, minified SVGs
+  python build_diagrams.py docs/ --output build/ --optimize
+
+  # Heatmaps of the PNGs that visibly changed
+  python build_diagrams.py docs/ --output build/ --diff-dir diffs/
+        """
+    )
+    parser.add_argument('source_dir', type=Path, help='Root of the Markdown tree')
+    parser.add_argument('--output', '-o', type=Path, required=True, help='Output tree root')
+    parser.add_argument('--format', '-f', choices=MermaidRenderer.VALID_FORMATS, default='png',
+                        help='Image format (default: png)')
+    parser.add_argument('--image-dir', default='diagrams',
+                        help='Artifact directory next to each rewritten Markdown file (default: diagrams)')
+    parser.add_argument('--jobs', '-j', type=int, help='Parallel renders (default: CPU count)')
+    parser.add_argument('--engine', '-e', choices=MermaidRenderer.VALID_ENGINES, default='mmdc',
+                        help='Renderer: mmdc per diagram, or one shared headless browser (default: mmdc)')
+    parser.add_argument('--theme', '-t', choices=MermaidRenderer.VALID_THEMES, default='default',
+                        help='Mermaid theme (default: default)')
+    parser.add_argument('--background', '-b', default='transparent',
+                        help='Background color (default: transparent)')
+    parser.add_argument('--width', '-w', type=int, help='Output width in pixels')
+    parser.add_argument('--height', '-H', type=int, help='Output height in pixels')
+    parser.add_argument('--scale', '-s', type=int, default=1, choices=[1, 2, 3], help='Scale factor (default: 1)')
+    parser.add_argument('--config', '-c', type=Path, help='Path to custom Mermaid config file')
+    parser.add_argument('--optimize', '-O', action='store_true',
+                        help='Losslessly recompress PNGs and minify SVGs before writing them')
+    parser.add_argument('--quantize', action='store_true',
+                        help='With --optimize: try a 256-color palette for PNGs, kept when smaller (lossy)')
+    parser.add_argument('--dry-run', '-n', action='store_true', help='List stale images without building')
+    parser.add_argument('--json', action='store_true', help='Print build statistics as JSON')
+
+    add_visual_diff_arguments(parser)
+    add_profile_arguments(parser)
+
+    args = parser.parse_args()
+    configure_profiling(args)
+
+    if not args.source_dir.is_dir():
+        print(f"ERROR: Not a directory: {args.source_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    optimizer = None
+    if args.optimize or args.quantize:
+        optimizer = ImageOptimizer(quantize=args.quantize, jobs=1)
+        for warning in optimizer.warnings:
+            print(f"⚠️  {warning}", file=sys.stderr)
+
+    build = DiagramBuild(
+        args.source_dir,
+        args.output,
+        image_format=args.format,
+        image_dir=args.image_dir,
+        jobs=args.jobs,
+        engine=args.engine,
+        render_options={
+            'theme': args.theme,
+            'background': args.background,
+            'width': args.width,
+            'height': args.height,
+            'scale': args.scale,
+            'config_file': args.config,
+        },
+        optimizer=optimizer,
+        visual_gate=visual_gate_from_args(args),
+    )
+    stats = build.build(dry_run=args.dry_run)
+
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    elif args.dry_run:
+        for image in stats['stale']:
+            print(f"  stale: {image}")
+        print(f"\n{len(stats['stale'])} stale image(s) in {stats['rebuilt']} changed source(s)")
+    else:
+        print(f"\n✓ {stats['sources']} source(s): {stats['rebuilt']} rebuilt, {stats['up_to_date']} up to date; "
+              f"{stats['rendered']} image(s) rendered, {stats['reused']} reused, {stats['unchanged_images']} unchanged; "
+              f"{stats['removed']} orphan(s) removed in {stats['elapsed_ms']} ms")
+        if stats['failed']:
+            print(f"❌ {len(stats['failed'])} diagram(s) failed to render", file=sys.stderr)
+
+    if stats['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
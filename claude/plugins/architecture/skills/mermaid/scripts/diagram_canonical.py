@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Canonical forms of diagram sources, for render-equivalence keys.
+
+Two sources that render the same image should share one cache key, so
+cosmetic edits never trigger a re-validation or re-render. The canonical
+forms drop what the renderers ignore:
+
+Mermaid
+- CRLF / CR line endings, a byte order mark, trailing whitespace
+- blank lines and ``%%`` comment lines (``%%{init: ...}%%`` directives stay)
+- indentation and runs of spaces outside quoted labels; mindmap, kanban
+  and treemap diagrams, where indentation is structure, are only dedented
+- lines of multi-line Markdown labels (``"`...`"``) are kept as written
+
+Excalidraw
+- deleted elements, and per-edit bookkeeping: ``version``,
+  ``versionNonce``, ``updated`` and the fractional ``index``
+- element order where it cannot show: elements are only kept in array
+  order relative to elements they overlap (z-order), all others are
+  ordered by id
+- editor-only app state (scroll, zoom, selection, current tool defaults)
+  and embedded files no element references
+
+Keys are SHA-256 hex digests of the canonical text; render options are
+added on top by ArtifactWriter.render_key().
+
+Usage:
+    # Key and canonical form of a file, e.g. to see why it re-rendered
+    python diagram_canonical.py diagram.mmd --show
+    python diagram_canonical.py scene.excalidraw
+
+    # From another script
+    from diagram_canonical import canonical_mermaid, mermaid_key, excalidraw_key
+
+    key = mermaid_key(source)
+
+Used by extract_mermaid.py (diagram hashes), build_diagrams.py,
+resilient_diagram.py, render_server.py, render_cost.py,
+diagram_inventory.py and render_excalidraw.py.
+
+Requirements:
+    - Python 3.7+ (stdlib only, no external dependencies)
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import re
+import sys
+from pathlib import Path
+from typing import List, Dict, Any, Tuple
+
+
+# Diagram types whose indentation defines the structure (without a -beta suffix)
+INDENTED_TYPES = {'mindmap', 'kanban', 'treemap'}
+
+COMMENT_PATTERN = re.compile(r'^\s*%%(?!\{)')
+QUOTED_PATTERN = re.compile(r'"[^"\n]*"')
+SPACES_PATTERN = re.compile(r'[ \t]+')
+
+# Element fields that change on every edit without changing the drawing
+VOLATILE_ELEMENT_KEYS = {'version', 'versionNonce', 'updated', 'index'}
+
+# App state the editor saves but exports ignore
+VOLATILE_APP_STATE = {
+    'scrollX', 'scrollY', 'zoom', 'selectedElementIds', 'selectedGroupIds', 'editingGroupId',
+    'selectedLinearElement', 'collaborators', 'cursorButton', 'openMenu', 'openSidebar',
+    'openDialog', 'activeTool', 'lastPointerDownWith', 'previousSelectedElementIds', 'width',
+    'height', 'offsetTop', 'offsetLeft', 'toast', 'contextMenu', 'showWelcomeScreen',
+}
+VOLATILE_APP_STATE_PREFIXES = ('currentItem',)
+
+# Extra margin (px) around element bounds for strokes, roughness and arrowheads
+BOUNDS_PADDING = 8.0
+
+UNBOUNDED = (-math.inf, -math.inf, math.inf, math.inf)
+
+
+def _collapse_spaces(line: str) -> str:
+    """Collapse runs of spaces and tabs outside double-quoted strings."""
+    parts = []
+    last = 0
+    for match in QUOTED_PATTERN.finditer(line):
+        parts.append(SPACES_PATTERN.sub(' ', line[last:match.start()]))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(SPACES_PATTERN.sub(' ', line[last:]))
+    return ''.join(parts)
+
+
+def _split_front_matter(lines: List[str]) -> Tuple[List[str], List[str]]:
+    """Split ``---`` YAML front matter (kept line by line) from the diagram body."""
+    start = 0
+    while start < len(lines) and not lines[start].strip():
+        start += 1
+    if start == len(lines) or lines[start].strip() != '---':
+        return [], lines
+    for end in range(start + 1, len(lines)):
+        if lines[end].strip() == '---':
+            return [line.rstrip() for line in lines[start:end + 1]], lines[end + 1:]
+    return [], lines
+
+
+def _diagram_type(lines: List[str]) -> str:
+    """Type keyword of the first significant line, without a ``-beta`` suffix."""
+    for line in lines:
+        stripped = line.strip()
+        if stripped and not stripped.startswith('%%'):
+            token = stripped.split(None, 1)[0]
+            return token[:-len('-beta')] if token.endswith('-beta') else token
+    return ''
+
+
+def canonical_mermaid(source: str) -> str:
+    """
+    Canonical form of Mermaid code: same text for sources that render the same.
+
+    Args:
+        source: Mermaid diagram code
+
+    Returns:
+        Canonical code (LF line endings, no trailing newline)
+    """
+    text = source.lstrip('\ufeff').replace('\r\n', '\n').replace('\r', '\n')
+    front_matter, body = _split_front_matter(text.split('\n'))
+    indented = _diagram_type(body) in INDENTED_TYPES
+
+    lines = []
+    markdown_depth = 0
+    for line in body:
+        line = line.rstrip()
+        in_markdown = markdown_depth > 0
+        markdown_depth = max(0, markdown_depth + line.count('"`') - line.count('`"'))
+
+        # Multi-line Markdown labels keep their blank lines and indentation
+        if in_markdown:
+            lines.append(line)
+            continue
+        if not line or COMMENT_PATTERN.match(line):
+            continue
+
+        indent = ''
+        if indented:
+            indent = line[:len(line) - len(line.lstrip())]
+        content = line.strip()
+        lines.append(indent + (content if markdown_depth else _collapse_spaces(content)))
+
+    if indented:
+        margin = min((len(line) - len(line.lstrip()) for line in lines if line.strip()), default=0)
+        lines = [line[margin:] for line in lines]
+
+    return '\n'.join(front_matter + lines)
+
+
+def mermaid_key(source: str) -> str:
+    """SHA-256 hex digest of the canonical form of Mermaid code."""
+    return hashlib.sha256(canonical_mermaid(source).encode('utf-8')).hexdigest()
+
+
+def _bounds(element: Dict[str, Any]) -> Tuple[float, float, float, float]:
+    """Padded (min_x, min_y, max_x, max_y) of an element; unbounded if its geometry is unreadable."""
+    try:
+        x, y = float(element['x']), float(element['y'])
+        width, height = float(element.get('width') or 0), float(element.get('height') or 0)
+        min_x, min_y, max_x, max_y = x, y, x + width, y + height
+        points = element.get('points') or []
+        if points:
+            xs = [x + float(point[0]) for point in points]
+            ys = [y + float(point[1]) for point in points]
+            min_x, min_y = min(min_x, *xs), min(min_y, *ys)
+            max_x, max_y = max(max_x, *xs), max(max_y, *ys)
+        if element.get('angle'):
+            # Rotated: the circle around the center contains every rotation
+            cx, cy = (min_x + max_x) / 2, (min_y + max_y) / 2
+            radius = math.hypot(max_x - min_x, max_y - min_y) / 2
+            min_x, min_y, max_x, max_y = cx - radius, cy - radius, cx + radius, cy + radius
+        pad = BOUNDS_PADDING + float(element.get('strokeWidth') or 0)
+    except (KeyError, TypeError, ValueError, IndexError):
+        return UNBOUNDED
+    if any(math.isnan(v) for v in (min_x, min_y, max_x, max_y)):
+        return UNBOUNDED
+    return min_x - pad, min_y - pad, max_x + pad, max_y + pad
+
+
+def _z_order(elements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Canonical drawing order: array order between overlapping elements, id order otherwise.
+
+    Overlapping pairs keep their relative order (the z-order that shows);
+    the rest of the order is taken by smallest id first, so arrays that
+    differ only in the order of non-overlapping elements come out the same.
+    """
+    boxes = [_bounds(element) for element in elements]
+    by_left = sorted(range(len(elements)), key=lambda i: boxes[i][0])
+    successors: List[List[int]] = [[] for _ in elements]
+    pending = [0] * len(elements)
+
+    # Sweep along x: only elements whose x ranges meet can overlap
+    for position, a in enumerate(by_left):
+        _, a_top, a_right, a_bottom = boxes[a]
+        for b in by_left[position + 1:]:
+            b_left, b_top, _, b_bottom = boxes[b]
+            if b_left > a_right:
+                break
+            if b_top <= a_bottom and a_top <= b_bottom:
+                first, second = min(a, b), max(a, b)
+                successors[first].append(second)
+                pending[second] += 1
+
+    ready = [(str(elements[i].get('id', '')), i) for i in range(len(elements)) if not pending[i]]
+    heapq.heapify(ready)
+    ordered = []
+    while ready:
+        _, i = heapq.heappop(ready)
+        ordered.append(elements[i])
+        for j in successors[i]:
+            pending[j] -= 1
+            if not pending[j]:
+                heapq.heappush(ready, (str(elements[j].get('id', '')), j))
+    return ordered
+
+
+def canonical_excalidraw(scene: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Canonical form of an Excalidraw scene: the same dict for scenes that render the same.
+
+    Args:
+        scene: Parsed .excalidraw JSON
+
+    Returns:
+        Dict with ``elements``, ``appState`` and ``files`` (see module docstring)
+    """
+    elements = []
+    for element in scene.get('elements') or []:
+        if not isinstance(element, dict) or element.get('isDeleted'):
+            continue
+        element = {key: value for key, value in element.items() if key not in VOLATILE_ELEMENT_KEYS}
+        if isinstance(element.get('boundElements'), list):
+            element['boundElements'] = sorted(
+                element['boundElements'], key=lambda bound: json.dumps(bound, sort_keys=True)
+            )
+        elements.append(element)
+
+    app_state = {
+        key: value for key, value in (scene.get('appState') or {}).items()
+        if key not in VOLATILE_APP_STATE and not key.startswith(VOLATILE_APP_STATE_PREFIXES)
+    }
+
+    file_ids = {element.get('fileId') for element in elements if element.get('type') == 'image'}
+    files = {
+        file_id: {key: value for key, value in entry.items() if key not in ('created', 'lastRetrieved')}
+        for file_id, entry in (scene.get('files') or {}).items()
+        if file_id in file_ids and isinstance(entry, dict)
+    }
+
+    return {'elements': _z_order(elements), 'appState': app_state, 'files': files}
+
+
+def excalidraw_key(scene: Dict[str, Any]) -> str:
+    """SHA-256 hex digest of the canonical form of an Excalidraw scene."""
+    canonical = json.dumps(canonical_excalidraw(scene), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def canonical_source(kind: str, source: str) -> str:
+    """
+    Canonical text of a diagram source of either kind.
+
+    Args:
+        kind: 'mermaid' or 'excalidraw'
+        source: Mermaid code or Excalidraw scene JSON
+
+    Returns:
+        Canonical text; Excalidraw JSON that does not parse is returned unchanged
+    """
+    if kind != 'excalidraw':
+        return canonical_mermaid(source)
+    try:
+        scene = json.loads(source)
+    except ValueError:
+        return source
+    if not isinstance(scene, dict):
+        return source
+    return json.dumps(canonical_excalidraw(scene), sort_keys=True, separators=(',', ':'))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Print render-equivalence keys of diagram files',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Same key: the edit was cosmetic and will not re-render
+  python diagram_canonical.py before.mmd after.mmd
+
+  # The text the key is computed from
+  python diagram_canonical.py scene.excalidraw --show
+        """
+    )
+    parser.add_argument('input', type=Path, nargs='+', help='.mmd or .excalidraw files')
+    parser.add_argument('--show', action='store_true', help='Print the canonical form as well')
+    args = parser.parse_args()
+
+    for path in args.input:
+        try:
+            source = path.read_text(encoding='utf-8')
+        except OSError as e:
+            print(f"ERROR: Cannot read {path}: {e}", file=sys.stderr)
+            sys.exit(1)
+        kind = 'excalidraw' if path.suffix == '.excalidraw' else 'mermaid'
+        canonical = canonical_source(kind, source)
+        print(f"{hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]}  {path}")
+        if args.show:
+            print(canonical)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Persistent SQLite inventory of the Mermaid diagrams in a docs tree.
+
+Records every diagram's source file, line, content hash, detected type,
+last validation result and timing, and rendered artifact path. Scans are
+incremental: a Markdown file is only re-read when its mtime or size
+changed, and validation results follow a diagram's content, so moved or
+duplicated diagrams keep them. Queries run against the database and
+never rescan or re-render the docs tree.
+
+Usage:
+    # Index (or refresh) all Markdown under docs/
+    python diagram_inventory.py scan docs/
+
+    # Query the index
+    python diagram_inventory.py failing
+    python diagram_inventory.py changed-since 2026-10-01
+    python diagram_inventory.py duplicates
+    python diagram_inventory.py list --path docs/design.md --json
+
+    # Record validation results, timings and image paths while working
+    python extract_mermaid.py docs/design.md --validate --inventory .diagram-inventory.db
+
+Requirements:
+    - Python 3.7+ (stdlib only, no external dependencies)
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterator
+
+from diagram_canonical import mermaid_key
+from extract_mermaid import MermaidExtractor
+from resilient_diagram import DiagramType, ResilientDiagramGenerator
+
+
+DEFAULT_DB = Path('.diagram-inventory.db')
+
+# Directories never worth descending into when scanning a docs tree
+SKIP_DIRS = {'.git', 'node_modules', '.venv', 'venv', '__pycache__'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    scanned_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS diagrams (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    diagram_type TEXT NOT NULL,
+    first_line TEXT NOT NULL,
+    line_count INTEGER NOT NULL,
+    changed_at REAL NOT NULL,
+    valid INTEGER,
+    error TEXT,
+    engine TEXT,
+    duration_ms REAL,
+    validated_at REAL,
+    artifact TEXT,
+    PRIMARY KEY (path, idx)
+);
+CREATE INDEX IF NOT EXISTS diagrams_hash ON diagrams(hash);
+CREATE INDEX IF NOT EXISTS diagrams_changed_at ON diagrams(changed_at);
+CREATE INDEX IF NOT EXISTS diagrams_valid ON diagrams(valid);
+"""
+
+# Columns that describe a diagram's content rather than where it sits
+VALIDATION_COLUMNS = ('valid', 'error', 'engine', 'duration_ms', 'validated_at', 'artifact')
+
+
+def markdown_files(root: Path) -> Iterator[Path]:
+    """Markdown files under ``root`` in sorted order, skipping hidden and vendored directories."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith('.'))
+        for name in sorted(filenames):
+            if name.endswith('.md'):
+                yield Path(dirpath) / name
+
+
+def content_hash(content: str) -> str:
+    """Full SHA-256 of a diagram's canonical source (see diagram_canonical.py)."""
+    return mermaid_key(content)
+
+
+def detect_type(content: str) -> str:
+    """Detected diagram type name, using the resilient generator's single-pass matcher."""
+    match = ResilientDiagramGenerator.DIAGRAM_TYPE_RE.match(content)
+    return DiagramType[match.lastgroup].value if match else DiagramType.UNKNOWN.value
+
+
+class DiagramInventory:
+    """SQLite-backed index of Mermaid diagrams, keyed by file and diagram index."""
+
+    def __init__(self, db_path: Path = DEFAULT_DB):
+        """
+        Open (or create) an inventory.
+
+        Args:
+            db_path: SQLite database file. Stored paths are relative to its directory.
+        """
+        self.db_path = db_path
+        self.root = db_path.resolve().parent
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self) -> 'DiagramInventory':
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.close()
+        return False
+
+    def close(self):
+        """Commit and close the database."""
+        self.conn.commit()
+        self.conn.close()
+
+    def key(self, path: Path) -> str:
+        """Stable inventory key for a file: POSIX path relative to the database directory."""
+        resolved = path.resolve()
+        try:
+            return resolved.relative_to(self.root).as_posix()
+        except ValueError:
+            return resolved.as_posix()
+
+    # -- scanning ---------------------------------------------------------
+
+    def scan(self, paths: List[Path]) -> Dict[str, int]:
+        """
+        Incrementally index Markdown files and directories.
+
+        Files whose mtime and size match the stored values are skipped
+        without being read. Files that disappeared from a scanned directory
+        are dropped together with their diagrams.
+
+        Args:
+            paths: Markdown files and/or directories to scan recursively
+
+        Returns:
+            Counts of files scanned, unchanged and removed, and diagrams indexed
+        """
+        known = {row['path']: (row['mtime_ns'], row['size'])
+                 for row in self.conn.execute('SELECT path, mtime_ns, size FROM files')}
+        stats = {'scanned': 0, 'unchanged': 0, 'removed': 0, 'diagrams': 0}
+        seen = set()
+
+        for root in paths:
+            files = [root] if root.is_file() else markdown_files(root)
+            for md_file in files:
+                key = self.key(md_file)
+                seen.add(key)
+                st = md_file.stat()
+                if known.get(key) == (st.st_mtime_ns, st.st_size):
+                    stats['unchanged'] += 1
+                    continue
+                stats['diagrams'] += self._index_file(md_file, key, st)
+                stats['scanned'] += 1
+
+        for root in paths:
+            if root.is_dir() or not root.exists():
+                prefix = self.key(root)
+                stale = [k for k in known if k not in seen and (prefix == '.' or k == prefix or k.startswith(prefix + '/'))]
+                for key in stale:
+                    self.conn.execute('DELETE FROM files WHERE path = ?', (key,))
+                stats['removed'] += len(stale)
+
+        self.conn.commit()
+        return stats
+
+    def scan_file(self, md_file: Path) -> bool:
+        """Index one Markdown file if it changed since the last scan. Returns True if re-read."""
+        return self.scan([md_file])['scanned'] > 0
+
+    def _index_file(self, md_file: Path, key: str, st: os.stat_result) -> int:
+        """Replace a file's diagrams, carrying validation state over by content hash."""
+        extractor = MermaidExtractor(md_file)
+        now = time.time()
+
+        previous = {row['hash']: dict(row) for row in
+                    self.conn.execute('SELECT * FROM diagrams WHERE path = ?', (key,))}
+
+        self.conn.execute('DELETE FROM diagrams WHERE path = ?', (key,))
+        self.conn.execute(
+            'INSERT OR REPLACE INTO files (path, mtime_ns, size, scanned_at) VALUES (?, ?, ?, ?)',
+            (key, st.st_mtime_ns, st.st_size, now)
+        )
+
+        for diagram in extractor.diagrams:
+            digest = content_hash(diagram.content)
+            prior = previous.get(digest)
+            if prior is None:
+                # Same content elsewhere in the tree: validation results still apply
+                row = self.conn.execute(
+                    'SELECT * FROM diagrams WHERE hash = ? AND validated_at IS NOT NULL '
+                    'ORDER BY validated_at DESC LIMIT 1', (digest,)
+                ).fetchone()
+                carried = {col: row[col] for col in VALIDATION_COLUMNS if col != 'artifact'} if row else {}
+                changed_at = now
+            else:
+                carried = {col: prior[col] for col in VALIDATION_COLUMNS}
+                changed_at = prior['changed_at']
+
+            self.conn.execute(
+                'INSERT INTO diagrams (path, idx, line, hash, diagram_type, first_line, line_count, changed_at, '
+                'valid, error, engine, duration_ms, validated_at, artifact) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, diagram.index, diagram.line_number, digest, detect_type(diagram.content),
+                 diagram.get_first_line(), len(diagram.content.splitlines()), changed_at,
+                 *(carried.get(col) for col in VALIDATION_COLUMNS))
+            )
+        return len(extractor.diagrams)
+
+    # -- recording --------------------------------------------------------
+
+    def record_validation(
+        self,
+        md_file: Path,
+        index: int,
+        error: Optional[str],
+        engine: str,
+        duration_ms: Optional[float] = None
+    ):
+        """
+        Store the result of validating one diagram.
+
+        Args:
+            md_file: Markdown file containing the diagram
+            index: 1-based diagram index within the file
+            error: Error message, or None if the diagram rendered
+            engine: Renderer used ('mmdc' or 'browser')
+            duration_ms: Time the validation took
+        """
+        self.conn.execute(
+            'UPDATE diagrams SET valid = ?, error = ?, engine = ?, duration_ms = ?, validated_at = ? '
+            'WHERE path = ? AND idx = ?',
+            (0 if error else 1, error, engine, duration_ms, time.time(), self.key(md_file), index)
+        )
+
+    def record_artifact(self, md_file: Path, index: int, artifact: str):
+        """Store the rendered image path (as referenced from the Markdown) for one diagram."""
+        self.conn.execute(
+            'UPDATE diagrams SET artifact = ? WHERE path = ? AND idx = ?',
+            (artifact, self.key(md_file), index)
+        )
+
+    # -- queries ----------------------------------------------------------
+
+    def _rows(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def diagrams(self, path: Optional[Path] = None) -> List[Dict[str, Any]]:
+        """All indexed diagrams, optionally limited to one Markdown file."""
+        if path is not None:
+            return self._rows('SELECT * FROM diagrams WHERE path = ? ORDER BY idx', (self.key(path),))
+        return self._rows('SELECT * FROM diagrams ORDER BY path, idx')
+
+    def failing(self) -> List[Dict[str, Any]]:
+        """Diagrams whose last validation failed."""
+        return self._rows('SELECT * FROM diagrams WHERE valid = 0 ORDER BY path, idx')
+
+    def changed_since(self, timestamp: float) -> List[Dict[str, Any]]:
+        """Diagrams whose content first appeared at their location after ``timestamp``."""
+        return self._rows('SELECT * FROM diagrams WHERE changed_at > ? ORDER BY changed_at DESC', (timestamp,))
+
+    def duplicates(self) -> List[Dict[str, Any]]:
+        """Groups of diagrams with identical content, largest groups first."""
+        groups: Dict[str, Dict[str, Any]] = {}
+        for row in self.conn.execute(
+            'SELECT * FROM diagrams WHERE hash IN '
+            '(SELECT hash FROM diagrams GROUP BY hash HAVING COUNT(*) > 1) ORDER BY hash, path, idx'
+        ):
+            group = groups.setdefault(row['hash'], {
+                'hash': row['hash'], 'diagram_type': row['diagram_type'],
+                'first_line': row['first_line'], 'locations': [],
+            })
+            group['locations'].append({'path': row['path'], 'idx': row['idx'], 'line': row['line']})
+        return sorted(groups.values(), key=lambda g: -len(g['locations']))
+
+
+def parse_since(value: str) -> float:
+    """Parse an ISO date/datetime or a Unix timestamp into epoch seconds."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an ISO date or Unix timestamp, got '{value}'")
+
+
+def format_row(row: Dict[str, Any]) -> str:
+    """One-line human summary of a diagram row."""
+    status = {1: '✅', 0: '❌'}.get(row['valid'], '·')
+    line = f"{status} {row['path']}:{row['line']}  #{row['idx']}  {row['diagram_type']:<12} {row['first_line']}"
+    if row['valid'] == 0 and row['error']:
+        line += f"\n      {row['error'].splitlines()[0]}"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Persistent inventory of Mermaid diagrams across a docs tree',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Index all Markdown under docs/ (re-reads only changed files)
+  python diagram_inventory.py scan docs/
+
+  # Everything that failed its last validation
+  python diagram_inventory.py failing
+
+  # Diagrams added or edited since a date
+  python diagram_inventory.py changed-since 2026-10-01
+
+  # Copy-pasted diagrams
+  python diagram_inventory.py duplicates --json
+        """
+    )
+    parser.add_argument('--db', type=Path, default=DEFAULT_DB,
+                        help=f'Inventory database (default: {DEFAULT_DB})')
+    parser.add_argument('--json', action='store_true', help='Output JSON')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    scan = sub.add_parser('scan', help='Index Markdown files incrementally')
+    scan.add_argument('paths', type=Path, nargs='+', help='Markdown files or directories')
+
+    listing = sub.add_parser('list', help='List indexed diagrams')
+    listing.add_argument('--path', type=Path, help='Only diagrams from this Markdown file')
+
+    sub.add_parser('failing', help='Diagrams whose last validation failed')
+
+    since = sub.add_parser('changed-since', help='Diagrams changed after a date')
+    since.add_argument('since', type=parse_since, help='ISO date/datetime or Unix timestamp')
+
+    sub.add_parser('duplicates', help='Diagrams with identical content')
+
+    args = parser.parse_args()
+
+    with DiagramInventory(args.db) as inventory:
+        if args.command == 'scan':
+            start = time.perf_counter()
+            stats = inventory.scan(args.paths)
+            stats['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            if args.json:
+                print(json.dumps(stats, indent=2))
+            else:
+                print(f"✓ Scanned {stats['scanned']} file(s), {stats['unchanged']} unchanged, "
+                      f"{stats['removed']} removed; {stats['diagrams']} diagram(s) indexed "
+                      f"in {stats['elapsed_ms']} ms")
+            return
+
+        if args.command == 'duplicates':
+            groups = inventory.duplicates()
+            if args.json:
+                print(json.dumps(groups, indent=2))
+                return
+            for group in groups:
+                print(f"{len(group['locations'])}× {group['diagram_type']}: {group['first_line']}")
+                for loc in group['locations']:
+                    print(f"    {loc['path']}:{loc['line']}  #{loc['idx']}")
+            print(f"\n{len(groups)} duplicated diagram(s)")
+            return
+
+        if args.command == 'list':
+            rows = inventory.diagrams(args.path)
+        elif args.command == 'failing':
+            rows = inventory.failing()
+        else:
+            rows = inventory.changed_since(args.since)
+
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            for row in rows:
+                print(format_row(row))
+            print(f"\n{len(rows)} diagram(s)")
+
+    if args.command == 'failing' and rows:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,733 @@
+#!/usr/bin/env python3
+"""
+Partition oversized flowcharts and class diagrams into independently renderable parts.
+
+Layout cost grows superlinearly with graph size, so big generated
+architecture diagrams hit the render and validation timeouts. This module
+parses flowchart and class diagram sources into a graph and splits it:
+
+1. into connected components, which share no edges and lay out independently
+2. a component that is still too big, along its top-level ``subgraph``
+   (flowchart) or ``namespace`` (class diagram) blocks; loose nodes go with
+   the nearest block
+3. the pieces are packed into parts of at most ``max_nodes`` nodes
+
+Edges that cross parts stay in the part of their first node and point at a
+dashed placeholder of the node in the other part. Global statements
+(``classDef``, ``linkStyle default``, titles, ``direction`` of class
+diagrams) are repeated in every part; numbered ``linkStyle`` statements are
+dropped, because edge numbers change. Pieces that cannot be split further
+stay oversized and are flagged in the report.
+
+compose_svg() and compose_png() put rendered parts back into one image,
+side by side for top-down diagrams and stacked for left-right ones.
+
+Usage:
+    # Which parts would a diagram be rendered in, and which are expensive?
+    python diagram_partition.py architecture.mmd --max-nodes 100
+
+    # Write the parts as .mmd files
+    python diagram_partition.py architecture.mmd --output-dir parts/
+
+    # Render or validate partitioned (opt-in)
+    python mermaid_to_image.py architecture.mmd architecture.svg --partition
+    python extract_mermaid.py docs/design.md --validate --partition 100
+
+Requirements:
+    - Python 3.7+ (stdlib only)
+    - Optional: Pillow, to compose PNG parts into one image
+      (without it, PNG parts are written as <name>.part-N.png)
+"""
+
+import argparse
+import json
+import re
+import sys
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple
+
+from diagram_canonical import canonical_mermaid
+from render_cost import heuristic_ms
+
+try:
+    from PIL import Image
+except ImportError:  # PNG parts cannot be composed; callers write them separately
+    Image = None
+
+
+DEFAULT_MAX_NODES = 100
+
+# Parts estimated above this are reported as expensive
+EXPENSIVE_MS = 10000.0
+
+FLOWCHART_TYPES = {'graph', 'flowchart', 'flowchart-elk'}
+CLASS_TYPES = {'classDiagram', 'classDiagram-v2'}
+
+# Gap between composed parts, in the parts' own units (px)
+COMPOSE_GAP = 40
+
+PLACEHOLDER_STYLE = 'stroke-dasharray: 5 5'
+
+QUOTED_PATTERN = re.compile(r'"[^"]*"')
+
+# Flowchart links: -->, ---, -.->, ==>, ~~~, <-->, x--x, o--o, and the
+# openers/closers of text links (-- text -->, -. text .->, == text ==>)
+LINK_PATTERN = re.compile(
+    r'\s*(?:<|(?<!\w)[xo](?=[-=.]))?(?:-{2,}|={2,}|-\.+-|-\.|\.+-|~{3,})(?:>|[xo](?!\w))?\s*'
+)
+TEXT_LINK_OPENERS = {'--', '==', '-.'}
+EDGE_LABEL_PATTERN = re.compile(r'^\s*\|[^|]*\|')
+FLOW_NODE_PATTERN = re.compile(r'\s*([\w][\w-]*)')
+SHAPE_START = ('[', '(', '{', '>', '@{')
+
+CLASS_NAME = r'`[^`]+`|[\w.]+'
+CLASS_RELATION_PATTERN = re.compile(
+    rf'^({CLASS_NAME})(?:~[^~]*~)?\s*(?:"[^"]*"\s*)?'
+    r'(?:<\|?|[*o])?(?:--|\.\.)(?:\|?>|[*o])?'
+    rf'\s*(?:"[^"]*"\s*)?({CLASS_NAME})'
+)
+CLASS_MEMBER_PATTERN = re.compile(rf'^({CLASS_NAME})(?:~[^~]*~)?\s*:')
+CLASS_STATEMENT_PATTERN = re.compile(rf'^class\s+({CLASS_NAME})')
+ANNOTATION_PATTERN = re.compile(rf'^<<[^>]*>>\s*({CLASS_NAME})')
+NOTE_FOR_PATTERN = re.compile(rf'^note\s+for\s+({CLASS_NAME})')
+
+GLOBAL_PREFIXES = ('classDef', 'title', 'accTitle', 'accDescr')
+
+
+@dataclass
+class Statement:
+    """One statement of a diagram body."""
+    text: str
+    kind: str                   # 'global', 'graph', 'attached', 'open', 'close', 'dropped'
+    nodes: List[str] = field(default_factory=list)
+    edges: int = 0
+    block: Optional[int] = None  # top-level subgraph/namespace the statement is in
+
+
+@dataclass
+class Partition:
+    """One renderable part of a partitioned diagram."""
+    index: int
+    source: str
+    nodes: int
+    edges: int
+    cut_edges: int
+    estimate_ms: float
+    oversized: bool
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "nodes": self.nodes,
+            "edges": self.edges,
+            "cut_edges": self.cut_edges,
+            "estimate_ms": round(self.estimate_ms, 1),
+            "oversized": self.oversized,
+        }
+
+
+@dataclass
+class PartitionPlan:
+    """How a diagram is split; a single part means it is rendered whole."""
+    diagram_type: str
+    direction: str
+    nodes: int
+    parts: List[Partition]
+    warnings: List[str] = field(default_factory=list)
+
+    @property
+    def horizontal(self) -> bool:
+        """True if parts are composed side by side (top-down diagrams)."""
+        return self.direction not in ('LR', 'RL')
+
+    def expensive(self, threshold_ms: float = EXPENSIVE_MS) -> List[Partition]:
+        """Parts that are oversized or estimated above ``threshold_ms``."""
+        return [part for part in self.parts if part.oversized or part.estimate_ms > threshold_ms]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "diagram_type": self.diagram_type,
+            "direction": self.direction,
+            "nodes": self.nodes,
+            "parts": [part.to_dict() for part in self.parts],
+            "warnings": self.warnings,
+        }
+
+
+def _mask_quotes(text: str) -> str:
+    """Blank out quoted strings, keeping offsets, so labels cannot look like syntax."""
+    return QUOTED_PATTERN.sub(lambda m: '"' + '\0' * (len(m.group(0)) - 2) + '"', text)
+
+
+def _split_semicolons(line: str) -> List[str]:
+    masked = _mask_quotes(line)
+    parts = []
+    start = 0
+    for i, char in enumerate(masked):
+        if char == ';':
+            parts.append(line[start:i])
+            start = i + 1
+    parts.append(line[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _join_statements(lines: List[str], class_diagram: bool) -> List[str]:
+    """Lines to statements: multi-line Markdown labels and class bodies are one statement."""
+    statements = []
+    pending: List[str] = []
+    markdown_depth = 0
+    in_class_body = False
+    for line in lines:
+        pending.append(line)
+        markdown_depth = max(0, markdown_depth + line.count('"`') - line.count('`"'))
+        stripped = line.strip()
+        if class_diagram and not in_class_body and stripped.startswith('class ') and stripped.endswith('{'):
+            in_class_body = True
+        elif in_class_body and stripped == '}':
+            in_class_body = False
+        if markdown_depth or in_class_body:
+            continue
+        text = '\n'.join(pending)
+        pending = []
+        if class_diagram or '\n' in text:
+            statements.append(text)
+        else:
+            statements.extend(_split_semicolons(text))
+    if pending:
+        statements.append('\n'.join(pending))
+    return statements
+
+
+def _flow_nodes(text: str) -> Tuple[List[str], int, Dict[str, str]]:
+    """
+    Node ids, edge count and node definitions (id -> text with shape) of a flowchart statement.
+    """
+    masked = _mask_quotes(text)
+    links = list(LINK_PATTERN.finditer(masked))
+    bounds = [0] + [pos for link in links for pos in (link.start(), link.end())] + [len(text)]
+    segments = [(bounds[i], bounds[i + 1]) for i in range(0, len(bounds), 2)]
+    tokens = [link.group(0).strip() for link in links]
+
+    nodes: List[str] = []
+    definitions: Dict[str, str] = {}
+    edges = 0
+    for i, (start, end) in enumerate(segments):
+        # "A -- text --> B": the segment between an opener and the next link is a label
+        if 0 < i < len(segments) - 1 and tokens[i - 1] in TEXT_LINK_OPENERS:
+            continue
+        if i > 0:
+            edges += 1
+        segment = text[start:end]
+        label = EDGE_LABEL_PATTERN.match(_mask_quotes(segment))
+        if label:
+            segment = segment[label.end():]
+        offset = 0
+        for piece in _mask_quotes(segment).split('&'):
+            original = segment[offset:offset + len(piece)]
+            offset += len(piece) + 1
+            match = FLOW_NODE_PATTERN.match(piece)
+            if not match:
+                continue
+            node = match.group(1)
+            nodes.append(node)
+            if original[match.end():].lstrip().startswith(SHAPE_START):
+                definitions.setdefault(node, original.strip())
+    return nodes, edges, definitions
+
+
+def _class_id(name: str) -> str:
+    return name.strip('`')
+
+
+def _class_nodes(text: str) -> Tuple[List[str], int]:
+    """Class ids and relation count of a class diagram statement."""
+    stripped = text.strip()
+    for pattern in (CLASS_STATEMENT_PATTERN, ANNOTATION_PATTERN, NOTE_FOR_PATTERN):
+        match = pattern.match(stripped)
+        if match:
+            return [_class_id(match.group(1))], 0
+    match = CLASS_RELATION_PATTERN.match(stripped)
+    if match:
+        return [_class_id(match.group(1)), _class_id(match.group(2))], 1
+    match = CLASS_MEMBER_PATTERN.match(stripped)
+    if match:
+        return [_class_id(match.group(1))], 0
+    return [], 0
+
+
+def _classify(text: str, class_diagram: bool, definitions: Dict[str, str]) -> Statement:
+    stripped = text.strip()
+    words = stripped.split()
+    first = words[0] if words else ''
+
+    if first.startswith(GLOBAL_PREFIXES):
+        return Statement(text, 'global')
+    if first == 'linkStyle':
+        return Statement(text, 'global' if words[1:2] == ['default'] else 'dropped')
+
+    if class_diagram:
+        if first == 'direction':
+            return Statement(text, 'global')
+        if first == 'namespace':
+            return Statement(text, 'open')
+        if stripped == '}':
+            return Statement(text, 'close')
+        if first in ('style', 'click', 'link', 'callback') and len(words) > 1:
+            return Statement(text, 'attached', [_class_id(words[1])])
+        if first == 'cssClass' and len(words) > 2:
+            names = [_class_id(name.strip()) for name in words[1].strip('"').split(',') if name.strip()]
+            return Statement(text, 'attached', names)
+        nodes, edges = _class_nodes(stripped)
+        return Statement(text, 'graph', nodes, edges)
+
+    if first == 'subgraph':
+        # "subgraph Title" without an id gets a generated one that edges cannot use
+        named = len(words) > 1 and not words[1].startswith('"')
+        return Statement(text, 'open', [words[1].split('[', 1)[0]] if named else [])
+    if stripped == 'end':
+        return Statement(text, 'close')
+    if first == 'direction':
+        return Statement(text, 'graph')
+    if first in ('style', 'click') and len(words) > 1:
+        return Statement(text, 'attached', [words[1]])
+    if first == 'class' and len(words) > 2:
+        return Statement(text, 'attached', [name for name in words[1].split(',') if name])
+
+    nodes, edges, found = _flow_nodes(stripped)
+    for node, definition in found.items():
+        definitions.setdefault(node, definition)
+    return Statement(text, 'graph', nodes, edges)
+
+
+def _attached_text(statement: Statement, node: str, class_diagram: bool) -> str:
+    """The part of a ``class``/``cssClass`` statement that applies to one node."""
+    words = statement.text.split()
+    if words[0] == 'class' and not class_diagram:
+        return f"class {node} {' '.join(words[2:])}"
+    if words[0] == 'cssClass':
+        return f'cssClass "{node}" {" ".join(words[2:])}'
+    return statement.text
+
+
+class _Units:
+    """Union-find over partition units: ('block', i) or ('node', id)."""
+
+    def __init__(self):
+        self.parent: Dict[Tuple[str, Any], Tuple[str, Any]] = {}
+
+    def find(self, unit):
+        self.parent.setdefault(unit, unit)
+        while self.parent[unit] != unit:
+            self.parent[unit] = self.parent[self.parent[unit]]
+            unit = self.parent[unit]
+        return unit
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+
+def partition_diagram(source: str, max_nodes: int = DEFAULT_MAX_NODES) -> PartitionPlan:
+    """
+    Split a flowchart or class diagram into parts of at most ``max_nodes`` nodes.
+
+    Args:
+        source: Mermaid diagram code
+        max_nodes: Node budget per part
+
+    Returns:
+        PartitionPlan; a single part (the original source) if the diagram is
+        small enough or not a flowchart or class diagram
+    """
+    lines = canonical_mermaid(source).split('\n')
+    header: List[str] = []
+    if lines and lines[0] == '---':
+        end = lines.index('---', 1) if '---' in lines[1:] else 0
+        header, lines = lines[:end + 1], lines[end + 1:]
+    while lines and lines[0].startswith('%%{'):
+        header.append(lines.pop(0))
+
+    declaration = lines[0] if lines else ''
+    diagram_type = declaration.split(None, 1)[0].rstrip(';') if declaration else ''
+    class_diagram = diagram_type in CLASS_TYPES
+    if diagram_type not in FLOWCHART_TYPES and not class_diagram:
+        return _whole(source, diagram_type, 'TB', 0)
+
+    body_lines = lines[1:]
+    if not class_diagram:
+        # "graph TD; A-->B" keeps its first statements on the declaration line
+        first, *rest = _split_semicolons(declaration) or ['']
+        header.append(first)
+        body_lines = rest + body_lines
+        words = first.split()
+        direction = words[1] if len(words) > 1 else 'TB'
+    else:
+        header.append(declaration)
+        direction = 'TB'
+
+    definitions: Dict[str, str] = {}
+    statements = [_classify(text, class_diagram, definitions)
+                  for text in _join_statements(body_lines, class_diagram)]
+    if class_diagram:
+        for statement in statements:
+            words = statement.text.split()
+            if statement.kind == 'global' and words[0] == 'direction' and len(words) > 1:
+                direction = words[1]
+
+    # Top-level blocks, and which block each statement belongs to
+    depth = 0
+    blocks = 0
+    block_ids: Dict[str, int] = {}
+    for statement in statements:
+        if statement.kind == 'open':
+            if depth == 0:
+                blocks += 1
+            depth += 1
+            for node in statement.nodes:
+                block_ids[node] = blocks - 1
+        if depth > 0:
+            statement.block = blocks - 1
+        if statement.kind == 'close':
+            depth = max(0, depth - 1)
+
+    units = _Units()
+    owner: Dict[str, Tuple[str, Any]] = {node: ('block', block) for node, block in block_ids.items()}
+    for block in range(blocks):
+        units.find(('block', block))
+    for statement in statements:
+        if statement.kind not in ('graph', 'attached', 'open'):
+            continue
+        here = ('block', statement.block) if statement.block is not None else None
+        for node in statement.nodes:
+            owner.setdefault(node, here or ('node', node))
+            units.find(owner[node])
+        if statement.kind == 'graph':
+            linked = [owner[node] for node in statement.nodes] + ([here] if here else [])
+            for unit in linked[1:]:
+                units.union(linked[0], unit)
+
+    # Subgraph ids can be linked to, but are not nodes of their own
+    sizes: Dict[Tuple[str, Any], int] = {}
+    for node, unit in owner.items():
+        if node not in block_ids:
+            sizes[unit] = sizes.get(unit, 0) + 1
+    total = sum(sizes.values())
+    if total <= max_nodes:
+        return _whole(source, diagram_type, direction, total)
+
+    unit_part = _assign_parts(statements, owner, units, sizes, max_nodes)
+    part_count = max(unit_part.values()) + 1
+    if part_count < 2:
+        return _whole(source, diagram_type, direction, total, oversized=True)
+
+    node_part = {node: unit_part[unit] for node, unit in owner.items()}
+    bodies: List[List[str]] = [[] for _ in range(part_count)]
+    externals: List[Dict[str, None]] = [{} for _ in range(part_count)]
+    edges = [0] * part_count
+    cut_edges = [0] * part_count
+    warnings = []
+
+    for statement in statements:
+        if statement.kind == 'dropped':
+            if not warnings:
+                warnings.append("numbered linkStyle statements were dropped (edge numbers change per part)")
+            continue
+        if statement.kind == 'global':
+            for body in bodies:
+                body.append(statement.text)
+            continue
+        if statement.kind == 'attached':
+            for node in statement.nodes:
+                bodies[node_part[node]].append(_attached_text(statement, node, class_diagram))
+            continue
+
+        if statement.block is not None:
+            part = unit_part[('block', statement.block)]
+        elif statement.nodes:
+            part = node_part[statement.nodes[0]]
+        else:
+            part = 0
+        bodies[part].append(statement.text)
+        edges[part] += statement.edges
+        outside = [node for node in statement.nodes if node_part[node] != part]
+        if outside and statement.kind == 'graph':
+            cut_edges[part] += max(1, statement.edges)
+        for node in outside:
+            externals[part][node] = None
+
+    owned = [0] * part_count
+    for unit, size in sizes.items():
+        owned[unit_part[unit]] += size
+
+    parts = []
+    for index in range(part_count):
+        placeholders = []
+        for node in externals[index]:
+            if class_diagram:
+                placeholders.append(f"class {node}")
+            else:
+                placeholders.append(definitions.get(node, node))
+            placeholders.append(f"style {node} {PLACEHOLDER_STYLE}")
+        part_source = '\n'.join(header + bodies[index] + placeholders)
+        nodes = owned[index] + len(externals[index])
+        parts.append(Partition(
+            index=index + 1,
+            source=part_source,
+            nodes=nodes,
+            edges=edges[index],
+            cut_edges=cut_edges[index],
+            estimate_ms=heuristic_ms(part_source),
+            oversized=owned[index] > max_nodes,
+        ))
+
+    return PartitionPlan(diagram_type, direction, total, parts, warnings)
+
+
+def _whole(source: str, diagram_type: str, direction: str, nodes: int, oversized: bool = False) -> PartitionPlan:
+    return PartitionPlan(diagram_type, direction, nodes, [Partition(
+        index=1, source=source, nodes=nodes, edges=0, cut_edges=0,
+        estimate_ms=heuristic_ms(source), oversized=oversized,
+    )])
+
+
+def _assign_parts(
+    statements: List[Statement],
+    owner: Dict[str, Tuple[str, Any]],
+    units: _Units,
+    sizes: Dict[Tuple[str, Any], int],
+    max_nodes: int
+) -> Dict[Tuple[str, Any], int]:
+    """Group units into pieces (components, or blocks of oversized components) and pack them into parts."""
+    order = list(dict.fromkeys(list(units.parent) + list(sizes)))
+
+    components: Dict[Any, List[Tuple[str, Any]]] = {}
+    for unit in order:
+        components.setdefault(units.find(unit), []).append(unit)
+
+    neighbours: Dict[Tuple[str, Any], List[Tuple[str, Any]]] = {}
+    for statement in statements:
+        if statement.kind != 'graph':
+            continue
+        linked = [owner[node] for node in statement.nodes]
+        if statement.block is not None:
+            linked.append(('block', statement.block))
+        for a, b in zip(linked, linked[1:]):
+            if a != b:
+                neighbours.setdefault(a, []).append(b)
+                neighbours.setdefault(b, []).append(a)
+
+    pieces: List[List[Tuple[str, Any]]] = []
+    for members in components.values():
+        blocks = [unit for unit in members if unit[0] == 'block']
+        if sum(sizes.get(unit, 0) for unit in members) <= max_nodes or len(blocks) < 2:
+            pieces.append(members)
+            continue
+
+        # Split along blocks; loose nodes join the nearest block (breadth-first)
+        nearest: Dict[Tuple[str, Any], Tuple[str, Any]] = {block: block for block in blocks}
+        queue = deque(blocks)
+        while queue:
+            unit = queue.popleft()
+            for neighbour in neighbours.get(unit, []):
+                if neighbour not in nearest:
+                    nearest[neighbour] = nearest[unit]
+                    queue.append(neighbour)
+        groups: Dict[Any, List[Tuple[str, Any]]] = {}
+        for unit in members:
+            groups.setdefault(nearest.get(unit, 'loose'), []).append(unit)
+        pieces.extend(groups.values())
+
+    # First-fit decreasing; equal sizes keep document order
+    pieces.sort(key=lambda piece: -sum(sizes.get(unit, 0) for unit in piece))
+    loads: List[int] = []
+    unit_part: Dict[Tuple[str, Any], int] = {}
+    for piece in pieces:
+        size = sum(sizes.get(unit, 0) for unit in piece)
+        target = next((i for i, load in enumerate(loads) if load + size <= max_nodes), None)
+        if target is None:
+            target = len(loads)
+            loads.append(0)
+        loads[target] += size
+        for unit in piece:
+            unit_part[unit] = target
+    return unit_part
+
+
+def format_plan(plan: PartitionPlan, threshold_ms: float = EXPENSIVE_MS) -> List[str]:
+    """Report lines: one per part, expensive parts marked."""
+    lines = []
+    for part in plan.parts:
+        flag = ''
+        if part.oversized:
+            flag = '  ⚠️  oversized, cannot be split further'
+        elif part.estimate_ms > threshold_ms:
+            flag = '  ⚠️  expensive'
+        lines.append(f"part {part.index}/{len(plan.parts)}: {part.nodes} nodes, {part.edges} edges, "
+                     f"{part.cut_edges} cut, ~{part.estimate_ms / 1000:.1f}s{flag}")
+    lines.extend(f"note: {warning}" for warning in plan.warnings)
+    return lines
+
+
+def _svg_size(svg: str) -> Tuple[str, float, float]:
+    """Root tag, width and height of an SVG document (from its viewBox, else width/height)."""
+    match = re.search(r'<svg\b[^>]*>', svg)
+    if not match:
+        raise ValueError("not an SVG document")
+    tag = match.group(0)
+    view_box = re.search(r'viewBox="([^"]+)"', tag)
+    if view_box:
+        values = [float(v) for v in view_box.group(1).replace(',', ' ').split()]
+        return tag, values[2], values[3]
+    width = re.search(r'\swidth="([\d.]+)', tag)
+    height = re.search(r'\sheight="([\d.]+)', tag)
+    return tag, float(width.group(1)) if width else 0.0, float(height.group(1)) if height else 0.0
+
+
+def compose_svg(parts: List[bytes], horizontal: bool = True, gap: int = COMPOSE_GAP) -> bytes:
+    """
+    Place rendered SVG parts in one SVG document.
+
+    Each part keeps its own styles: its root element becomes a nested <svg>
+    and its id (which Mermaid's CSS and markers are scoped by) is made unique.
+
+    Args:
+        parts: SVG documents, in order
+        horizontal: Side by side (True) or stacked (False)
+        gap: Space between parts
+
+    Returns:
+        The composed SVG document
+    """
+    nested = []
+    offset = 0.0
+    extent = 0.0
+    for index, data in enumerate(parts, start=1):
+        svg = data.decode('utf-8')
+        tag, width, height = _svg_size(svg)
+        inner = svg[svg.index(tag) + len(tag):svg.rindex('</svg>')]
+
+        root_id = re.search(r'\sid="([^"]+)"', tag)
+        if root_id:
+            unique = f"{root_id.group(1)}-part{index}"
+            inner = inner.replace(root_id.group(1), unique)
+            tag = tag.replace(root_id.group(0), f' id="{unique}"')
+        tag = re.sub(r'\s(?:width|height|x|y|style)="[^"]*"', '', tag)
+        x, y = (offset, 0.0) if horizontal else (0.0, offset)
+        tag = tag[:-1].rstrip('/') + f' x="{x:g}" y="{y:g}" width="{width:g}" height="{height:g}">'
+        nested.append(tag + inner + '</svg>')
+
+        offset += (width if horizontal else height) + gap
+        extent = max(extent, height if horizontal else width)
+
+    total = max(0.0, offset - gap)
+    width, height = (total, extent) if horizontal else (extent, total)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+        f'width="{width:g}" height="{height:g}" viewBox="0 0 {width:g} {height:g}">'
+        + ''.join(nested) + '</svg>\n'
+    ).encode('utf-8')
+
+
+def compose_png(paths: List[Path], output_path: Path, horizontal: bool = True, gap: int = COMPOSE_GAP):
+    """
+    Paste rendered PNG parts into one image (requires Pillow).
+
+    Args:
+        paths: PNG parts, in order
+        output_path: Composed PNG
+        horizontal: Side by side (True) or stacked (False)
+        gap: Space between parts, in pixels
+
+    Raises:
+        RuntimeError: If Pillow is not installed
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is required to compose PNG parts (pip install pillow)")
+    images = [Image.open(path) for path in paths]
+    try:
+        if horizontal:
+            size = (sum(image.width for image in images) + gap * (len(images) - 1), max(image.height for image in images))
+        else:
+            size = (max(image.width for image in images), sum(image.height for image in images) + gap * (len(images) - 1))
+        canvas = Image.new('RGBA', size, (0, 0, 0, 0))
+        offset = 0
+        for image in images:
+            canvas.paste(image.convert('RGBA'), (offset, 0) if horizontal else (0, offset))
+            offset += (image.width if horizontal else image.height) + gap
+        canvas.save(output_path)
+    finally:
+        for image in images:
+            image.close()
+
+
+def can_compose(output_format: str) -> bool:
+    """True if parts rendered as ``output_format`` are composed into one image (SVG, or PNG with Pillow)."""
+    return output_format == 'svg' or (output_format == 'png' and Image is not None)
+
+
+def part_path(output_path: Path, index: int) -> Path:
+    """Where an uncomposed part is written: <name>.part-N.<ext>."""
+    return output_path.with_name(f"{output_path.stem}.part-{index}{output_path.suffix}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Split oversized flowcharts and class diagrams into renderable parts',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Report the parts and their estimated render cost
+  python diagram_partition.py architecture.mmd
+
+  # Smaller parts, written out as .mmd files
+  python diagram_partition.py architecture.mmd --max-nodes 60 --output-dir parts/
+
+  # Machine-readable report
+  python diagram_partition.py architecture.mmd --json
+        """
+    )
+    parser.add_argument('input', type=Path, help='Mermaid file (.mmd)')
+    parser.add_argument('--max-nodes', type=int, default=DEFAULT_MAX_NODES,
+                        help=f'Node budget per part (default: {DEFAULT_MAX_NODES})')
+    parser.add_argument('--output-dir', type=Path, help='Write each part as <name>.part-N.mmd here')
+    parser.add_argument('--json', action='store_true', help='Print the plan as JSON')
+    args = parser.parse_args()
+
+    if not args.input.is_file():
+        print(f"ERROR: File not found: {args.input}", file=sys.stderr)
+        sys.exit(1)
+
+    plan = partition_diagram(args.input.read_text(encoding='utf-8'), args.max_nodes)
+
+    if args.output_dir and len(plan.parts) > 1:
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        for part in plan.parts:
+            part_path(args.output_dir / args.input.name, part.index).write_text(part.source + '\n', encoding='utf-8')
+
+    if args.json:
+        print(json.dumps(plan.to_dict(), indent=2))
+        return
+
+    if plan.diagram_type not in FLOWCHART_TYPES | CLASS_TYPES:
+        print(f"Not a flowchart or class diagram ({plan.diagram_type or 'empty'}): rendered whole")
+        return
+    if len(plan.parts) == 1:
+        if plan.parts[0].oversized:
+            print(f"⚠️  {plan.nodes} nodes in one connected graph without subgraphs to split along: rendered whole "
+                  f"(~{plan.parts[0].estimate_ms / 1000:.1f}s)")
+        else:
+            print(f"✅ {plan.nodes} nodes: within the budget of {args.max_nodes}, rendered whole")
+        return
+
+    print(f"{plan.nodes} nodes in {len(plan.parts)} part(s):")
+    for line in format_plan(plan):
+        print(f"  {line}")
+    if args.output_dir:
+        print(f"\n✓ Parts written to {args.output_dir}/")
+
+
+if __name__ == '__main__':
+    main()
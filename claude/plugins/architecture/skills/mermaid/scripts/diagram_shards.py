@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Deterministic sharding of diagram workloads across CI nodes.
+
+Every node runs the same command with its own ``--shard i/N`` (1-based) and
+gets a disjoint slice of the work, computed from the item keys alone (a
+relative path, or path plus diagram hash), never from file system order,
+Python's hash seed or the node:
+
+- Without weights an item goes to shard ``sha256(key) % N + 1``.
+- With ``--shard-weights REPORT`` (a previous merged report) items are
+  balanced by past render time: longest first onto the least-loaded shard,
+  ties broken by hash. Items the report does not know weigh the median.
+
+Each shard writes a JSON report (``--report``). ``merge-reports`` combines
+the shard reports into one summary and exit code, and the merged report
+doubles as the weights file for the next run.
+
+Usage:
+    python mermaid_to_image.py diagrams/ out/ --shard 2/4 --report shard-2.json
+    python extract_mermaid.py docs/design.md --validate --shard 2/4 --report shard-2.json
+    python render_excalidraw.py scenes/*.excalidraw --output-dir out/ --shard 2/4 --report shard-2.json
+
+    # After all shards finished
+    python diagram_shards.py merge-reports shard-*.json -o diagrams-report.json
+
+    # Next run, balanced by the timings of the last one
+    python mermaid_to_image.py diagrams/ out/ --shard 2/4 --shard-weights diagrams-report.json
+
+Requirements:
+    - Python 3.7+ (stdlib only, no external dependencies)
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Callable, TypeVar
+
+
+REPORT_VERSION = 1
+
+T = TypeVar('T')
+
+
+@dataclass(frozen=True)
+class Shard:
+    """One slice of a sharded run: ``index`` of ``count``, 1-based."""
+    index: int
+    count: int
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+
+def parse_shard(value: str) -> Shard:
+    """argparse type for ``i/N``."""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', value)
+    if not match:
+        raise argparse.ArgumentTypeError(f"expected i/N (e.g. 2/4), got {value!r}")
+    index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 1 and N, got {value!r}")
+    return Shard(index, count)
+
+
+def existing_file(value: str) -> Path:
+    """argparse type for a file that must already exist."""
+    path = Path(value)
+    if not path.is_file():
+        raise argparse.ArgumentTypeError(f"file not found: {value}")
+    return path
+
+
+def add_shard_arguments(parser: argparse.ArgumentParser):
+    """Add --shard, --shard-weights and --report to a script's parser."""
+    group = parser.add_argument_group('sharding')
+    group.add_argument('--shard', type=parse_shard, metavar='I/N',
+                       help='Only process the I-th of N deterministic slices of the work (1-based)')
+    group.add_argument('--shard-weights', type=existing_file, metavar='REPORT',
+                       help='Balance shards by the durations in a previous (merged) report')
+    group.add_argument('--report', type=Path, metavar='FILE',
+                       help='Write a JSON report of this run, mergeable with diagram_shards.py merge-reports')
+
+
+def stable_hash(key: str) -> int:
+    """A hash of ``key`` that is the same on every machine and Python process."""
+    return int.from_bytes(hashlib.sha256(key.encode('utf-8')).digest()[:8], 'big')
+
+
+def load_weights(report_path: Optional[Path]) -> Dict[str, float]:
+    """Item durations (ms) by key from a shard or merged report; empty without a path."""
+    if report_path is None:
+        return {}
+    report = json.loads(report_path.read_text(encoding='utf-8'))
+    return {
+        item['key']: float(item['duration_ms'])
+        for item in report.get('items', [])
+        if item.get('duration_ms') is not None
+    }
+
+
+def assign(keys: List[str], count: int, weights: Optional[Dict[str, float]] = None) -> Dict[str, int]:
+    """
+    Map each key to a shard index (1-based).
+
+    Args:
+        keys: Item keys; every node must pass the same set
+        count: Number of shards
+        weights: Past durations by key; balance by them instead of hashing
+
+    Returns:
+        Dict mapping key to shard index
+    """
+    if not weights:
+        return {key: stable_hash(key) % count + 1 for key in keys}
+
+    known = sorted(weights[key] for key in keys if key in weights)
+    default = known[len(known) // 2] if known else 1.0
+
+    # Longest processing time first: each item onto the currently lightest shard
+    loads = [0.0] * count
+    assignment = {}
+    for key in sorted(set(keys), key=lambda k: (-weights.get(k, default), stable_hash(k), k)):
+        target = min(range(count), key=lambda i: (loads[i], i))
+        loads[target] += weights.get(key, default)
+        assignment[key] = target + 1
+    return assignment
+
+
+def select(
+    items: List[T],
+    key: Callable[[T], str],
+    shard: Optional[Shard],
+    weights: Optional[Dict[str, float]] = None
+) -> List[T]:
+    """
+    The items assigned to ``shard``, in their original order.
+
+    Args:
+        items: All items of the run
+        key: Stable key of an item (relative path, path plus diagram hash, ...)
+        shard: This node's shard; None keeps every item
+        weights: Past durations by key (see assign())
+
+    Returns:
+        The selected items
+    """
+    if shard is None:
+        return list(items)
+    assignment = assign([key(item) for item in items], shard.count, weights)
+    return [item for item in items if assignment[key(item)] == shard.index]
+
+
+class ShardReport:
+    """Per-item results of one (possibly sharded) run, written as JSON."""
+
+    def __init__(self, tool: str, shard: Optional[Shard] = None):
+        """
+        Args:
+            tool: Script that produced the report (e.g. mermaid_to_image)
+            shard: The run's shard, None for an unsharded run
+        """
+        self.tool = tool
+        self.shard = shard
+        self.items: List[Dict[str, Any]] = []
+
+    def add(self, key: str, ok: bool, duration_ms: Optional[float] = None, error: Optional[str] = None):
+        """Record one item's outcome."""
+        self.items.append({
+            "key": key,
+            "ok": ok,
+            "duration_ms": round(duration_ms, 1) if duration_ms is not None else None,
+            "error": error,
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": REPORT_VERSION,
+            "tool": self.tool,
+            "shard": str(self.shard) if self.shard else "1/1",
+            "items": self.items,
+            "summary": summarize(self.items),
+        }
+
+    def write(self, path: Path):
+        """Write the report as JSON, creating parent directories."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2) + '\n', encoding='utf-8')
+
+
+def summarize(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    failed = sum(1 for item in items if not item['ok'])
+    return {
+        "total": len(items),
+        "passed": len(items) - failed,
+        "failed": failed,
+        "duration_ms": round(sum(item['duration_ms'] or 0 for item in items), 1),
+    }
+
+
+def merge_reports(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combine shard reports into one.
+
+    Checks that the shards form one complete run: the same N everywhere,
+    every index 1..N present exactly once, and no key reported by two
+    shards. (One shard may report a key repeatedly: the same diagram
+    content twice in one file.)
+
+    Args:
+        reports: Parsed shard reports
+
+    Returns:
+        Merged report with items sorted by key, a summary and a ``problems`` list
+    """
+    problems = []
+    counts = {parse_shard(report['shard']).count for report in reports}
+    if len(counts) > 1:
+        problems.append(f"shard reports disagree on N: {', '.join(map(str, sorted(counts)))}")
+
+    seen_shards: Dict[str, int] = {}
+    for report in reports:
+        seen_shards[report['shard']] = seen_shards.get(report['shard'], 0) + 1
+    for shard, times in sorted(seen_shards.items()):
+        if times > 1:
+            problems.append(f"shard {shard} reported {times} times")
+    if len(counts) == 1:
+        count = counts.pop()
+        missing = [f"{i}/{count}" for i in range(1, count + 1) if f"{i}/{count}" not in seen_shards]
+        if missing:
+            problems.append(f"missing shard(s): {', '.join(missing)}")
+
+    merged = []
+    owners: Dict[str, str] = {}
+    for report in reports:
+        for item in report['items']:
+            owner = owners.setdefault(item['key'], report['shard'])
+            if owner != report['shard']:
+                problems.append(f"{item['key']} reported by shards {owner} and {report['shard']}")
+            merged.append({**item, "shard": report['shard']})
+    merged.sort(key=lambda item: item['key'])
+    return {
+        "version": REPORT_VERSION,
+        "tools": sorted({report['tool'] for report in reports}),
+        "shards": sorted(seen_shards, key=lambda s: parse_shard(s).index),
+        "items": merged,
+        "summary": summarize(merged),
+        "problems": problems,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Combine the JSON reports of sharded diagram runs',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # One summary and exit code for all shards
+  python diagram_shards.py merge-reports shard-*.json -o diagrams-report.json
+
+  # Machine-readable summary
+  python diagram_shards.py merge-reports reports/*.json --json
+        """
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    merge = sub.add_parser('merge-reports', help='Merge shard reports; exit 1 on failures or missing shards')
+    merge.add_argument('reports', type=Path, nargs='+', help='Shard report files (--report output)')
+    merge.add_argument('--output', '-o', type=Path, help='Write the merged report here (usable as --shard-weights)')
+    merge.add_argument('--json', action='store_true', help='Print the merged report as JSON')
+
+    args = parser.parse_args()
+
+    reports = []
+    for path in args.reports:
+        try:
+            reports.append(json.loads(path.read_text(encoding='utf-8')))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"ERROR: Cannot read report {path}: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    merged = merge_reports(reports)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(merged, indent=2) + '\n', encoding='utf-8')
+
+    summary = merged['summary']
+    if args.json:
+        print(json.dumps(merged, indent=2))
+    else:
+        for item in merged['items']:
+            if not item['ok']:
+                print(f"  ❌ {item['key']} (shard {item['shard']}): {item.get('error') or 'failed'}")
+        for problem in merged['problems']:
+            print(f"  ⚠️  {problem}")
+        print(f"\n{'✅' if not summary['failed'] and not merged['problems'] else '❌'} "
+              f"{len(merged['shards'])} shard(s): {summary['passed']}/{summary['total']} passed, "
+              f"{summary['failed']} failed, {summary['duration_ms'] / 1000:.1f}s total")
+
+    sys.exit(1 if summary['failed'] or merged['problems'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Lightweight phase tracing for the diagram scripts.
+
+Records named spans (mmdc spawn, browser launch, template load, render,
+screenshot, guide parse, file I/O, ...) grouped per diagram, and emits a
+timing breakdown as JSON and optionally a Chrome trace-event file that can
+be opened in chrome://tracing or https://ui.perfetto.dev.
+
+Tracing is off by default and a disabled span costs a single attribute
+check, so scripts can instrument their hot paths unconditionally.
+
+Usage (from another script):
+    from diagram_trace import tracer, add_profile_arguments, configure_profiling
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_profiling(args)   # profile is written at exit, including sys.exit()
+
+    with tracer.diagram("overview.mmd"):
+        with tracer.span("mmdc"):
+            subprocess.run([...])
+
+Requirements:
+    - Python 3.7+ (stdlib only, no external dependencies)
+"""
+
+import argparse
+import atexit
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+
+class _NullSpan:
+    """Reusable no-op context manager returned while tracing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Collect timed spans, grouped by the diagram being processed."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.events: List[Dict[str, Any]] = []
+        # A context variable is per thread and per asyncio task, so concurrent
+        # renders on one event loop keep their own diagram label
+        self._diagram_label: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+            'diagram', default=None
+        )
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+
+    def _current_diagram(self) -> Optional[str]:
+        return self._diagram_label.get()
+
+    def _record(self, name: str, category: str, start_ns: int, end_ns: int, args: Dict[str, Any]):
+        event = {
+            "name": name,
+            "cat": category,
+            "diagram": self._current_diagram(),
+            "start_ns": start_ns - self._origin_ns,
+            "dur_ns": end_ns - start_ns,
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def _timed(self, name: str, category: str, args: Dict[str, Any]):
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self._record(name, category, start_ns, time.perf_counter_ns(), args)
+
+    def span(self, name: str, **args: Any):
+        """
+        Time a phase.
+
+        Args:
+            name: Phase name (e.g. "mmdc", "browser_launch", "screenshot")
+            **args: Extra details stored on the trace event
+
+        Returns:
+            Context manager timing the enclosed block
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._timed(name, "phase", args)
+
+    @contextmanager
+    def _diagram(self, label: str):
+        token = self._diagram_label.set(label)
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self._record("diagram", "diagram", start_ns, time.perf_counter_ns(), {"label": label})
+            self._diagram_label.reset(token)
+
+    def diagram(self, label: str):
+        """
+        Attribute all spans in the enclosed block to one diagram.
+
+        Args:
+            label: Diagram identifier (file name, index, ...)
+
+        Returns:
+            Context manager timing the whole diagram
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._diagram(str(label))
+
+    def breakdown(self) -> Dict[str, Any]:
+        """
+        Summarize recorded spans per diagram and phase.
+
+        Returns:
+            Dict with overall wall time and, per diagram, total time and
+            per-phase milliseconds and call counts
+        """
+        with self._lock:
+            events = list(self.events)
+
+        diagrams: Dict[str, Dict[str, Any]] = {}
+        for event in events:
+            label = event["diagram"] or "(global)"
+            if event["cat"] == "diagram":
+                label = event["args"]["label"]
+            entry = diagrams.setdefault(label, {"total_ms": 0.0, "phases": {}})
+            ms = event["dur_ns"] / 1e6
+            if event["cat"] == "diagram":
+                entry["total_ms"] += ms
+                continue
+            phase = entry["phases"].setdefault(event["name"], {"ms": 0.0, "count": 0})
+            phase["ms"] += ms
+            phase["count"] += 1
+
+        for entry in diagrams.values():
+            if not entry["total_ms"]:
+                entry["total_ms"] = sum(p["ms"] for p in entry["phases"].values())
+            entry["total_ms"] = round(entry["total_ms"], 3)
+            for phase in entry["phases"].values():
+                phase["ms"] = round(phase["ms"], 3)
+
+        wall_ms = 0.0
+        if events:
+            start = min(e["start_ns"] for e in events)
+            end = max(e["start_ns"] + e["dur_ns"] for e in events)
+            wall_ms = (end - start) / 1e6
+
+        return {"wall_ms": round(wall_ms, 3), "spans": len(events), "diagrams": diagrams}
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Recorded spans in Chrome trace-event format ("X" complete events)."""
+        with self._lock:
+            events = list(self.events)
+
+        pid = os.getpid()
+        trace_events = []
+        for event in events:
+            args = dict(event["args"])
+            if event["diagram"]:
+                args.setdefault("diagram", event["diagram"])
+            name = event["name"]
+            if event["cat"] == "diagram":
+                name = event["args"]["label"]
+            trace_events.append({
+                "name": name,
+                "cat": event["cat"],
+                "ph": "X",
+                "ts": event["start_ns"] / 1e3,
+                "dur": event["dur_ns"] / 1e3,
+                "pid": pid,
+                "tid": event["tid"],
+                "args": args,
+            })
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+
+# Process-wide tracer used by all diagram scripts
+tracer = Tracer()
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """Add the shared --profile / --profile-output / --trace-events options to a parser."""
+    group = parser.add_argument_group('profiling')
+    group.add_argument('--profile', action='store_true',
+                       help='Print a per-diagram timing breakdown as JSON to stderr')
+    group.add_argument('--profile-output', type=Path, default=None, metavar='FILE',
+                       help='Write the timing breakdown JSON to FILE instead (implies --profile)')
+    group.add_argument('--trace-events', type=Path, default=None, metavar='FILE',
+                       help='Write a Chrome trace-event file (implies profiling)')
+
+
+def configure_profiling(args: argparse.Namespace):
+    """
+    Enable the shared tracer if profiling was requested on the command line.
+
+    The requested outputs are written when the process exits, so scripts
+    that leave through ``sys.exit()`` still produce a profile.
+    """
+    tracer.enabled = bool(
+        getattr(args, 'profile', False)
+        or getattr(args, 'profile_output', None)
+        or getattr(args, 'trace_events', None)
+    )
+    if tracer.enabled:
+        atexit.register(write_profile, args)
+
+
+def write_profile(args: argparse.Namespace):
+    """Emit the profile outputs requested on the command line."""
+    if not tracer.enabled:
+        return
+
+    profile_output = getattr(args, 'profile_output', None)
+    if profile_output:
+        profile_output.write_text(json.dumps(tracer.breakdown(), indent=2) + '\n', encoding='utf-8')
+    elif getattr(args, 'profile', False):
+        print(json.dumps(tracer.breakdown(), indent=2), file=sys.stderr)
+
+    trace_events = getattr(args, 'trace_events', None)
+    if trace_events:
+        trace_events.write_text(json.dumps(tracer.chrome_trace()), encoding='utf-8')
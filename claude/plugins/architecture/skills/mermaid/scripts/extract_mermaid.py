@@ -21,19 +21,41 @@ Usage:
     # Replace diagrams with image references
     python extract_mermaid.py document.md --replace-with-images --image-format png
 
+    # Validate in one shared headless browser instead of one mmdc per diagram
+    python extract_mermaid.py document.md --validate --engine browser
+
+    # Record diagrams, validation results and image paths in an inventory
+    python extract_mermaid.py document.md --validate --inventory .diagram-inventory.db
+
+    # PR check: validate only diagrams new or modified since the base branch
+    python extract_mermaid.py docs/ --validate --changed-since origin/main
+
+    # Validate oversized flowcharts and class diagrams part by part
+    python extract_mermaid.py document.md --validate --partition
+
 Requirements:
     - For validation: mermaid-cli (npm install -g @mermaid-js/mermaid-cli)
+      or, with --engine browser, playwright (see render_engine.py)
 """
 
 import argparse
+import asyncio
+import contextvars
 import os
 import re
 import sys
 import subprocess
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Tuple, Optional, Dict
-import hashlib
+
+from diagram_canonical import mermaid_key
+from diagram_partition import DEFAULT_MAX_NODES, partition_diagram
+from diagram_trace import tracer, add_profile_arguments, configure_profiling
+import render_engine
+from diagram_shards import ShardReport, add_shard_arguments, load_weights, select
 
 
 class MermaidDiagram:
@@ -43,7 +65,8 @@ class MermaidDiagram:
         self.content = content.strip()
         self.line_number = line_number
         self.index = index
-        self.hash = hashlib.md5(content.encode()).hexdigest()[:8]
+        # Cosmetic edits (whitespace, comments, line endings) keep the hash
+        self.hash = mermaid_key(content)[:8]
 
     def get_filename(self, prefix: str = "diagram", extension: str = "mmd") -> str:
         """Generate a unique filename for this diagram."""
@@ -57,6 +80,11 @@ class MermaidDiagram:
         return first_line
 
 
+def diagram_key(markdown_file: Path, diagram: MermaidDiagram) -> str:
+    """Stable key of a diagram for sharding and reports: relative Markdown path plus canonical content hash."""
+    return f"{Path(os.path.relpath(markdown_file)).as_posix()}#{diagram.hash}"
+
+
 class MermaidExtractor:
     """Extract and process Mermaid diagrams from Markdown files."""
 
@@ -68,9 +96,13 @@ class MermaidExtractor:
 
     def __init__(self, markdown_file: Path):
         self.markdown_file = markdown_file
-        self.content = markdown_file.read_text(encoding='utf-8')
+        with tracer.span("read_markdown", path=str(markdown_file)):
+            self.content = markdown_file.read_text(encoding='utf-8')
         self.diagrams: List[MermaidDiagram] = []
-        self._extract_diagrams()
+        # Milliseconds spent validating each diagram, by index
+        self.validation_ms: Dict[int, float] = {}
+        with tracer.span("extract"):
+            self._extract_diagrams()
 
     def _extract_diagrams(self):
         """Extract all Mermaid diagrams from the Markdown content."""
@@ -99,7 +131,8 @@ class MermaidExtractor:
         for diagram in self.diagrams:
             filename = diagram.get_filename(prefix=prefix, extension="mmd")
             output_path = output_dir / filename
-            output_path.write_text(diagram.content, encoding='utf-8')
+            with tracer.diagram(f"#{diagram.index}"), tracer.span("write_mmd"):
+                output_path.write_text(diagram.content, encoding='utf-8')
             saved_files.append(output_path)
             print(f"  ✓ Saved: {output_path}")
 
@@ -119,14 +152,21 @@ class MermaidExtractor:
             print(f"    Lines: {len(diagram.content.splitlines())}")
             print()
 
-    def validate_diagrams(self) -> Dict[int, Optional[str]]:
+    def validate_diagrams(self, engine: str = 'mmdc', partition: Optional[int] = None) -> Dict[int, Optional[str]]:
         """
-        Validate all diagrams by attempting to render them with mmdc.
+        Validate all diagrams by attempting to render them.
+
+        Args:
+            engine: 'mmdc' to spawn mermaid-cli per diagram, 'browser' to render
+                in the shared headless browser (render_engine.py)
+            partition: Node budget per part: bigger flowcharts and class diagrams
+                are validated part by part, each part within the timeout
+                (see diagram_partition.py). None validates every diagram whole
 
         Returns:
             Dict mapping diagram index to error message (None if valid)
         """
-        if not self._check_mmdc_installed():
+        if engine == 'mmdc' and not self._check_mmdc_installed():
             print("ERROR: mermaid-cli (mmdc) not found.", file=sys.stderr)
             print("Install with: npm install -g @mermaid-js/mermaid-cli", file=sys.stderr)
             sys.exit(1)
@@ -136,7 +176,15 @@ class MermaidExtractor:
 
         for diagram in self.diagrams:
             print(f"  Validating diagram #{diagram.index}...", end=" ")
-            error = self._validate_single_diagram(diagram)
+            start = time.perf_counter()
+            with tracer.diagram(f"#{diagram.index}"):
+                if partition:
+                    error = self._validate_partitioned(diagram, engine, partition)
+                elif engine == 'browser':
+                    error = self._validate_in_browser(diagram)
+                else:
+                    error = self._validate_single_diagram(diagram)
+            self.validation_ms[diagram.index] = (time.perf_counter() - start) * 1000
             results[diagram.index] = error
 
             if error:
@@ -151,44 +199,153 @@ class MermaidExtractor:
 
         return results
 
-    def _validate_single_diagram(self, diagram: MermaidDiagram) -> Optional[str]:
-        """Validate a single diagram. Returns error message if invalid, None if valid."""
+    async def validate_diagrams_async(self, engine: str = 'mmdc', concurrency: int = 4) -> Dict[int, Optional[str]]:
+        """
+        Async validate_diagrams(): validate all diagrams concurrently from one event loop.
+
+        Prints nothing, so it can run inside a server. Cancelling the task
+        kills in-flight mmdc processes and abandons in-flight browser renders.
+
+        Args:
+            engine: 'mmdc' or 'browser' (the event loop's shared AsyncRenderEngine)
+            concurrency: Maximum diagrams validated at once
+
+        Returns:
+            Dict mapping diagram index to error message (None if valid)
+
+        Raises:
+            RuntimeError: If engine is 'mmdc' and mermaid-cli is not installed
+        """
+        # run_in_executor rather than asyncio.to_thread (3.9+); the copied context keeps the trace label
+        loop = asyncio.get_running_loop()
+        if engine == 'mmdc' and not await loop.run_in_executor(
+                None, contextvars.copy_context().run, self._check_mmdc_installed):
+            raise RuntimeError("mermaid-cli (mmdc) not found. Install with: npm install -g @mermaid-js/mermaid-cli")
+
+        limit = asyncio.Semaphore(concurrency)
+
+        async def validate(diagram: MermaidDiagram) -> Tuple[int, Optional[str]]:
+            async with limit:
+                start = time.perf_counter()
+                with tracer.diagram(f"#{diagram.index}"):
+                    if engine == 'browser':
+                        error = await self._validate_in_browser_async(diagram)
+                    else:
+                        error = await self._validate_single_diagram_async(diagram)
+                self.validation_ms[diagram.index] = (time.perf_counter() - start) * 1000
+                return diagram.index, error
+
+        return dict(await asyncio.gather(*(validate(diagram) for diagram in self.diagrams)))
+
+    def _validate_partitioned(self, diagram: MermaidDiagram, engine: str, max_nodes: int) -> Optional[str]:
+        """Validate a diagram in parts of at most ``max_nodes`` nodes, in parallel with mmdc."""
+        validate = self._validate_in_browser if engine == 'browser' else self._validate_single_diagram
+        with tracer.span("partition"):
+            plan = partition_diagram(diagram.content, max_nodes)
+        if len(plan.parts) == 1:
+            return validate(diagram)
+
+        parts = [MermaidDiagram(part.source, diagram.line_number, diagram.index) for part in plan.parts]
+        # The sync browser engine is not thread-safe
+        jobs = 1 if engine == 'browser' else min(len(parts), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            errors = list(pool.map(validate, parts))
+        for part, error in zip(plan.parts, errors):
+            if error:
+                return f"part {part.index}/{len(plan.parts)}: {error}"
+        return None
+
+    @staticmethod
+    def _validate_in_browser(diagram: MermaidDiagram) -> Optional[str]:
+        """Validate a single diagram with the shared browser engine."""
+        try:
+            render_engine.render('mermaid', diagram.content, {'format': 'svg'})
+            return None  # Valid
+        except render_engine.RenderError as e:
+            return str(e) or "Unknown rendering error"
+        except Exception as e:
+            return str(e)
+
+    @staticmethod
+    async def _validate_in_browser_async(diagram: MermaidDiagram) -> Optional[str]:
+        """Async _validate_in_browser() on the event loop's shared AsyncRenderEngine."""
+        try:
+            await render_engine.get_async_engine().render('mermaid', diagram.content, {'format': 'svg'})
+            return None  # Valid
+        except render_engine.RenderError as e:
+            return str(e) or "Unknown rendering error"
+        except Exception as e:
+            return str(e)
+
+    async def _validate_single_diagram_async(self, diagram: MermaidDiagram) -> Optional[str]:
+        """Async _validate_single_diagram(): mmdc runs without blocking the event loop."""
         with tempfile.TemporaryDirectory() as tmpdir:
-            tmpdir_path = Path(tmpdir)
-            input_file = tmpdir_path / f"diagram-{diagram.index}.mmd"
-            output_file = tmpdir_path / f"diagram-{diagram.index}.svg"
+            input_file, output_file = self._validation_files(Path(tmpdir), diagram)
+
+            try:
+                with tracer.span("mmdc"):
+                    result = await render_engine.run_process(self._validation_command(input_file, output_file), 30)
+                return self._validation_error(result, output_file)
 
-            # Write diagram to temp file
+            except subprocess.TimeoutExpired:
+                return "Rendering timed out after 30 seconds"
+            except Exception as e:
+                return str(e)
+
+    @staticmethod
+    def _validation_files(tmpdir_path: Path, diagram: MermaidDiagram) -> Tuple[Path, Path]:
+        """Write a diagram to a temp .mmd file. Returns (input_file, output_file)."""
+        input_file = tmpdir_path / f"diagram-{diagram.index}.mmd"
+        output_file = tmpdir_path / f"diagram-{diagram.index}.svg"
+
+        # Write diagram to temp file
+        with tracer.span("write_temp"):
             input_file.write_text(diagram.content, encoding='utf-8')
+        return input_file, output_file
 
-            try:
-                result = subprocess.run(
-                    ['mmdc', '-i', str(input_file), '-o', str(output_file), '-b', 'transparent'],
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
+    @staticmethod
+    def _validation_command(input_file: Path, output_file: Path) -> List[str]:
+        return ['mmdc', '-i', str(input_file), '-o', str(output_file), '-b', 'transparent']
+
+    @staticmethod
+    def _validation_error(result: subprocess.CompletedProcess, output_file: Path) -> Optional[str]:
+        if result.returncode != 0:
+            return result.stderr.strip() or "Unknown rendering error"
+
+        if not output_file.exists() or output_file.stat().st_size == 0:
+            return "Rendering produced no output"
 
-                if result.returncode != 0:
-                    return result.stderr.strip() or "Unknown rendering error"
+        return None  # Valid
 
-                if not output_file.exists() or output_file.stat().st_size == 0:
-                    return "Rendering produced no output"
+    def _validate_single_diagram(self, diagram: MermaidDiagram) -> Optional[str]:
+        """Validate a single diagram. Returns error message if invalid, None if valid."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_file, output_file = self._validation_files(Path(tmpdir), diagram)
 
-                return None  # Valid
+            try:
+                with tracer.span("mmdc"):
+                    result = subprocess.run(
+                        self._validation_command(input_file, output_file),
+                        capture_output=True,
+                        text=True,
+                        timeout=30
+                    )
+                return self._validation_error(result, output_file)
 
             except subprocess.TimeoutExpired:
                 return "Rendering timed out after 30 seconds"
             except Exception as e:
                 return str(e)
 
-    def replace_with_images(self, image_format: str = "png", image_dir: str = "diagrams") -> str:
+    def replace_with_images(self, image_format: str = "png", image_dir: str = "diagrams",
+                            prefix: str = "diagram") -> str:
         """
         Replace Mermaid code blocks with image references.
 
         Args:
             image_format: Image format (png or svg)
             image_dir: Directory path for images (relative to markdown file)
+            prefix: Prefix of the image filenames (as in save_diagrams)
 
         Returns:
             Modified Markdown content
@@ -198,22 +355,24 @@ class MermaidExtractor:
             # Find which diagram this is
             for diagram in self.diagrams:
                 if diagram.content == diagram_content.strip():
-                    filename = diagram.get_filename(extension=image_format)
+                    filename = diagram.get_filename(prefix=prefix, extension=image_format)
                     image_path = f"{image_dir}/{filename}"
                     return f"![Diagram {diagram.index}]({image_path})"
             return match.group(0)  # If not found, leave unchanged
 
-        return self.MERMAID_PATTERN.sub(replace_block, self.content)
+        with tracer.span("replace_blocks"):
+            return self.MERMAID_PATTERN.sub(replace_block, self.content)
 
     @staticmethod
     def _check_mmdc_installed() -> bool:
         """Check if mermaid-cli (mmdc) is installed."""
         try:
-            result = subprocess.run(
-                ['mmdc', '--version'],
-                capture_output=True,
-                timeout=5
-            )
+            with tracer.span("mmdc_version_check"):
+                result = subprocess.run(
+                    ['mmdc', '--version'],
+                    capture_output=True,
+                    timeout=5
+                )
             return result.returncode == 0
         except (FileNotFoundError, subprocess.TimeoutExpired):
             return False
@@ -236,14 +395,35 @@ Examples:
 
   # Replace with image references
   python extract_mermaid.py document.md --replace-with-images --image-format png
+
+  # Validate with a per-diagram timing breakdown
+  python extract_mermaid.py document.md --validate --profile
+
+  # Keep a repository-wide inventory up to date (see diagram_inventory.py)
+  python extract_mermaid.py document.md --validate --inventory .diagram-inventory.db
+
+  # Validate the second of four CI shards and write a mergeable report
+  python extract_mermaid.py docs/design.md --validate --shard 2/4 --report shard-2.json
+
+  # Validate only diagrams this branch added or changed, in every changed .md under docs/
+  python extract_mermaid.py docs/ --validate --changed-since origin/main
+
+  # Validate flowcharts and class diagrams over 80 nodes in parts (avoids timeouts)
+  python extract_mermaid.py document.md --validate --partition 80
         """
     )
 
-    parser.add_argument('markdown_file', type=Path, help='Input Markdown file')
+    parser.add_argument('markdown_file', type=Path,
+                        help='Input Markdown file (with --changed-since, also a directory)')
     parser.add_argument('--output-dir', '-o', type=Path, help='Output directory for extracted diagrams')
     parser.add_argument('--prefix', default='diagram', help='Prefix for output filenames (default: diagram)')
     parser.add_argument('--list-only', '-l', action='store_true', help='List diagrams without extracting')
     parser.add_argument('--validate', '-v', action='store_true', help='Validate diagrams with mmdc')
+    parser.add_argument('--engine', '-e', choices=['mmdc', 'browser'], default='mmdc',
+                        help='Validation renderer: mmdc per diagram, or one shared headless browser (default: mmdc)')
+    parser.add_argument('--partition', type=int, nargs='?', const=DEFAULT_MAX_NODES, metavar='MAX_NODES',
+                        help='Validate flowcharts and class diagrams over MAX_NODES nodes (default: '
+                             f'{DEFAULT_MAX_NODES}) in parts, split along components and subgraphs')
     parser.add_argument('--replace-with-images', '-r', action='store_true',
                         help='Replace Mermaid blocks with image references')
     parser.add_argument('--image-format', choices=['png', 'svg'], default='png',
@@ -252,44 +432,147 @@ Examples:
                         help='Image directory path for references (default: diagrams)')
     parser.add_argument('--output-markdown', type=Path,
                         help='Output file for modified markdown (with --replace-with-images)')
+    parser.add_argument('--inventory', type=Path, metavar='DB',
+                        help='Record diagrams, validation results and image paths in this SQLite inventory')
+    parser.add_argument('--changed-since', metavar='REF',
+                        help='Only list, validate or extract diagrams new or modified since the merge base '
+                             'with this git revision (see git_changes.py)')
+
+    add_shard_arguments(parser)
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
+    if args.shard is not None and args.replace_with_images:
+        parser.error('--shard cannot be combined with --replace-with-images, which rewrites every diagram')
+    configure_profiling(args)
 
     # Validate input file
     if not args.markdown_file.exists():
         print(f"ERROR: File not found: {args.markdown_file}", file=sys.stderr)
         sys.exit(1)
 
-    if not args.markdown_file.is_file():
+    if args.markdown_file.is_dir():
+        if not args.changed_since:
+            print(f"ERROR: Not a file: {args.markdown_file}", file=sys.stderr)
+            sys.exit(1)
+        if args.replace_with_images or args.output_dir:
+            parser.error('a directory input only supports --list-only and --validate')
+    elif not args.markdown_file.is_file():
         print(f"ERROR: Not a file: {args.markdown_file}", file=sys.stderr)
         sys.exit(1)
 
-    # Extract diagrams
-    print(f"Processing: {args.markdown_file}")
-    extractor = MermaidExtractor(args.markdown_file)
-
+    changes = None
+    markdown_files = [args.markdown_file]
+    if args.changed_since:
+        # Imported here: git_changes builds on MermaidExtractor
+        from git_changes import ChangeSet, GitError
+        directory = args.markdown_file if args.markdown_file.is_dir() else args.markdown_file.parent
+        try:
+            changes = ChangeSet(args.changed_since, cwd=directory)
+        except GitError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            sys.exit(1)
+        if args.markdown_file.is_dir():
+            markdown_files = changes.files(['.md'], under=args.markdown_file)
+            if not markdown_files:
+                print(f"No Markdown files changed since {args.changed_since}")
+
+    inventory = None
+    if args.inventory:
+        # Imported here: the inventory module builds on MermaidExtractor
+        from diagram_inventory import DiagramInventory
+        inventory = DiagramInventory(args.inventory)
+
+    status = 0
+    report = ShardReport('extract_mermaid', args.shard)
+    extractors = []
+    try:
+        for markdown_file in markdown_files:
+            # Extract diagrams
+            print(f"Processing: {markdown_file}")
+            extractor = MermaidExtractor(markdown_file)
+
+            if inventory is not None:
+                with tracer.span("inventory_scan"):
+                    inventory.scan_file(markdown_file)
+
+            # Replacing rewrites the whole document, so it always sees every diagram
+            if changes is not None and not args.replace_with_images:
+                changed = changes.changed_diagrams(extractor)
+                print(f"{len(changed)}/{len(extractor.diagrams)} diagram(s) new or modified "
+                      f"since {args.changed_since}")
+                if not changed:
+                    continue
+                extractor.diagrams = changed
+
+            extractors.append(extractor)
+
+        if args.shard is not None:
+            # One assignment over every diagram of every file, so weights balance the whole run
+            diagrams = [(extractor, diagram) for extractor in extractors for diagram in extractor.diagrams]
+            selected = select(diagrams, lambda pair: diagram_key(pair[0].markdown_file, pair[1]),
+                              args.shard, load_weights(args.shard_weights))
+            print(f"Shard {args.shard}: {len(selected)} of {len(diagrams)} diagram(s)")
+            for extractor in extractors:
+                extractor.diagrams = [diagram for owner, diagram in selected if owner is extractor]
+            extractors = [extractor for extractor in extractors if extractor.diagrams]
+
+        for extractor in extractors:
+            status = max(status, run(args, extractor, inventory, report))
+    finally:
+        if inventory is not None:
+            inventory.close()
+
+    if args.report:
+        report.write(args.report)
+    sys.exit(status)
+
+
+def run(args: argparse.Namespace, extractor: MermaidExtractor, inventory=None,
+        report: Optional[ShardReport] = None) -> int:
+    """
+    Carry out the requested operation, recording results in ``inventory`` and
+    validation outcomes in ``report`` if given.
+
+    Returns:
+        Exit status: 1 if any diagram failed validation, else 0
+    """
     if not extractor.diagrams:
         print("No Mermaid diagrams found.")
-        sys.exit(0)
+        return 0
 
     # Handle operations
     if args.list_only:
         extractor.list_diagrams()
 
     elif args.validate:
-        results = extractor.validate_diagrams()
+        results = extractor.validate_diagrams(engine=args.engine, partition=args.partition)
+        if inventory is not None:
+            for index, error in results.items():
+                inventory.record_validation(extractor.markdown_file, index, error, args.engine,
+                                            extractor.validation_ms.get(index))
+        if report is not None:
+            for diagram in extractor.diagrams:
+                error = results.get(diagram.index)
+                report.add(diagram_key(extractor.markdown_file, diagram), error is None,
+                           extractor.validation_ms.get(diagram.index), error)
         # Exit with error if any validation failed
         if any(results.values()):
-            sys.exit(1)
+            return 1
 
     elif args.replace_with_images:
         modified_content = extractor.replace_with_images(
             image_format=args.image_format,
             image_dir=args.image_dir
         )
+        if inventory is not None:
+            for diagram in extractor.diagrams:
+                inventory.record_artifact(extractor.markdown_file, diagram.index,
+                                          f"{args.image_dir}/{diagram.get_filename(extension=args.image_format)}")
 
         if args.output_markdown:
-            args.output_markdown.write_text(modified_content, encoding='utf-8')
+            with tracer.span("write_markdown"):
+                args.output_markdown.write_text(modified_content, encoding='utf-8')
             print(f"\n✓ Modified Markdown saved to: {args.output_markdown}")
         else:
             print("\nModified Markdown:\n")
@@ -305,6 +588,8 @@ Examples:
         extractor.list_diagrams()
         print("\nUse --output-dir to extract diagrams or --help for more options.")
 
+    return 0
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Find the diagrams that changed relative to a git revision.
+
+CI only needs to validate and render what the current branch touched.
+ChangeSet asks git for the files that differ between the merge base of a
+ref and the working tree (committed, staged, unstaged and untracked), and
+for Markdown compares diagrams by content hash against the base revision:
+editing prose around an unchanged diagram, or moving it, does not make it
+changed. Hashes and .mmd comparisons use the canonical source
+(diagram_canonical.py), so whitespace, comment and line-ending edits do not
+count either.
+
+Usage:
+    # Which diagrams would a PR check process?
+    python git_changes.py origin/main docs/
+
+    # From another script
+    from git_changes import ChangeSet
+
+    changes = ChangeSet('origin/main')
+    for path in changes.files(['.md', '.mmd'], under=Path('docs')):
+        ...
+    diagrams = changes.changed_diagrams(MermaidExtractor(Path('docs/guide.md')))
+
+Used by extract_mermaid.py and mermaid_to_image.py (--changed-since REF).
+
+Requirements:
+    - git
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Optional, List, Dict, Set
+
+from diagram_canonical import canonical_mermaid
+from diagram_trace import tracer
+from extract_mermaid import MermaidDiagram, MermaidExtractor
+
+
+class GitError(Exception):
+    """Raised when git fails or the path is not inside a repository."""
+
+
+class ChangeSet:
+    """Files and diagrams that differ from the merge base of a ref."""
+
+    def __init__(self, ref: str, cwd: Optional[Path] = None):
+        """
+        Ask git for everything changed since ``ref``.
+
+        Args:
+            ref: Base revision (branch, tag or commit), e.g. origin/main
+            cwd: Any directory inside the repository (default: current directory)
+
+        Raises:
+            GitError: If git is missing, cwd is not in a repository or ref is unknown
+        """
+        self.ref = ref
+        self.root = Path(self._git('rev-parse', '--show-toplevel', cwd=cwd or Path.cwd()).strip()).resolve()
+
+        try:
+            self.base = self._git('merge-base', ref, 'HEAD').strip()
+        except GitError:
+            # Shallow clones and unrelated histories have no merge base
+            try:
+                self.base = self._git('rev-parse', '--verify', '--quiet', f'{ref}^{{commit}}').strip()
+            except GitError:
+                raise GitError(f"Unknown revision '{ref}'")
+
+        # Changed path -> its path in the base revision (differs for renames)
+        self._base_paths: Dict[Path, Path] = {}
+        with tracer.span("git_diff", ref=ref):
+            self._read_diff()
+            self._read_untracked()
+
+    def _git(self, *args: str, cwd: Optional[Path] = None) -> str:
+        try:
+            result = subprocess.run(
+                ['git', *args],
+                cwd=str(cwd or self.root),
+                capture_output=True,
+                text=True,
+                timeout=60
+            )
+        except FileNotFoundError:
+            raise GitError("git not found")
+        except subprocess.TimeoutExpired:
+            raise GitError(f"git {args[0]} timed out")
+
+        if result.returncode != 0:
+            raise GitError(result.stderr.strip() or f"git {args[0]} failed for {self.ref}")
+        return result.stdout
+
+    def _read_diff(self):
+        # Base revision against the working tree: committed, staged and unstaged changes
+        fields = self._git('diff', '--name-status', '-z', '-M', '--diff-filter=ACMRT', self.base, '--').split('\0')
+        i = 0
+        while i < len(fields) and fields[i]:
+            status = fields[i]
+            if status[0] in 'RC':
+                old, new = fields[i + 1], fields[i + 2]
+                i += 3
+            else:
+                old = new = fields[i + 1]
+                i += 2
+            self._base_paths[self.root / new] = self.root / old
+
+    def _read_untracked(self):
+        for name in self._git('ls-files', '--others', '--exclude-standard', '-z').split('\0'):
+            if name:
+                self._base_paths[self.root / name] = self.root / name
+
+    def is_changed(self, path: Path) -> bool:
+        """True if the file was added, modified, renamed or is untracked since the base."""
+        return path.resolve() in self._base_paths
+
+    def files(self, suffixes: List[str], under: Optional[Path] = None) -> List[Path]:
+        """
+        Changed files that still exist, filtered by suffix.
+
+        Args:
+            suffixes: File suffixes to keep, e.g. ['.md', '.mmd']
+            under: Only files inside this directory
+
+        Returns:
+            Sorted absolute paths
+        """
+        under = under.resolve() if under else None
+        return sorted(
+            path for path in self._base_paths
+            if path.suffix in suffixes and path.is_file()
+            # Not Path.is_relative_to, which needs Python 3.9
+            and (under is None or under in path.parents)
+        )
+
+    def base_text(self, path: Path) -> Optional[str]:
+        """Content of ``path`` (or the file it was renamed from) at the base revision, None if absent."""
+        path = path.resolve()
+        original = self._base_paths.get(path, path)
+        try:
+            return self._git('show', f'{self.base}:{original.relative_to(self.root).as_posix()}')
+        except GitError:
+            return None
+
+    def content_changed(self, path: Path) -> bool:
+        """True if the Mermaid file renders differently from the base (new files count as changed)."""
+        if not self.is_changed(path):
+            return False
+        base = self.base_text(path)
+        return base is None or canonical_mermaid(base) != canonical_mermaid(path.read_text(encoding='utf-8'))
+
+    def changed_diagrams(self, extractor: MermaidExtractor) -> List[MermaidDiagram]:
+        """
+        Diagrams of a Markdown file that are new or modified since the base.
+
+        A diagram is unchanged if a diagram with the same canonical hash exists
+        anywhere in the base version of the file.
+
+        Args:
+            extractor: Extractor for the current version of the file
+
+        Returns:
+            The extractor's diagrams that are new or modified, in document order
+        """
+        if not self.is_changed(extractor.markdown_file):
+            return []
+
+        base = self.base_text(extractor.markdown_file)
+        if base is None:
+            return list(extractor.diagrams)
+
+        base_hashes: Set[str] = {
+            MermaidDiagram(match.group(1), 0, 0).hash
+            for match in extractor.MERMAID_PATTERN.finditer(base)
+        }
+        return [diagram for diagram in extractor.diagrams if diagram.hash not in base_hashes]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='List Markdown and .mmd diagrams changed since a git revision',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Diagrams the current branch touched under docs/
+  python git_changes.py origin/main docs/
+
+  # As JSON, for CI scripts
+  python git_changes.py origin/main . --json
+        """
+    )
+    parser.add_argument('ref', help='Base revision, e.g. origin/main')
+    parser.add_argument('path', type=Path, nargs='?', default=Path('.'),
+                        help='Directory to look in (default: current directory)')
+    parser.add_argument('--json', action='store_true', help='Print JSON instead of a list')
+    args = parser.parse_args()
+
+    try:
+        changes = ChangeSet(args.ref, cwd=args.path if args.path.is_dir() else args.path.parent)
+    except GitError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    report = []
+    for path in changes.files(['.md', '.mmd'], under=args.path):
+        if path.suffix == '.mmd':
+            if changes.content_changed(path):
+                report.append({"path": str(path), "diagrams": None})
+            continue
+        diagrams = changes.changed_diagrams(MermaidExtractor(path))
+        if diagrams:
+            report.append({"path": str(path), "diagrams": [diagram.index for diagram in diagrams]})
+
+    if args.json:
+        print(json.dumps({"ref": args.ref, "base": changes.base, "files": report}, indent=2))
+        return
+
+    if not report:
+        print(f"No new or modified diagrams since {args.ref}")
+    for entry in report:
+        if entry["diagrams"] is None:
+            print(f"  {entry['path']}")
+        else:
+            print(f"  {entry['path']}: #{', #'.join(map(str, entry['diagrams']))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,747 @@
+#!/usr/bin/env python3
+"""
+Shrink rendered diagram images: PNG recompression, SVG minification, WebP.
+
+Renderers write for speed, not size: mmdc and browser screenshots deflate
+PNGs at a low level and carry text/time chunks, and Mermaid SVGs repeat a
+large style sheet, long ids and markers no edge uses. This post-render
+stage rewrites images in place without changing how they look:
+
+PNG
+- lossless: oxipng when installed, otherwise the image data is re-deflated
+  at level 9 (stdlib zlib) and ancillary chunks that do not affect display
+  (tEXt, zTXt, iTXt, tIME, ...) are dropped
+- --quantize (lossy): 256-color palette via pngquant or Pillow; kept only
+  when smaller
+
+SVG
+- comments and pretty-printing whitespace removed
+- markers, gradients, filters, clip paths, masks, patterns and symbols that
+  nothing references are dropped
+- style sheets and style attributes collapsed; duplicate rules removed
+- referenced ids shortened (consistently in url(), href, aria and CSS
+  selectors), unreferenced ids removed
+
+--webp additionally writes a lossless <name>.webp next to every PNG
+(Pillow with WebP support, or cwebp).
+
+Files are optimized in a thread pool (zlib, Pillow and the external tools
+release the GIL). Results are cached by the hash of the input bytes and
+options, so re-optimizing an unchanged render is a cache read, and an
+already optimized file is left alone.
+
+Usage:
+    # Optimize every PNG and SVG in a directory tree
+    python image_optimize.py output/ --recursive
+
+    # Palette PNGs plus WebP copies, 8 at a time
+    python image_optimize.py output/ -r --quantize --webp --jobs 8
+
+    # From another script
+    from image_optimize import ImageOptimizer
+
+    results = ImageOptimizer(quantize=True).optimize_files(paths)
+
+    # Or as part of a render
+    python mermaid_to_image.py diagrams/ output/ --optimize
+    python build_diagrams.py docs/ --output build/ --optimize
+
+Requirements:
+    - Python 3.7+ (lossless PNG and SVG optimization are stdlib only)
+    - Optional: oxipng (better lossless PNG), pngquant or Pillow (--quantize),
+      Pillow with WebP support or cwebp (--webp)
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple
+
+from diagram_trace import tracer
+from resilient_diagram import ArtifactWriter
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+    features = None
+
+
+# Bump when the optimizations change, to invalidate cached results
+OPTIMIZER_VERSION = 1
+
+DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'diagram-image-optimize'
+
+OPTIMIZABLE_FORMATS = ('png', 'svg')
+
+TOOL_TIMEOUT = 120
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Ancillary chunks that change how a PNG displays; other ancillary chunks are dropped
+PNG_DISPLAY_CHUNKS = {b'tRNS', b'gAMA', b'cHRM', b'sRGB', b'iCCP', b'sBIT', b'pHYs'}
+
+# Quality range for pngquant; results below the minimum are discarded
+QUANTIZE_QUALITY = '70-95'
+
+# SVG elements that only draw when referenced
+REFERENCED_ELEMENTS = ('marker', 'linearGradient', 'radialGradient', 'filter', 'clipPath', 'mask',
+                       'pattern', 'symbol')
+
+XML_COMMENT_PATTERN = re.compile(r'<!--.*?-->', re.DOTALL)
+INDENT_PATTERN = re.compile(r'>\s*\n\s*<')
+STYLE_BLOCK_PATTERN = re.compile(r'(<style\b[^>]*>)(.*?)(</style>)', re.DOTALL)
+STYLE_ATTR_PATTERN = re.compile(r'\sstyle="([^"]*)"')
+CDATA_PATTERN = re.compile(r'<!\[CDATA\[(.*?)\]\]>', re.DOTALL)
+# Comments and quoted strings; strings are set aside so minifying cannot change them
+CSS_COMMENT_OR_STRING_PATTERN = re.compile(
+    r'/\*.*?\*/|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'', re.DOTALL
+)
+CSS_PLACEHOLDER_PATTERN = re.compile(r'\x00(\d+)\x00')
+ID_PATTERN = re.compile(r'\sid="([^"]+)"')
+ARIA_PATTERN = re.compile(r'(\saria-(?:labelledby|describedby)=")([^"]*)(")')
+# Where an id is referenced: url(#id) and href="#id" anywhere, and '#id' selectors
+# in style sheets (quoted CSS strings and url() are skipped there). Text content is
+# never a reference
+URL_REFERENCE_PATTERN = re.compile(r'(url\(\s*[\'"]?)#([\w-]+)')
+HREF_REFERENCE_PATTERN = re.compile(r'(\s(?:xlink:)?href=[\'"])#([\w-]+)')
+# '#' not preceded by '&', which would be a character reference like &#60;
+CSS_REFERENCE_PATTERN = re.compile(
+    r'("(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|url\([^)]*\))|(?<!&)#([\w-]+)'
+)
+EMPTY_DEFS_PATTERN = re.compile(r'<defs\b[^>]*>\s*</defs>|<defs\s*/>')
+# Ids that read like a hex color: renaming their '#' references could rewrite colors
+HEX_COLOR_PATTERN = re.compile(r'[0-9a-fA-F]{3,8}')
+
+
+@dataclass
+class OptimizeResult:
+    """Outcome of optimizing one image."""
+    path: Path
+    original_bytes: int
+    optimized_bytes: int
+    cached: bool = False
+    webp: Optional[Path] = None
+    error: Optional[str] = None
+
+    @property
+    def saved(self) -> int:
+        return self.original_bytes - self.optimized_bytes
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['path'] = str(self.path)
+        data['webp'] = str(self.webp) if self.webp else None
+        return data
+
+
+def _png_chunks(data: bytes) -> List[Tuple[bytes, bytes]]:
+    """(type, body) of every chunk up to IEND."""
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError('not a PNG file')
+    chunks = []
+    position = len(PNG_SIGNATURE)
+    while position + 8 <= len(data):
+        length, kind = struct.unpack('>I4s', data[position:position + 8])
+        body = data[position + 8:position + 8 + length]
+        if len(body) != length:
+            raise ValueError('truncated PNG chunk')
+        chunks.append((kind, body))
+        position += length + 12
+        if kind == b'IEND':
+            break
+    return chunks
+
+
+def _png_chunk(kind: bytes, body: bytes) -> bytes:
+    return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body) & 0xffffffff)
+
+
+def _deflate(data: bytes, strategy: int) -> bytes:
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+    return compressor.compress(data) + compressor.flush()
+
+
+def recompress_png(data: bytes) -> bytes:
+    """
+    Losslessly shrink a PNG with the stdlib: re-deflate the image data at
+    level 9 and drop ancillary chunks that do not affect display.
+
+    Args:
+        data: PNG file contents
+
+    Returns:
+        The smaller of the recompressed and the original PNG
+
+    Raises:
+        ValueError: If data is not a readable PNG
+    """
+    chunks = _png_chunks(data)
+    try:
+        raw = zlib.decompress(b''.join(body for kind, body in chunks if kind == b'IDAT'))
+    except zlib.error as e:
+        raise ValueError(f'corrupt PNG image data: {e}')
+    idat = min((_deflate(raw, strategy) for strategy in (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)), key=len)
+
+    parts = [PNG_SIGNATURE]
+    for kind, body in chunks:
+        if kind == b'IDAT':
+            if idat is not None:
+                parts.append(_png_chunk(b'IDAT', idat))
+                idat = None
+        # Critical chunks (upper-case first letter) are always kept
+        elif kind[:1].isupper() or kind in PNG_DISPLAY_CHUNKS:
+            parts.append(_png_chunk(kind, body))
+    optimized = b''.join(parts)
+    return optimized if len(optimized) < len(data) else data
+
+
+def _run_tool(command: List[str], data: bytes) -> Optional[bytes]:
+    """Pipe data through an external tool; None if it fails."""
+    try:
+        result = subprocess.run(command, input=data, capture_output=True, timeout=TOOL_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout if result.returncode == 0 and result.stdout else None
+
+
+def quantize_png(data: bytes, pngquant: Optional[str] = None) -> Optional[bytes]:
+    """
+    Convert a PNG to a 256-color palette (lossy).
+
+    Args:
+        data: PNG file contents
+        pngquant: Path of the pngquant binary; Pillow is used without it
+
+    Returns:
+        Palette PNG, or None if neither tool is available or the quality
+        target cannot be met
+    """
+    if pngquant:
+        return _run_tool([pngquant, '--quality', QUANTIZE_QUALITY, '--speed', '3', '--strip', '-'], data)
+    if Image is None:
+        return None
+    with Image.open(io.BytesIO(data)) as image:
+        # Fast octree (method 2) handles alpha; no dithering keeps flat fills flat
+        quantized = image.convert('RGBA').quantize(colors=256, method=2, dither=0)
+        buffer = io.BytesIO()
+        quantized.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def png_to_webp(data: bytes, cwebp: Optional[str] = None) -> Optional[bytes]:
+    """
+    Lossless WebP of a PNG.
+
+    Args:
+        data: PNG file contents
+        cwebp: Path of the cwebp binary, used when Pillow lacks WebP support
+
+    Returns:
+        WebP file contents, or None if no encoder is available
+    """
+    if Image is not None and features.check('webp'):
+        with Image.open(io.BytesIO(data)) as image:
+            buffer = io.BytesIO()
+            image.save(buffer, format='WEBP', lossless=True, method=6)
+        return buffer.getvalue()
+    if not cwebp:
+        return None
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source, target = Path(temp_dir) / 'in.png', Path(temp_dir) / 'out.webp'
+        source.write_bytes(data)
+        try:
+            result = subprocess.run([cwebp, '-quiet', '-lossless', '-z', '9', str(source), '-o', str(target)],
+                                    capture_output=True, timeout=TOOL_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        return target.read_bytes() if result.returncode == 0 and target.exists() else None
+
+
+def _css_blocks(css: str) -> List[str]:
+    """Split minified CSS into top-level rules and at-rules."""
+    blocks = []
+    depth = 0
+    start = 0
+    for position, char in enumerate(css):
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth = max(0, depth - 1)
+            if depth == 0:
+                blocks.append(css[start:position + 1])
+                start = position + 1
+        elif char == ';' and depth == 0:
+            # @import / @charset statements
+            blocks.append(css[start:position + 1])
+            start = position + 1
+    if css[start:].strip():
+        blocks.append(css[start:])
+    return blocks
+
+
+def minify_css(css: str) -> str:
+    """
+    Collapse a style sheet: no comments or optional whitespace, no empty or
+    duplicate rules (the last copy of a duplicate is kept, so the cascade is unchanged).
+    """
+    strings: Dict[str, int] = {}
+
+    def set_aside(match) -> str:
+        token = match.group(0)
+        if token.startswith('/*'):
+            return ''
+        return f'\x00{strings.setdefault(token, len(strings))}\x00'
+
+    css = CSS_COMMENT_OR_STRING_PATTERN.sub(set_aside, css)
+    css = re.sub(r'\s+', ' ', css)
+    # Never before ':' - "#a :root" and "#a:root" are different selectors
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    css = css.replace(';}', '}')
+    while True:
+        collapsed = re.sub(r'[^{};]+\{\}', '', css)
+        if collapsed == css:
+            break
+        css = collapsed
+
+    blocks = _css_blocks(css.strip())
+    seen = set()
+    kept = []
+    for block in reversed(blocks):
+        if block not in seen:
+            seen.add(block)
+            kept.append(block)
+    originals = {index: token for token, index in strings.items()}
+    return CSS_PLACEHOLDER_PATTERN.sub(lambda match: originals[int(match.group(1))], ''.join(reversed(kept)))
+
+
+def _minify_declarations(style: str) -> str:
+    if 'url(' in style:
+        # data: URLs contain ';', so only whitespace is collapsed
+        return ' '.join(style.split()).strip('; ')
+    declarations = []
+    for declaration in style.split(';'):
+        name, colon, value = declaration.partition(':')
+        if colon and name.strip():
+            declarations.append(f"{name.strip()}:{' '.join(value.split())}")
+    return ';'.join(declarations)
+
+
+def _minify_style_block(match) -> str:
+    css = match.group(2)
+    cdata = CDATA_PATTERN.search(css)
+    if cdata:
+        return f"{match.group(1)}<![CDATA[{minify_css(cdata.group(1))}]]>{match.group(3)}"
+    return match.group(1) + minify_css(css) + match.group(3)
+
+
+def _minify_style_attribute(match) -> str:
+    style = _minify_declarations(match.group(1))
+    return f' style="{style}"' if style else ''
+
+
+def _sub_references(svg: str, replace) -> str:
+    """
+    Apply ``replace(id) -> id`` to every ``#id`` reference: url(), href and
+    xlink:href values and style sheet selectors.
+    """
+    def css_reference(match) -> str:
+        if match.group(1):
+            return match.group(1)
+        return '#' + replace(match.group(2))
+
+    def style_block(match) -> str:
+        return match.group(1) + CSS_REFERENCE_PATTERN.sub(css_reference, match.group(2)) + match.group(3)
+
+    svg = STYLE_BLOCK_PATTERN.sub(style_block, svg)
+    svg = URL_REFERENCE_PATTERN.sub(lambda match: f'{match.group(1)}#{replace(match.group(2))}', svg)
+    return HREF_REFERENCE_PATTERN.sub(lambda match: f'{match.group(1)}#{replace(match.group(2))}', svg)
+
+
+def _referenced_ids(svg: str, ids: List[str]) -> set:
+    """The ids among ``ids`` that are referenced (``#id`` in url(), href, CSS; aria attributes)."""
+    tokens = set()
+
+    def collect(element_id: str) -> str:
+        tokens.add(element_id)
+        return element_id
+
+    _sub_references(svg, collect)
+    for match in ARIA_PATTERN.finditer(svg):
+        tokens.update(match.group(2).split())
+    referenced = set()
+    for element_id in ids:
+        if element_id in tokens:
+            referenced.add(element_id)
+        elif not re.fullmatch(r'[\w-]+', element_id) and re.search(rf'#{re.escape(element_id)}(?![\w-])', svg):
+            # Ids with other characters (rare) are not tokenized; search for them
+            referenced.add(element_id)
+    return referenced
+
+
+def _drop_unused_definitions(svg: str) -> str:
+    """Remove referenced-only elements (markers, gradients, ...) that nothing references."""
+    pattern = re.compile(
+        rf'<({"|".join(REFERENCED_ELEMENTS)})\b[^>]*?\sid="([^"]+)"[^>]*?(?:/>|>.*?</\1>)', re.DOTALL
+    )
+    while True:
+        definitions = list(pattern.finditer(svg))
+        referenced = _referenced_ids(svg, [match.group(2) for match in definitions])
+        unused = [match for match in definitions if match.group(2) not in referenced]
+        if not unused:
+            break
+        # Dropping one definition may orphan another (a marker's gradient), so repeat
+        for match in reversed(unused):
+            svg = svg[:match.start()] + svg[match.end():]
+    return EMPTY_DEFS_PATTERN.sub('', svg)
+
+
+def _short_ids(prefix: str):
+    """prefix0, prefix1, ..., prefixz, prefix10, ... (base 36)."""
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    index = 0
+    while True:
+        value, name = index, ''
+        while True:
+            value, digit = divmod(value, 36)
+            name = digits[digit] + name
+            if not value:
+                break
+        yield prefix + name
+        index += 1
+
+
+def _shorten_ids(svg: str) -> str:
+    """
+    Rename referenced ids to short ones and drop unreferenced ids.
+
+    Short ids carry a prefix derived from the document, so several inline
+    SVGs on one page are unlikely to clash.
+    """
+    ids = list(dict.fromkeys(ID_PATTERN.findall(svg)))
+    if not ids:
+        return svg
+    prefix = 'i' + hashlib.sha256(svg.encode('utf-8')).hexdigest()[:4]
+    names = _short_ids(prefix)
+    referenced = _referenced_ids(svg, ids)
+    renames = {}
+    for element_id in ids:
+        # Odd ids and ids that read like a color keep their name
+        if element_id not in referenced or HEX_COLOR_PATTERN.fullmatch(element_id) \
+                or not re.fullmatch(r'[\w-]+', element_id):
+            continue
+        renames[element_id] = next(names)
+        while renames[element_id] in ids:
+            renames[element_id] = next(names)
+
+    def rename_id(match) -> str:
+        element_id = match.group(1)
+        if element_id not in referenced:
+            return ''
+        return f' id="{renames.get(element_id, element_id)}"'
+
+    def rename_aria(match) -> str:
+        tokens = [renames.get(token, token) for token in match.group(2).split()]
+        return match.group(1) + ' '.join(tokens) + match.group(3)
+
+    svg = ID_PATTERN.sub(rename_id, svg)
+    if not renames:
+        return svg
+    svg = ARIA_PATTERN.sub(rename_aria, svg)
+    return _sub_references(svg, lambda element_id: renames.get(element_id, element_id))
+
+
+def minify_svg(svg: str) -> str:
+    """
+    Minify an SVG document without changing how it renders (see module docstring).
+
+    Args:
+        svg: SVG markup
+
+    Returns:
+        Minified SVG markup
+    """
+    svg = XML_COMMENT_PATTERN.sub('', svg)
+    svg = INDENT_PATTERN.sub('><', svg.strip())
+    svg = STYLE_BLOCK_PATTERN.sub(_minify_style_block, svg)
+    svg = STYLE_ATTR_PATTERN.sub(_minify_style_attribute, svg)
+    svg = _drop_unused_definitions(svg)
+    return _shorten_ids(svg)
+
+
+class ImageOptimizer:
+    """
+    Optimize rendered PNG and SVG files in place, in parallel, with a cache.
+
+    The cache maps the SHA-256 of an input file plus the optimizer options
+    to the optimized bytes (and the WebP copy), so repeated builds only
+    read the cache. Optimized outputs are cached as their own result too,
+    which makes optimizing an already optimized file a no-op.
+    """
+
+    def __init__(
+        self,
+        quantize: bool = False,
+        webp: bool = False,
+        cache_dir: Optional[Path] = DEFAULT_CACHE_DIR,
+        jobs: Optional[int] = None
+    ):
+        """
+        Initialize the optimizer.
+
+        Args:
+            quantize: Also try a 256-color palette for PNGs (lossy)
+            webp: Also write a lossless <name>.webp next to every PNG
+            cache_dir: Directory for cached results; None disables the cache
+            jobs: Worker threads for optimize_files() (default: CPU count)
+        """
+        self.tools = {name: shutil.which(name) for name in ('oxipng', 'pngquant', 'cwebp')}
+        self.cache_dir = cache_dir
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.warnings: List[str] = []
+
+        self.quantize = quantize
+        if quantize and not (self.tools['pngquant'] or Image is not None):
+            self.warnings.append('--quantize needs pngquant or Pillow (pip install Pillow); skipped')
+            self.quantize = False
+
+        self.webp = webp
+        if webp and not (self.tools['cwebp'] or (Image is not None and features.check('webp'))):
+            self.warnings.append('--webp needs Pillow with WebP support or cwebp; skipped')
+            self.webp = False
+
+    def options(self, image_format: str) -> Dict[str, Any]:
+        """Everything besides the input bytes that affects the optimized output."""
+        options = {'version': OPTIMIZER_VERSION, 'format': image_format}
+        if image_format == 'png':
+            options['png'] = 'oxipng' if self.tools['oxipng'] else 'zlib'
+            if self.quantize:
+                options['quantize'] = 'pngquant' if self.tools['pngquant'] else 'pillow'
+        return options
+
+    def optimize_bytes(self, data: bytes, image_format: str) -> bytes:
+        """
+        Optimize image contents (no cache).
+
+        Args:
+            data: PNG or SVG file contents
+            image_format: 'png' or 'svg'
+
+        Returns:
+            Optimized contents, never larger than data
+
+        Raises:
+            ValueError: If the image cannot be parsed
+        """
+        if image_format == 'svg':
+            try:
+                optimized = minify_svg(data.decode('utf-8')).encode('utf-8')
+            except UnicodeDecodeError as e:
+                raise ValueError(f'SVG is not UTF-8: {e}')
+            return optimized if len(optimized) < len(data) else data
+
+        candidates = [data]
+        if self.quantize:
+            quantized = quantize_png(data, self.tools['pngquant'])
+            if quantized:
+                candidates.append(quantized)
+        optimized = []
+        for candidate in candidates:
+            if self.tools['oxipng']:
+                optimized.append(_run_tool([self.tools['oxipng'], '-o', '4', '--strip', 'safe', '--stdout', '-'],
+                                           candidate) or recompress_png(candidate))
+            else:
+                optimized.append(recompress_png(candidate))
+        return min(optimized, key=len)
+
+    def _cache_path(self, key: str, extension: str) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / key[:2] / f"{key}.{extension}"
+
+    def _cached(self, key: str, extension: str, produce) -> Tuple[Optional[bytes], bool]:
+        """Cached result for key, else produce() stored under key. Returns (data, was_cached)."""
+        cache_path = self._cache_path(key, extension)
+        if cache_path is not None:
+            try:
+                return cache_path.read_bytes(), True
+            except OSError:
+                pass
+        data = produce()
+        if cache_path is not None and data is not None:
+            self._store(cache_path, data)
+        return data, False
+
+    @staticmethod
+    def _store(cache_path: Path, data: bytes):
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            ArtifactWriter().write_bytes(cache_path, data)
+        except OSError:
+            pass  # A read-only cache only costs speed
+
+    def optimize_file(self, path: Path) -> OptimizeResult:
+        """
+        Optimize one PNG or SVG file in place (and write its WebP copy).
+
+        Args:
+            path: Image file
+
+        Returns:
+            OptimizeResult; errors are reported in it, not raised
+        """
+        image_format = path.suffix.lower().lstrip('.')
+        try:
+            data = path.read_bytes()
+        except OSError as e:
+            return OptimizeResult(path, 0, 0, error=str(e))
+        result = OptimizeResult(path, len(data), len(data))
+        if image_format not in OPTIMIZABLE_FORMATS:
+            result.error = f'unsupported format: {path.suffix or path.name}'
+            return result
+
+        options = self.options(image_format)
+        writer = ArtifactWriter()
+        try:
+            with tracer.span("optimize"):
+                key = ArtifactWriter.render_key(data, **options)
+                optimized, result.cached = self._cached(key, image_format,
+                                                        lambda: self.optimize_bytes(data, image_format))
+                if not result.cached and optimized != data:
+                    # Optimizing the output again must find it already done
+                    output_path = self._cache_path(ArtifactWriter.render_key(optimized, **options), image_format)
+                    if output_path is not None:
+                        self._store(output_path, optimized)
+                if len(optimized) < len(data):
+                    writer.write_bytes(path, optimized)
+                    result.optimized_bytes = len(optimized)
+
+            if self.webp and image_format == 'png':
+                with tracer.span("webp"):
+                    final = optimized if len(optimized) < len(data) else data
+                    webp_key = ArtifactWriter.render_key(final, **options, webp=True)
+                    webp, _ = self._cached(webp_key, 'webp', lambda: png_to_webp(final, self.tools['cwebp']))
+                    if webp:
+                        result.webp = path.with_suffix('.webp')
+                        writer.write_bytes(result.webp, webp)
+        except (OSError, ValueError) as e:
+            result.error = str(e)
+        return result
+
+    def optimize_files(self, paths: List[Path]) -> List[OptimizeResult]:
+        """
+        Optimize files in the worker pool.
+
+        Args:
+            paths: PNG and SVG files
+
+        Returns:
+            One OptimizeResult per path, in the order given
+        """
+        if len(paths) <= 1 or self.jobs == 1:
+            return [self.optimize_file(path) for path in paths]
+        with ThreadPoolExecutor(max_workers=min(self.jobs, len(paths))) as pool:
+            return list(pool.map(self.optimize_file, paths))
+
+
+def format_summary(results: List[OptimizeResult]) -> str:
+    """One-line total of a batch of results."""
+    ok = [result for result in results if not result.error]
+    before = sum(result.original_bytes for result in ok)
+    after = sum(result.optimized_bytes for result in ok)
+    percent = (before - after) / before * 100 if before else 0.0
+    cached = sum(1 for result in ok if result.cached)
+    webp = sum(1 for result in ok if result.webp)
+    summary = f"Optimized {len(ok)} image(s): {before:,} -> {after:,} bytes (-{percent:.1f}%)"
+    if cached:
+        summary += f", {cached} from cache"
+    if webp:
+        summary += f", {webp} WebP"
+    return summary
+
+
+def image_files(inputs: List[Path], recursive: bool = False) -> List[Path]:
+    """PNG and SVG files among inputs, expanding directories."""
+    files = []
+    for path in inputs:
+        if path.is_dir():
+            found = path.rglob('*') if recursive else path.glob('*')
+            files.extend(sorted(
+                candidate for candidate in found
+                if candidate.is_file() and candidate.suffix.lower().lstrip('.') in OPTIMIZABLE_FORMATS
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Shrink rendered PNG and SVG diagrams in place',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Lossless: recompressed PNGs, minified SVGs
+  python image_optimize.py output/ --recursive
+
+  # Palette PNGs (lossy) plus lossless WebP copies
+  python image_optimize.py output/ -r --quantize --webp
+
+  # Without the result cache, as JSON
+  python image_optimize.py diagram.png diagram.svg --no-cache --json
+        """
+    )
+    parser.add_argument('input', type=Path, nargs='+', help='PNG/SVG files or directories')
+    parser.add_argument('--recursive', '-r', action='store_true', help='Recurse into directories')
+    parser.add_argument('--quantize', action='store_true',
+                        help='Try a 256-color palette for PNGs, kept when smaller (lossy)')
+    parser.add_argument('--webp', action='store_true', help='Also write a lossless .webp next to every PNG')
+    parser.add_argument('--jobs', '-j', type=int, help='Worker threads (default: CPU count)')
+    parser.add_argument('--cache-dir', type=Path, default=DEFAULT_CACHE_DIR,
+                        help=f'Result cache (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_true', help='Neither read nor write the result cache')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    files = image_files(args.input, args.recursive)
+    missing = [path for path in files if not path.is_file()]
+    if missing:
+        print(f"ERROR: Not found: {', '.join(str(path) for path in missing)}", file=sys.stderr)
+        sys.exit(1)
+
+    optimizer = ImageOptimizer(quantize=args.quantize, webp=args.webp,
+                               cache_dir=None if args.no_cache else args.cache_dir, jobs=args.jobs)
+    for warning in optimizer.warnings:
+        print(f"⚠️  {warning}", file=sys.stderr)
+
+    results = optimizer.optimize_files(files)
+
+    if args.json:
+        print(json.dumps([result.to_dict() for result in results], indent=2))
+    else:
+        for result in results:
+            if result.error:
+                print(f"  ❌ {result.path}: {result.error}")
+                continue
+            note = ' (cached)' if result.cached else ''
+            print(f"  ✅ {result.path}: {result.original_bytes:,} -> {result.optimized_bytes:,} bytes{note}")
+        print(f"\n{format_summary(results)}")
+
+    sys.exit(1 if any(result.error for result in results) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,20 +15,61 @@ Usage:
     # Batch convert all .mmd files in directory
     python mermaid_to_image.py diagrams/ output/ --format png --recursive
 
+    # Eight parallel renders, the most expensive diagrams first
+    python mermaid_to_image.py diagrams/ output/ --recursive --jobs 8
+
     # Convert from stdin
     echo "graph TD; A-->B" | python mermaid_to_image.py - output.png
 
+    # Render in the shared headless browser instead of spawning mmdc
+    python mermaid_to_image.py diagrams/ output/ --engine browser
+
+    # Light and dark PNG plus SVG of every diagram, one render per theme
+    python mermaid_to_image.py diagrams/ output/ --formats png,svg --themes default,dark --engine browser
+
+    # Split an oversized flowchart into parts, render them in parallel and compose
+    python mermaid_to_image.py architecture.mmd architecture.svg --partition
+
+    # Recompress PNGs / minify SVGs after rendering, plus WebP copies
+    python mermaid_to_image.py diagrams/ output/ --optimize --webp
+
+    # Existing PNGs are kept when a re-render looks the same; heatmaps of real changes
+    python mermaid_to_image.py diagrams/ output/ --diff-dir diffs/
+
 Requirements:
     - mermaid-cli: npm install -g @mermaid-js/mermaid-cli
+    - or, for --engine browser: playwright (see render_engine.py)
+    - Optional: Pillow, to compose partitioned PNGs (see diagram_partition.py)
+      and for --quantize / --webp (see image_optimize.py)
+    - Optional: numpy and Pillow, for the tolerant visual diff and heatmaps
+      (see visual_diff.py)
 """
 
 import argparse
+import asyncio
+import json
 import os
+import shutil
 import subprocess
 import sys
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
+
+from diagram_trace import tracer, add_profile_arguments, configure_profiling
+import render_engine
+from git_changes import ChangeSet, GitError
+from diagram_shards import Shard, ShardReport, add_shard_arguments, load_weights, select
+from render_cost import CostModel, render_profile
+from diagram_partition import (
+    DEFAULT_MAX_NODES, PartitionPlan, partition_diagram, can_compose, compose_png, compose_svg, format_plan,
+    part_path
+)
+from image_optimize import ImageOptimizer, format_summary
+from resilient_diagram import ArtifactWriter
+from visual_diff import VisualGate, add_visual_diff_arguments, visual_gate_from_args
 
 
 class MermaidRenderer:
@@ -36,6 +77,7 @@ class MermaidRenderer:
 
     VALID_THEMES = ['default', 'forest', 'dark', 'neutral', 'base']
     VALID_FORMATS = ['png', 'svg', 'pdf']
+    VALID_ENGINES = ['mmdc', 'browser']
 
     def __init__(
         self,
@@ -44,7 +86,10 @@ class MermaidRenderer:
         width: Optional[int] = None,
         height: Optional[int] = None,
         scale: int = 1,
-        config_file: Optional[Path] = None
+        config_file: Optional[Path] = None,
+        engine: str = 'mmdc',
+        partition: Optional[int] = None,
+        visual_gate: Optional[VisualGate] = None
     ):
         """
         Initialize Mermaid renderer.
@@ -56,8 +101,17 @@ class MermaidRenderer:
             height: Output height in pixels
             scale: Scale factor (1-3)
             config_file: Path to custom Mermaid config file
+            engine: 'mmdc' to spawn mermaid-cli per diagram, 'browser' to render
+                in the shared headless browser (render_engine.py)
+            partition: Node budget per part: render() splits bigger flowcharts and
+                class diagrams into parts, renders them in parallel and composes
+                the image (see diagram_partition.py). None renders every diagram whole
+            visual_gate: render() keeps an existing PNG when the new render looks
+                the same (see visual_diff.py). None always overwrites
         """
-        if not self._check_mmdc_installed():
+        self.engine = engine if engine in self.VALID_ENGINES else 'mmdc'
+
+        if self.engine == 'mmdc' and not self._check_mmdc_installed():
             print("ERROR: mermaid-cli (mmdc) not found.", file=sys.stderr)
             print("Install with: npm install -g @mermaid-js/mermaid-cli", file=sys.stderr)
             sys.exit(1)
@@ -68,23 +122,189 @@ class MermaidRenderer:
         self.height = height
         self.scale = max(1, min(3, scale))
         self.config_file = config_file
+        self.partition = partition
+        self.visual_gate = visual_gate
+        # Output path -> part files written instead, for partitioned PNGs without Pillow
+        self.uncomposed: Dict[Path, List[Path]] = {}
 
-    def render(self, input_path: Path, output_path: Path) -> bool:
+    def render(self, input_path: Path, output_path: Path, theme: Optional[str] = None) -> bool:
         """
         Render a Mermaid diagram to an image.
 
         Args:
             input_path: Path to .mmd file or '-' for stdin
             output_path: Path to output image file
+            theme: Theme for this render only (default: the renderer's theme)
+
+        Returns:
+            True if successful, False otherwise
+        """
+        theme = theme or self.theme
+        plan = None
+        if self.partition and input_path.is_file():
+            with tracer.span("partition"):
+                plan = partition_diagram(input_path.read_text(encoding='utf-8'), self.partition)
+            if len(plan.parts) == 1:
+                plan = None
+
+        def render_to(path: Path) -> bool:
+            if plan is not None:
+                return self._render_partitioned(plan, path, theme)
+            return self._render_whole(input_path, path, theme)
+
+        # Uncomposed parts are written next to the target, so those are not gated
+        gated = (self.visual_gate is not None and self.visual_gate.applies(output_path)
+                 and (plan is None or can_compose(output_path.suffix.lstrip('.'))))
+        if not gated:
+            return render_to(output_path)
+
+        temp_path = ArtifactWriter.temp_path(output_path)
+        try:
+            rendered = render_to(temp_path)
+            if rendered:
+                self.visual_gate.commit(temp_path, output_path)
+            return rendered
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+    def _render_whole(self, input_path: Path, output_path: Path, theme: str) -> bool:
+        """Render a diagram in one piece. Same contract as render()."""
+        if self.engine == 'browser':
+            return self._render_browser(input_path, output_path, theme)
+
+        try:
+            with tracer.span("mmdc", output=str(output_path)):
+                result = subprocess.run(
+                    self._mmdc_command(input_path, output_path, theme),
+                    capture_output=True,
+                    text=True,
+                    timeout=60
+                )
+            return self._check_mmdc_output(result, output_path)
+
+        except subprocess.TimeoutExpired:
+            print(f"ERROR: Rendering timed out after 60 seconds", file=sys.stderr)
+            return False
+
+        except Exception as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return False
+
+    def _render_partitioned(self, plan: PartitionPlan, output_path: Path, theme: str) -> bool:
+        """
+        Render the parts of a partitioned diagram in parallel and compose them.
+
+        SVG parts are always composed into ``output_path``; PNG parts only with
+        Pillow installed. Otherwise each part is written as
+        ``<name>.part-N.png`` next to ``output_path``, and the part files are
+        listed in ``self.uncomposed[output_path]``. PDF parts cannot be composed
+        and fail the render.
+
+        Returns:
+            True if every part rendered
+        """
+        output_format = output_path.suffix.lstrip('.') or 'png'
+        if output_format not in ('png', 'svg'):
+            print(f"ERROR: {plan.nodes} nodes need {len(plan.parts)} parts, and {output_format.upper()} "
+                  "parts cannot be composed; render as SVG or PNG", file=sys.stderr)
+            return False
+
+        print(f"\n  Partitioned {plan.nodes} nodes into {len(plan.parts)} part(s):")
+        for line in format_plan(plan):
+            print(f"    {line}")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            inputs = []
+            outputs = []
+            for part in plan.parts:
+                inputs.append(Path(tmpdir) / f"part-{part.index}.mmd")
+                inputs[-1].write_text(part.source, encoding='utf-8')
+                outputs.append(Path(tmpdir) / f"part-{part.index}.{output_format}")
+
+            # The sync browser engine is not thread-safe
+            jobs = 1 if self.engine == 'browser' else min(len(inputs), os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                rendered = list(pool.map(self._render_whole, inputs, outputs, [theme] * len(inputs)))
+            failed = [str(part.index) for part, ok in zip(plan.parts, rendered) if not ok]
+            if failed:
+                print(f"ERROR: part(s) {', '.join(failed)} of {len(plan.parts)} failed to render", file=sys.stderr)
+                return False
+
+            with tracer.span("compose", format=output_format, parts=len(outputs)):
+                if output_format == 'svg':
+                    output_path.write_bytes(compose_svg([path.read_bytes() for path in outputs], plan.horizontal))
+                    return True
+                if output_format == 'png':
+                    try:
+                        compose_png(outputs, output_path, plan.horizontal)
+                        return True
+                    except RuntimeError as e:
+                        print(f"    note: {e}")
+                parts = [part_path(output_path, part.index) for part in plan.parts]
+                for path, target in zip(outputs, parts):
+                    shutil.copyfile(path, target)
+
+        self.uncomposed[output_path] = parts
+        print(f"    Parts written as {parts[0].name} ... {parts[-1].name}")
+        return True
+
+    async def render_async(
+        self,
+        input_path: Path,
+        output_path: Path,
+        theme: Optional[str] = None,
+        limit: Optional[asyncio.Semaphore] = None
+    ) -> bool:
+        """
+        Async render(): same contract, without blocking the event loop.
+
+        mmdc runs through render_engine.run_process() and is killed if the task
+        is cancelled; the browser engine renders in a page of the event loop's
+        shared AsyncRenderEngine, which bounds concurrent browser renders.
+
+        Args:
+            input_path: Path to .mmd file
+            output_path: Path to output image file
+            theme: Theme for this render only (default: the renderer's theme)
+            limit: Semaphore bounding concurrent mmdc processes
+                (default: render_engine.process_limit())
 
         Returns:
             True if successful, False otherwise
         """
-        # Build mmdc command
+        theme = theme or self.theme
+        try:
+            if self.engine == 'browser':
+                options = {**self._browser_options(), 'format': output_path.suffix.lstrip('.') or 'png', 'theme': theme}
+                data = await render_engine.get_async_engine().render(
+                    'mermaid', input_path.read_text(encoding='utf-8'), options
+                )
+                output_path.write_bytes(data)
+                return True
+
+            with tracer.span("mmdc", output=str(output_path)):
+                result = await render_engine.run_process(
+                    self._mmdc_command(input_path, output_path, theme), timeout=60, limit=limit
+                )
+            return self._check_mmdc_output(result, output_path)
+
+        except subprocess.TimeoutExpired:
+            print(f"ERROR: Rendering timed out after 60 seconds", file=sys.stderr)
+            return False
+
+        except render_engine.RenderError as e:
+            print(f"ERROR: browser render failed: {e}", file=sys.stderr)
+            return False
+
+        except Exception as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return False
+
+    def _mmdc_command(self, input_path: Path, output_path: Path, theme: str) -> List[str]:
         cmd = ['mmdc', '-i', str(input_path), '-o', str(output_path)]
 
         # Add options
-        cmd.extend(['-t', self.theme])
+        cmd.extend(['-t', theme])
         cmd.extend(['-b', self.background])
 
         if self.width:
@@ -99,36 +319,114 @@ class MermaidRenderer:
         if self.config_file and self.config_file.exists():
             cmd.extend(['-c', str(self.config_file)])
 
-        try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
+        return cmd
 
-            if result.returncode != 0:
-                print(f"ERROR: mmdc failed: {result.stderr}", file=sys.stderr)
-                return False
+    @staticmethod
+    def _check_mmdc_output(result: subprocess.CompletedProcess, output_path: Path) -> bool:
+        if result.returncode != 0:
+            print(f"ERROR: mmdc failed: {result.stderr}", file=sys.stderr)
+            return False
 
-            if not output_path.exists():
-                print(f"ERROR: Output file not created: {output_path}", file=sys.stderr)
-                return False
+        if not output_path.exists():
+            print(f"ERROR: Output file not created: {output_path}", file=sys.stderr)
+            return False
 
-            if output_path.stat().st_size == 0:
-                print(f"ERROR: Output file is empty: {output_path}", file=sys.stderr)
-                return False
+        if output_path.stat().st_size == 0:
+            print(f"ERROR: Output file is empty: {output_path}", file=sys.stderr)
+            return False
+
+        return True
 
+    def _browser_options(self) -> Dict:
+        options = {
+            'background': self.background,
+            'width': self.width,
+            'height': self.height,
+            'scale': self.scale,
+        }
+        if self.config_file and self.config_file.exists():
+            options['config'] = json.loads(self.config_file.read_text(encoding='utf-8'))
+        return options
+
+    def _render_browser(self, input_path: Path, output_path: Path, theme: str) -> bool:
+        """Render with the shared browser engine. Same contract as render()."""
+        try:
+            options = {**self._browser_options(), 'format': output_path.suffix.lstrip('.') or 'png', 'theme': theme}
+            data = render_engine.render('mermaid', input_path.read_text(encoding='utf-8'), options)
+            output_path.write_bytes(data)
             return True
 
-        except subprocess.TimeoutExpired:
-            print(f"ERROR: Rendering timed out after 60 seconds", file=sys.stderr)
+        except render_engine.RenderError as e:
+            print(f"ERROR: browser render failed: {e}", file=sys.stderr)
             return False
 
         except Exception as e:
             print(f"ERROR: {e}", file=sys.stderr)
             return False
 
+    @staticmethod
+    def variant_path(output_base: Path, output_format: str, theme: Optional[str] = None) -> Path:
+        """Output path of one variant: <base>.<format>, or <base>-<theme>.<format>."""
+        name = f"{output_base.name}-{theme}" if theme else output_base.name
+        return output_base.with_name(f"{name}.{output_format}")
+
+    def render_variants(
+        self,
+        input_path: Path,
+        output_base: Path,
+        formats: List[str],
+        themes: Optional[List[str]] = None
+    ) -> Dict[Path, bool]:
+        """
+        Render several formats and themes of one diagram.
+
+        With the browser engine each theme is rendered once and every format is
+        exported from that render in the warm page; with mmdc each variant is a
+        separate mmdc run. Each file is written atomically as soon as its variant
+        is ready, through the visual gate when there is one.
+
+        Args:
+            input_path: Path to .mmd file
+            output_base: Output path without extension
+            formats: Output formats (png, svg, pdf)
+            themes: Themes to render; when given, file names get a -<theme> suffix
+                (default: the renderer's theme, no suffix)
+
+        Returns:
+            Dict mapping each variant's output path to whether it rendered
+        """
+        output_base.parent.mkdir(parents=True, exist_ok=True)
+        results: Dict[Path, bool] = {}
+
+        if self.engine != 'browser':
+            for theme in themes or [None]:
+                for output_format in formats:
+                    path = self.variant_path(output_base, output_format, theme)
+                    results[path] = self.render(input_path, path, theme)
+            return results
+
+        try:
+            variants = render_engine.get_engine().render_variants(
+                input_path.read_text(encoding='utf-8'), themes or [self.theme], formats, self._browser_options()
+            )
+            writer = self.visual_gate if self.visual_gate is not None else ArtifactWriter()
+            for theme, output_format, data in variants:
+                path = self.variant_path(output_base, output_format, theme if themes else None)
+                with tracer.span("write_image", format=output_format, theme=theme):
+                    writer.write_bytes(path, data)
+                results[path] = True
+
+        except render_engine.RenderError as e:
+            print(f"ERROR: browser render failed: {e}", file=sys.stderr)
+        except Exception as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+
+        # Variants not reached before a failure count as failed
+        for theme in themes or [None]:
+            for output_format in formats:
+                results.setdefault(self.variant_path(output_base, output_format, theme), False)
+        return results
+
     def render_from_string(self, mermaid_code: str, output_path: Path) -> bool:
         """
         Render Mermaid code string to an image.
@@ -140,9 +438,10 @@ class MermaidRenderer:
         Returns:
             True if successful, False otherwise
         """
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.mmd', delete=False) as f:
-            f.write(mermaid_code)
-            temp_input = Path(f.name)
+        with tracer.span("write_temp"):
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.mmd', delete=False) as f:
+                f.write(mermaid_code)
+                temp_input = Path(f.name)
 
         try:
             success = self.render(temp_input, output_path)
@@ -158,7 +457,16 @@ class MermaidRenderer:
         input_dir: Path,
         output_dir: Path,
         output_format: str = 'png',
-        recursive: bool = False
+        recursive: bool = False,
+        formats: Optional[List[str]] = None,
+        themes: Optional[List[str]] = None,
+        changed_since: Optional[str] = None,
+        shard: Optional[Shard] = None,
+        weights: Optional[Dict[str, float]] = None,
+        report: Optional[ShardReport] = None,
+        jobs: int = 1,
+        timings: Optional[Path] = None,
+        optimizer: Optional[ImageOptimizer] = None
     ) -> tuple[int, int]:
         """
         Batch render all .mmd files in a directory.
@@ -168,59 +476,224 @@ class MermaidRenderer:
             output_dir: Output directory for images
             output_format: Output format (png, svg, pdf)
             recursive: Recursively search subdirectories
+            formats: Render these formats per diagram instead of output_format
+            themes: Render these theme variants per diagram (see render_variants)
+            changed_since: Only render files whose content differs from the merge
+                base with this git revision (see git_changes.py)
+            shard: Only render this shard's slice, keyed by path relative to input_dir
+                (see diagram_shards.py)
+            weights: Past render times by key, to balance shards
+            report: Record each diagram's outcome and render time here
+            jobs: Parallel renders (always 1 with the browser engine). With more
+                than one, the most expensive diagrams are dispatched first
+            timings: Render timings file used for the cost estimates and updated
+                with this run's timings (default: None, estimate from the sources only
+                and save nothing)
+            optimizer: Optimize the rendered PNG and SVG files once all renders are
+                done (see image_optimize.py)
 
         Returns:
             Tuple of (success_count, total_count)
+
+        Raises:
+            GitError: If changed_since is given and git fails
         """
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        # Find all .mmd files
-        if recursive:
-            mmd_files = list(input_dir.rglob('*.mmd'))
-        else:
-            mmd_files = list(input_dir.glob('*.mmd'))
+        # Find all .mmd files, sorted so every shard sees the same list
+        with tracer.span("discover"):
+            if recursive:
+                mmd_files = sorted(input_dir.rglob('*.mmd'))
+            else:
+                mmd_files = sorted(input_dir.glob('*.mmd'))
 
         if not mmd_files:
             print(f"No .mmd files found in {input_dir}")
             return 0, 0
 
-        print(f"Found {len(mmd_files)} diagram(s) to render\n")
-
-        success_count = 0
-        for input_file in mmd_files:
-            # Determine output path
+        if changed_since:
+            changes = ChangeSet(changed_since, cwd=input_dir)
+            with tracer.span("changed_filter"):
+                changed = [input_file for input_file in mmd_files if changes.content_changed(input_file)]
+            print(f"{len(changed)}/{len(mmd_files)} diagram(s) new or modified since {changed_since}")
+            mmd_files = changed
+            if not mmd_files:
+                return 0, 0
+
+        def key(input_file: Path) -> str:
+            return input_file.relative_to(input_dir).as_posix()
+
+        if shard is not None:
+            total = len(mmd_files)
+            mmd_files = select(mmd_files, key, shard, weights)
+            print(f"Shard {shard}: {len(mmd_files)} of {total} diagram(s)")
+
+        # The sync browser engine is not thread-safe
+        jobs = 1 if self.engine == 'browser' else max(1, jobs)
+        profile = render_profile(self.engine, formats or [output_format], themes or [self.theme])
+        model = CostModel(timings, profile=profile)
+        sources = {input_file: input_file.read_text(encoding='utf-8') for input_file in mmd_files}
+
+        def output_path(input_file: Path) -> Path:
             if recursive:
                 relative_path = input_file.relative_to(input_dir)
                 output_file = output_dir / relative_path.with_suffix(f'.{output_format}')
                 output_file.parent.mkdir(parents=True, exist_ok=True)
-            else:
-                output_file = output_dir / input_file.with_suffix(f'.{output_format}').name
-
-            print(f"  Rendering: {input_file.name} -> {output_file.name}...", end=" ")
-
-            if self.render(input_file, output_file):
-                print("✅")
-                success_count += 1
-            else:
-                print("❌")
+                return output_file
+            return output_dir / input_file.with_suffix(f'.{output_format}').name
+
+        written: List[Path] = []
+
+        def run(input_file: Path) -> Tuple[bool, float]:
+            output_file = output_path(input_file)
+            start = time.perf_counter()
+            with tracer.diagram(input_file):
+                if formats or themes:
+                    variants = self.render_variants(input_file, output_file.with_suffix(''),
+                                                    formats or [output_format], themes)
+                    rendered = all(variants.values())
+                    written.extend(path for path, ok in variants.items() if ok)
+                else:
+                    rendered = self.render(input_file, output_file)
+                    if rendered:
+                        written.extend(self.uncomposed.get(output_file, [output_file]))
+            return rendered, (time.perf_counter() - start) * 1000
+
+        def finish(input_file: Path, rendered: bool, duration_ms: float):
+            if report is not None:
+                report.add(key(input_file), rendered, duration_ms, None if rendered else 'render failed')
+            if rendered:
+                model.record(sources[input_file], duration_ms)
 
+        success_count = 0
+        if jobs == 1:
+            print(f"Found {len(mmd_files)} diagram(s) to render\n")
+            for input_file in mmd_files:
+                print(f"  Rendering: {input_file.name} -> {output_path(input_file).name}...", end=" ")
+                rendered, duration_ms = run(input_file)
+                finish(input_file, rendered, duration_ms)
+                if rendered:
+                    print("✅")
+                    success_count += 1
+                else:
+                    print("❌")
+        else:
+            with tracer.span("schedule"):
+                ordered = model.longest_first(mmd_files, sources.get)
+            print(f"Found {len(mmd_files)} diagram(s) to render with {jobs} job(s), longest first\n")
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                futures = {pool.submit(run, input_file): input_file for input_file in ordered}
+                for future in as_completed(futures):
+                    input_file = futures[future]
+                    rendered, duration_ms = future.result()
+                    finish(input_file, rendered, duration_ms)
+                    if rendered:
+                        success_count += 1
+                    print(f"  {'✅' if rendered else '❌'} {input_file.name} -> {output_path(input_file).name} "
+                          f"({duration_ms / 1000:.1f}s)")
+
+        model.save()
         print(f"\n✓ Successfully rendered {success_count}/{len(mmd_files)} diagram(s)")
+        if self.visual_gate is not None and self.visual_gate.summary():
+            print(f"✓ {self.visual_gate.summary()}")
+        if optimizer is not None:
+            optimize_outputs(optimizer, written)
         return success_count, len(mmd_files)
 
     @staticmethod
     def _check_mmdc_installed() -> bool:
         """Check if mermaid-cli (mmdc) is installed."""
         try:
-            result = subprocess.run(
-                ['mmdc', '--version'],
-                capture_output=True,
-                timeout=5
-            )
+            with tracer.span("mmdc_version_check"):
+                result = subprocess.run(
+                    ['mmdc', '--version'],
+                    capture_output=True,
+                    timeout=5
+                )
             return result.returncode == 0
         except (FileNotFoundError, subprocess.TimeoutExpired):
             return False
 
 
+def changed_since(input_path: Path, ref: str) -> bool:
+    """True if ``input_path`` differs from the merge base with ``ref``. Exits if git fails."""
+    try:
+        return ChangeSet(ref, cwd=input_path.parent).content_changed(input_path)
+    except GitError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def optimize_outputs(optimizer: ImageOptimizer, paths: List[Path]):
+    """Optimize the rendered PNG and SVG files among paths and print a summary."""
+    # PDFs and failed or missing outputs leave nothing to optimize
+    images = [path for path in paths if path.suffix in ('.png', '.svg') and path.exists()]
+    if not images:
+        return
+    with tracer.span("optimize_outputs"):
+        results = optimizer.optimize_files(images)
+    for result in results:
+        if result.error:
+            print(f"  ⚠️  Not optimized: {result.path}: {result.error}")
+    print(f"✓ {format_summary(results)}")
+
+
+def report_success(renderer: MermaidRenderer, output_path: Path) -> List[Path]:
+    """Print what a successful render() wrote. Returns the files written."""
+    parts = renderer.uncomposed.get(output_path)
+    if not parts:
+        print(f"✅ Success: {output_path}")
+        return [output_path]
+    print(f"✅ Success: {len(parts)} part(s) instead of {output_path.name} (install Pillow to compose them):")
+    for path in parts:
+        print(f"   {path}")
+    return parts
+
+
+def variant_base(output_path: Path) -> Path:
+    """Strip a known image extension so variants can add their own."""
+    if output_path.suffix.lstrip('.') in MermaidRenderer.VALID_FORMATS:
+        return output_path.with_suffix('')
+    return output_path
+
+
+def variant_formats(output_path: Path, args: argparse.Namespace) -> List[str]:
+    """--formats, else the output's own image extension, else --format."""
+    if args.formats:
+        return args.formats
+    suffix = output_path.suffix.lstrip('.')
+    return [suffix if suffix in MermaidRenderer.VALID_FORMATS else args.format]
+
+
+def render_string_variants(renderer: MermaidRenderer, mermaid_code: str, output_path: Path,
+                           args: argparse.Namespace) -> bool:
+    """render_variants() for code read from stdin."""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.mmd', delete=False) as f:
+        f.write(mermaid_code)
+        temp_input = Path(f.name)
+    try:
+        results = renderer.render_variants(temp_input, variant_base(output_path),
+                                           variant_formats(output_path, args), args.themes)
+    finally:
+        temp_input.unlink()
+    for path, ok in results.items():
+        print(f"  {'✅' if ok else '❌'} {path}")
+    return all(results.values())
+
+
+def comma_list(choices: List[str]):
+    """argparse type for a comma-separated subset of ``choices``."""
+    def parse(value: str) -> List[str]:
+        items = [item.strip() for item in value.split(',') if item.strip()]
+        unknown = [item for item in items if item not in choices]
+        if unknown or not items:
+            raise argparse.ArgumentTypeError(
+                f"invalid choice(s): {', '.join(unknown) or value!r} (choose from {', '.join(choices)})"
+            )
+        return items
+    return parse
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Convert Mermaid diagrams to PNG or SVG images',
@@ -236,9 +709,27 @@ Examples:
   # Batch convert directory
   python mermaid_to_image.py diagrams/ output/ --format png
 
+  # Parallel batch, most expensive diagrams first (estimates refined from past timings)
+  python mermaid_to_image.py diagrams/ output/ --jobs 8 --timings .cache/timings.json
+
   # From stdin
   echo "graph TD; A-->B" | python mermaid_to_image.py - output.png
 
+  # Second of four CI shards, with a report for diagram_shards.py merge-reports
+  python mermaid_to_image.py diagrams/ output/ --shard 2/4 --report shard-2.json
+
+  # Light and dark variants as PNG and SVG (one browser render per theme)
+  python mermaid_to_image.py diagram.mmd out/diagram --formats png,svg --themes default,dark -e browser
+
+  # Per-diagram timing breakdown plus a Chrome trace
+  python mermaid_to_image.py diagrams/ output/ --profile --trace-events trace.json
+
+  # Oversized flowcharts/class diagrams in parts of at most 80 nodes, rendered in parallel
+  python mermaid_to_image.py architecture.mmd architecture.svg --partition 80
+
+  # Keep PNGs whose re-render looks the same; heatmaps of the ones that changed
+  python mermaid_to_image.py diagrams/ output/ --diff-dir diffs/
+
 Themes:
   default, forest, dark, neutral, base
         """
@@ -262,14 +753,55 @@ Themes:
                         help='Scale factor (default: 1)')
     parser.add_argument('--config', '-c', type=Path,
                         help='Path to custom Mermaid config file')
+    parser.add_argument('--engine', '-e', choices=MermaidRenderer.VALID_ENGINES, default='mmdc',
+                        help='Renderer: mmdc per diagram, or one shared headless browser (default: mmdc)')
+    parser.add_argument('--partition', type=int, nargs='?', const=DEFAULT_MAX_NODES, metavar='MAX_NODES',
+                        help='Split flowcharts and class diagrams over MAX_NODES nodes (default: '
+                             f'{DEFAULT_MAX_NODES}) along components and subgraphs, render the parts in '
+                             'parallel and compose them (single-format renders)')
 
     # Batch options
     parser.add_argument('--format', '-f', choices=MermaidRenderer.VALID_FORMATS,
                         default='png', help='Output format for batch conversion (default: png)')
     parser.add_argument('--recursive', '-r', action='store_true',
                         help='Recursively process subdirectories')
+    parser.add_argument('--changed-since', metavar='REF',
+                        help='Only render diagrams whose content changed since the merge base with this git revision')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='Parallel renders in batch mode, most expensive first (default: 1; mmdc engine only)')
+    parser.add_argument('--timings', type=Path, metavar='FILE',
+                        help='Render timings for cost estimates, updated after each batch '
+                             '(default: none; estimates come from the sources)')
+    parser.add_argument('--formats', type=comma_list(MermaidRenderer.VALID_FORMATS),
+                        help='Comma-separated formats to write per diagram, e.g. png,svg,pdf')
+    parser.add_argument('--themes', type=comma_list(MermaidRenderer.VALID_THEMES),
+                        help='Comma-separated theme variants per diagram, written as <name>-<theme>.<format>')
+
+    # Output size
+    parser.add_argument('--optimize', '-O', action='store_true',
+                        help='Losslessly recompress PNGs and minify SVGs after rendering (see image_optimize.py)')
+    parser.add_argument('--quantize', action='store_true',
+                        help='With --optimize: try a 256-color palette for PNGs, kept when smaller (lossy)')
+    parser.add_argument('--webp', action='store_true',
+                        help='With --optimize: also write a lossless .webp next to every PNG')
+
+    add_visual_diff_arguments(parser)
+    add_shard_arguments(parser)
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
+    if args.partition and 'pdf' in variant_formats(Path(args.output), args):
+        parser.error("--partition cannot compose PDF parts; render as SVG or PNG")
+    if args.shard is not None and (args.input == '-' or not Path(args.input).is_dir()):
+        parser.error("--shard splits a directory of diagrams; the input is a single diagram")
+    configure_profiling(args)
+    visual_gate = visual_gate_from_args(args)
+
+    optimizer = None
+    if args.optimize or args.quantize or args.webp:
+        optimizer = ImageOptimizer(quantize=args.quantize, webp=args.webp, jobs=max(1, args.jobs))
+        for warning in optimizer.warnings:
+            print(f"⚠️  {warning}", file=sys.stderr)
 
     # Initialize renderer
     renderer = MermaidRenderer(
@@ -278,7 +810,10 @@ Themes:
         width=args.width,
         height=args.height,
         scale=args.scale,
-        config_file=args.config
+        config_file=args.config,
+        engine=args.engine,
+        partition=args.partition,
+        visual_gate=visual_gate
     )
 
     # Handle stdin input
@@ -288,8 +823,17 @@ Themes:
             output_path = Path(args.output)
             print(f"Rendering from stdin to {output_path}...")
 
-            if renderer.render_from_string(mermaid_code, output_path):
-                print(f"✅ Success: {output_path}")
+            with tracer.diagram('<stdin>'):
+                if args.formats or args.themes:
+                    rendered = render_string_variants(renderer, mermaid_code, output_path, args)
+                else:
+                    rendered = renderer.render_from_string(mermaid_code, output_path)
+
+            if rendered:
+                if not (args.formats or args.themes):
+                    outputs = report_success(renderer, output_path)
+                    if optimizer is not None:
+                        optimize_outputs(optimizer, outputs)
                 sys.exit(0)
             else:
                 print("❌ Failed", file=sys.stderr)
@@ -303,24 +847,62 @@ Themes:
 
     # Handle directory (batch mode)
     if input_path.is_dir():
-        success, total = renderer.batch_render(
-            input_path,
-            output_path,
-            output_format=args.format,
-            recursive=args.recursive
-        )
+        report = ShardReport('mermaid_to_image', args.shard)
+        try:
+            success, total = renderer.batch_render(
+                input_path,
+                output_path,
+                output_format=args.format,
+                recursive=args.recursive,
+                formats=args.formats,
+                themes=args.themes,
+                changed_since=args.changed_since,
+                shard=args.shard,
+                weights=load_weights(args.shard_weights),
+                report=report,
+                jobs=args.jobs,
+                timings=args.timings,
+                optimizer=optimizer
+            )
+        except GitError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            sys.exit(1)
+        if args.report:
+            report.write(args.report)
         sys.exit(0 if success == total else 1)
 
     # Handle single file
     elif input_path.is_file():
+        if args.changed_since and not changed_since(input_path, args.changed_since):
+            print(f"Unchanged since {args.changed_since}: {input_path}")
+            sys.exit(0)
+
         print(f"Rendering: {input_path} -> {output_path}")
 
         # Ensure output directory exists
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        if renderer.render(input_path, output_path):
-            print(f"✅ Success: {output_path}")
-            print(f"   Size: {output_path.stat().st_size:,} bytes")
+        if args.formats or args.themes:
+            with tracer.diagram(input_path):
+                results = renderer.render_variants(input_path, variant_base(output_path),
+                                                   variant_formats(output_path, args), args.themes)
+            for path, ok in results.items():
+                print(f"  {'✅' if ok else '❌'} {path}")
+            if optimizer is not None:
+                optimize_outputs(optimizer, [path for path, ok in results.items() if ok])
+            sys.exit(0 if all(results.values()) else 1)
+
+        with tracer.diagram(input_path):
+            rendered = renderer.render(input_path, output_path)
+
+        if rendered:
+            outputs = report_success(renderer, output_path)
+            if visual_gate is not None and visual_gate.results and visual_gate.results[-1][1].identical:
+                print("   Visually unchanged: kept the existing image")
+            if optimizer is not None:
+                optimize_outputs(optimizer, outputs)
+            if outputs == [output_path]:
+                print(f"   Size: {output_path.stat().st_size:,} bytes")
             sys.exit(0)
         else:
             print("❌ Failed", file=sys.stderr)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Render cost estimates for scheduling batch renders longest-first.
+
+With parallel workers the order of dispatch decides the wall time: one huge
+diagram started last keeps a single worker busy after all others finished.
+Dispatching the most expensive renders first (longest processing time
+first) keeps the tail short. CostModel estimates a diagram's render time:
+
+- from timings recorded on previous runs, by canonical content hash and
+  render profile (engine, formats, themes), when the diagram was rendered before
+- otherwise from its source: size, node and edge counts, converted to
+  milliseconds by a factor calibrated against the recorded timings
+
+Timings are stored as JSON and refined with every run. A profile names
+the render settings the timings were measured with (see render_profile).
+
+Usage:
+    # Estimated cost of each diagram, most expensive first
+    python render_cost.py diagrams/ --timings timings.json
+
+    # From another script
+    from render_cost import CostModel, render_profile
+
+    model = CostModel(timings_path, profile=render_profile('mmdc', ['png']))
+    for path in model.longest_first(paths, lambda p: p.read_text()):
+        ...
+        model.record(source, duration_ms)
+    model.save()
+
+Used by mermaid_to_image.py (batch mode with --jobs) and build_diagrams.py.
+
+Requirements:
+    - Python 3.7+ (stdlib only, no external dependencies)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Callable, Tuple, TypeVar
+
+from diagram_canonical import canonical_mermaid
+
+
+TIMINGS_NAME = '.diagram-timings.json'
+TIMINGS_VERSION = 2
+
+# Source heuristic, in milliseconds before calibration
+BASE_MS = 300.0
+MS_PER_KB = 40.0
+MS_PER_NODE = 12.0
+MS_PER_EDGE = 18.0
+
+# Weight of the newest timing in the running averages
+SMOOTHING = 0.5
+CALIBRATION_SMOOTHING = 0.1
+
+# Timings kept; the least recently rendered diagrams are dropped first
+MAX_ENTRIES = 5000
+
+# Flowchart, class, state and sequence arrows (-->, ==>, -.->, <|--, ->>, ~~~, ...)
+EDGE_PATTERN = re.compile(r'\s*(?:<\|?|[*o](?=-))?(?:-{2,}|={2,}|-\.+-|~{3,}|-{1,2}>>?)(?:\|?>|[xo*](?![\w]))?\s*')
+LABEL_PATTERN = re.compile(r'^\|[^|]*\|')
+NODE_PATTERN = re.compile(r'\s*([A-Za-z_][\w-]*)')
+SHAPE_PATTERN = re.compile(r'\s*[A-Za-z_][\w-]*\s*[\[\(\{>]')
+KEYWORDS = {
+    'graph', 'flowchart', 'subgraph', 'end', 'direction', 'classDef', 'class', 'style', 'linkStyle',
+    'click', 'participant', 'actor', 'note', 'loop', 'alt', 'else', 'opt', 'par', 'and', 'rect',
+    'sequenceDiagram', 'classDiagram', 'stateDiagram', 'erDiagram', 'state',
+}
+
+T = TypeVar('T')
+
+
+def source_shape(source: str) -> Tuple[int, int]:
+    """
+    Approximate node and edge counts of Mermaid code.
+
+    Args:
+        source: Mermaid diagram code
+
+    Returns:
+        Tuple of (nodes, edges)
+    """
+    nodes = set()
+    edges = 0
+    for line in source.splitlines():
+        line = line.split('%%', 1)[0].strip()
+        if not line:
+            continue
+        parts = EDGE_PATTERN.split(line)
+        edges += len(parts) - 1
+        for part in parts:
+            part = LABEL_PATTERN.sub('', part)
+            match = NODE_PATTERN.match(part)
+            if match and match.group(1) not in KEYWORDS and (len(parts) > 1 or SHAPE_PATTERN.match(part)):
+                nodes.add(match.group(1))
+    return len(nodes), edges
+
+
+def heuristic_ms(source: str) -> float:
+    """Uncalibrated render time estimate from the source alone."""
+    nodes, edges = source_shape(source)
+    return BASE_MS + len(source.encode('utf-8')) / 1024 * MS_PER_KB + nodes * MS_PER_NODE + edges * MS_PER_EDGE
+
+
+def render_profile(engine: str, formats: List[str], themes: Optional[List[str]] = None) -> str:
+    """Profile string for timings recorded with these render settings, e.g. 'mmdc:png:default'."""
+    return f"{engine}:{','.join(formats)}:{','.join(themes or ['default'])}"
+
+
+class CostModel:
+    """Render time estimates per diagram, refined by the timings of previous runs."""
+
+    def __init__(self, path: Optional[Path] = None, profile: str = ''):
+        """
+        Load recorded timings.
+
+        Args:
+            path: JSON timings file; None keeps timings in memory only
+            profile: Render settings that affect cost (engine, formats, themes);
+                timings are only reused for the same profile
+        """
+        self.path = path
+        self.profile = profile
+        self.calibration = 1.0
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path is not None:
+            self._load(path)
+
+    def _load(self, path: Path):
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return
+        if data.get('version') != TIMINGS_VERSION:
+            return
+        self.calibration = float(data.get('calibration') or 1.0)
+        self.entries = data.get('entries') or {}
+
+    def key(self, source: str) -> str:
+        return hashlib.sha256(f"{self.profile}\0{canonical_mermaid(source)}".encode('utf-8')).hexdigest()[:16]
+
+    def estimate(self, source: str) -> float:
+        """Expected render time of ``source`` in milliseconds."""
+        entry = self.entries.get(self.key(source))
+        if entry is not None:
+            return entry['ms']
+        return heuristic_ms(source) * self.calibration
+
+    def is_known(self, source: str) -> bool:
+        """True if ``source`` was rendered with this profile before."""
+        return self.key(source) in self.entries
+
+    def record(self, source: str, duration_ms: float):
+        """Fold a measured render time into the diagram's average and the calibration."""
+        key = self.key(source)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = {'ms': round(duration_ms, 1)}
+        else:
+            entry['ms'] = round(entry['ms'] * (1 - SMOOTHING) + duration_ms * SMOOTHING, 1)
+        entry['updated'] = int(time.time())
+
+        ratio = duration_ms / heuristic_ms(source)
+        self.calibration = round(self.calibration * (1 - CALIBRATION_SMOOTHING) + ratio * CALIBRATION_SMOOTHING, 4)
+
+    def longest_first(self, items: List[T], source_of: Callable[[T], str]) -> List[T]:
+        """
+        Order items by estimated render time, most expensive first.
+
+        Args:
+            items: Work items (paths, jobs, ...)
+            source_of: Mermaid code of an item
+
+        Returns:
+            The items, longest first; equal estimates keep their original order
+        """
+        costs = {id(item): self.estimate(source_of(item)) for item in items}
+        return sorted(items, key=lambda item: -costs[id(item)])
+
+    def save(self):
+        """Write the timings file atomically, keeping the most recent MAX_ENTRIES."""
+        if self.path is None:
+            return
+        entries = self.entries
+        if len(entries) > MAX_ENTRIES:
+            newest = sorted(entries.items(), key=lambda item: item[1].get('updated', 0), reverse=True)
+            entries = dict(newest[:MAX_ENTRIES])
+
+        data = {'version': TIMINGS_VERSION, 'calibration': self.calibration, 'entries': entries}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps(data, indent=1, sort_keys=True) + '\n', encoding='utf-8')
+        os.replace(temp_path, self.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Estimate the render cost of Mermaid diagrams, most expensive first',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Source-based estimates
+  python render_cost.py diagrams/
+
+  # Using the timings recorded by mermaid_to_image.py batch runs
+  python render_cost.py diagrams/ --timings timings.json
+
+  # ... recorded with --engine browser --formats png,svg --themes dark
+  python render_cost.py diagrams/ --timings timings.json --profile browser:png,svg:dark
+        """
+    )
+    parser.add_argument('input', type=Path, help='Directory of .mmd files (searched recursively)')
+    parser.add_argument('--timings', type=Path, help=f'Recorded timings ({TIMINGS_NAME})')
+    parser.add_argument('--profile', default=render_profile('mmdc', ['png']),
+                        help='Render profile the timings were recorded for, engine:formats:themes '
+                             '(default: %(default)s, the mermaid_to_image.py defaults)')
+    parser.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+    args = parser.parse_args()
+
+    if not args.input.is_dir():
+        print(f"ERROR: Directory not found: {args.input}", file=sys.stderr)
+        sys.exit(1)
+
+    model = CostModel(args.timings, profile=args.profile)
+    sources = {path: path.read_text(encoding='utf-8') for path in sorted(args.input.rglob('*.mmd'))}
+    rows = []
+    for path in model.longest_first(list(sources), sources.get):
+        nodes, edges = source_shape(sources[path])
+        rows.append({
+            "path": path.relative_to(args.input).as_posix(),
+            "estimate_ms": round(model.estimate(sources[path]), 1),
+            "recorded": model.is_known(sources[path]),
+            "nodes": nodes,
+            "edges": edges,
+        })
+
+    if args.json:
+        print(json.dumps({"calibration": model.calibration, "diagrams": rows}, indent=2))
+        return
+
+    for row in rows:
+        source = 'recorded' if row['recorded'] else f"{row['nodes']} nodes, {row['edges']} edges"
+        print(f"  {row['estimate_ms']:>9.0f} ms  {row['path']}  ({source})")
+    print(f"\n{len(rows)} diagram(s), {sum(row['estimate_ms'] for row in rows) / 1000:.1f}s estimated in total")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1143 @@
+#!/usr/bin/env python3
+"""
+Shared headless-browser render engine for Mermaid and Excalidraw diagrams.
+
+One Chromium instance hosts both the Excalidraw template and mermaid.js in
+warm pages, so a docs build with both kinds of diagram launches a single
+browser and loads each template once. All diagram scripts can use it through
+one interface:
+
+    from render_engine import render
+
+    png = render('mermaid', 'graph TD; A-->B', {'format': 'png', 'theme': 'dark'})
+    png = render('excalidraw', Path('scene.excalidraw'), {'scale': 2})
+
+Theme and format variants of a Mermaid diagram come from one render per
+theme, each yielded as soon as it is ready:
+
+    for theme, fmt, data in get_engine().render_variants(code, ['default', 'dark'], ['png', 'svg']):
+        Path(f'diagram-{theme}.{fmt}').write_bytes(data)
+
+Several Excalidraw figures (whole scenes or single frames) can be exported
+in one page call, as separate images or as one multi-page PDF:
+
+    pngs = get_engine().render_figures([(Path('a.excalidraw'), None), (Path('b.excalidraw'), 'frame-1')])
+    pdf = get_engine().render_figures_pdf([(Path('a.excalidraw'), 'frame-1'), (Path('a.excalidraw'), 'frame-2')])
+
+Excalidraw scenes passed as a Path are served to the page straight from disk
+through request routing, so large scenes (embedded images in ``files``) are
+never copied or re-serialized in Python.
+
+Usage:
+    # Render a file directly (kind is inferred from the extension)
+    python render_engine.py diagram.mmd output.png --theme dark
+    python render_engine.py scene.excalidraw output.png --scale 2
+
+Options (all optional):
+    format      png (default), svg or pdf
+    scale       Device scale factor (default: 1 for Mermaid, 2 for Excalidraw)
+    theme       Mermaid theme (default, forest, dark, neutral, base)
+    background  Mermaid background color (default: transparent)
+    width       Mermaid viewport width in pixels (default: 800); for an Excalidraw
+                screenshot, the maximum viewport width (render_excalidraw.py --width)
+    config      Extra Mermaid config dict merged into mermaid.initialize()
+    raster      Excalidraw PNG path: canvas (default, Excalidraw's exportToBlob
+                at the requested scale) or screenshot (SVG element screenshot)
+
+The sync Playwright API is not thread-safe: use one engine per thread.
+
+Long-running use:
+    Chromium pages leak memory over thousands of renders and a page can hang
+    in the template. Both engines therefore keep their pool healthy:
+
+    - A page is closed and replaced after ``max_page_renders`` renders.
+    - Every few seconds the RSS of the Playwright driver and browser processes
+      is checked against ``max_rss_mb``: over the cap all pages are recycled,
+      and if that is not enough by the next check the browser is restarted.
+    - ``timeout_ms`` is a deadline for each render. A render that misses it
+      is treated as hung: its page (the whole browser for the sync engine,
+      whose blocked call can only be interrupted by killing it) is discarded
+      and the render is retried on a fresh one, up to ``retries`` times.
+
+    ``engine.stats`` counts renders, recycled pages, restarts and hangs.
+
+Async API:
+    AsyncRenderEngine renders with Playwright's async API from one event loop.
+    Each in-flight render gets its own warm page, up to ``max_concurrency``, and
+    cancelling the awaiting task abandons the render and discards its page.
+    run_process() is the matching asyncio replacement for subprocess.run()
+    that the mmdc-based renderers use.
+
+    async def build(sources):
+        engine = get_async_engine()
+        try:
+            return await asyncio.gather(*(engine.render('mermaid', s) for s in sources))
+        finally:
+            await close_async_engine()
+
+Requirements:
+    - playwright (pip install playwright && playwright install chromium)
+"""
+
+import argparse
+import asyncio
+import atexit
+import base64
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any, Awaitable, Callable, Iterator, List, Set, Tuple, TypeVar, Union
+
+from diagram_trace import tracer
+
+
+MERMAID_TEMPLATE = Path(__file__).resolve().parent / 'mermaid_template.html'
+EXCALIDRAW_TEMPLATE = (
+    Path(__file__).resolve().parents[2] / 'excalidraw-diagram' / 'references' / 'render_template.html'
+)
+
+INSTALL_HINT = "Install with: pip install playwright && playwright install chromium"
+
+# Virtual URLs Excalidraw pages fetch file-backed scenes from
+SCENE_BASE = 'https://scene.excalidraw.invalid/'
+SCENE_URL = SCENE_BASE + 'scene.json'
+SCENE_RESPONSE = {'content_type': 'application/json', 'headers': {'Access-Control-Allow-Origin': '*'}}
+
+RENDER_MERMAID_JS = "([source, options]) => window.renderMermaid(source, options)"
+OUTER_SVG_JS = "() => document.querySelector('#root svg').outerHTML"
+
+# Memory of the Playwright driver and browser processes, from ps (macOS and Linux)
+PS_COMMAND = ['ps', '-A', '-o', 'pid=,ppid=,rss=,comm=']
+
+# Mermaid code, or an Excalidraw scene as JSON text/bytes, dict or file path
+DiagramSource = Union[str, bytes, Dict, Path]
+
+# An Excalidraw scene and the id of one of its frames (None for the whole scene)
+Figure = Tuple[DiagramSource, Optional[str]]
+
+T = TypeVar('T')
+
+
+class RenderError(Exception):
+    """Raised when a diagram cannot be rendered."""
+
+
+class RenderEngine:
+    """A single headless Chromium with one warm page per diagram kind and scale."""
+
+    KINDS = ('mermaid', 'excalidraw')
+    FORMATS = ('png', 'svg', 'pdf')
+    TEMPLATES = {'mermaid': MERMAID_TEMPLATE, 'excalidraw': EXCALIDRAW_TEMPLATE}
+    DEFAULT_SCALE = {'mermaid': 1, 'excalidraw': 2}
+    RASTERS = ('canvas', 'screenshot')
+
+    # Largest viewport dimension Chromium reliably screenshots
+    MAX_VIEWPORT = 16384
+
+    # Seconds between browser memory checks
+    MEMORY_CHECK_INTERVAL = 10.0
+
+    def __init__(
+        self,
+        timeout_ms: int = 30000,
+        max_page_renders: int = 200,
+        max_rss_mb: Optional[int] = 2048,
+        retries: int = 1
+    ):
+        """
+        Initialize the engine. The browser starts lazily on first render.
+
+        Args:
+            timeout_ms: Timeout for template load, and deadline for each render
+            max_page_renders: Replace a page after this many renders (0: never)
+            max_rss_mb: Memory cap for the driver and browser processes (None: no cap)
+            retries: Times a render that missed its deadline is retried
+        """
+        self.timeout_ms = timeout_ms
+        self.max_page_renders = max_page_renders
+        self.max_rss_mb = max_rss_mb
+        self.retries = retries
+        self._playwright = None
+        self._browser = None
+        self._pages: Dict[Tuple[str, int], Any] = {}
+        self._page_uses: Dict[Tuple[str, int], int] = {}
+        self._driver_pids: Set[int] = set()
+        self._hung = threading.Event()
+        # Bumped whenever the browser is torn down, so a watchdog armed for one
+        # browser never kills its replacement
+        self._generation = 0
+        self._watchdog_lock = threading.Lock()
+        self._memory_checked = 0.0
+        self._memory_pressure = False
+        self.stats = _pool_stats()
+
+    def __enter__(self) -> 'RenderEngine':
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.close()
+        return False
+
+    def start(self):
+        """Launch the shared browser if it is not running yet."""
+        if self._browser is not None:
+            return
+
+        try:
+            from playwright.sync_api import sync_playwright
+        except ImportError:
+            raise RenderError(f"playwright not installed. {INSTALL_HINT}")
+
+        children = _child_pids(_process_table())
+        self._playwright = sync_playwright().start()
+        # Known before launch, so the watchdog can also end a hung launch
+        self._driver_pids = _child_pids(_process_table()) - children
+        try:
+            with tracer.span("browser_launch"):
+                self._browser = self._playwright.chromium.launch(headless=True)
+        except Exception as e:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+            self._driver_pids = set()
+            if "Executable doesn't exist" in str(e):
+                raise RenderError(f"Chromium not installed for Playwright. {INSTALL_HINT}")
+            raise RenderError(f"Browser launch failed: {e}")
+
+    def close(self):
+        """Close all pages and the browser."""
+        with self._watchdog_lock:
+            self._generation += 1
+        for page in self._pages.values():
+            try:
+                page.close()
+            except Exception:
+                pass
+        self._pages.clear()
+        self._page_uses.clear()
+
+        if self._browser is not None:
+            with tracer.span("browser_close"):
+                try:
+                    self._browser.close()
+                except Exception:
+                    # Already gone, e.g. killed by the render watchdog
+                    pass
+            self._browser = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+        self._driver_pids = set()
+
+    def _page(self, kind: str, scale: int):
+        """Return the warm page for ``kind`` at ``scale``, loading its template once."""
+        key = (kind, scale)
+        page = self._pages.get(key)
+        if page is not None:
+            return page
+
+        template = self.TEMPLATES[kind]
+        if not template.exists():
+            raise RenderError(f"Template not found at {template}")
+
+        self.start()
+        with tracer.span("new_page", kind=kind):
+            page = self._browser.new_page(device_scale_factor=scale)
+        with tracer.span("template_load", kind=kind):
+            page.goto(template.as_uri())
+            page.wait_for_function("window.__moduleReady === true", timeout=self.timeout_ms)
+
+        self._pages[key] = page
+        return page
+
+    def _guarded(self, kind: str, scale: int, call: Callable[[Any], T]) -> T:
+        """
+        Run ``call(page)`` on the warm page for ``kind`` at ``scale`` within the render deadline.
+
+        A sync Playwright call cannot be interrupted, so a watchdog kills the
+        browser processes at the deadline; the blocked call then fails and is
+        retried on a fresh browser. The deadline covers a browser launch or
+        template load inside the call. The watchdog only kills the browser
+        generation it was armed for.
+        """
+        key = (kind, scale)
+        for attempt in range(self.retries + 1):
+            self._hung.clear()
+            watchdog = threading.Timer(self.timeout_ms / 1000, self._kill_browser, args=(self._generation,))
+            watchdog.daemon = True
+            watchdog.start()
+
+            finished = False
+            try:
+                result = call(self._page(kind, scale))
+                finished = True
+            except Exception as e:
+                if not self._hung.is_set():
+                    if isinstance(e, RenderError):
+                        self._after_render(key)
+                    raise
+            finally:
+                watchdog.cancel()
+
+            if not self._hung.is_set():
+                self._after_render(key)
+                return result
+
+            self._restart_browser()
+            if finished:
+                # The deadline passed just as the render completed
+                return result
+            self.stats['hung_renders'] += 1
+            if attempt == self.retries:
+                raise RenderError(f"Render did not finish within {self.timeout_ms} ms ({attempt + 1} attempts)")
+            self.stats['retries'] += 1
+
+    def _kill_browser(self, generation: int):
+        """Watchdog thread: kill the browser so the hung Playwright call returns."""
+        with self._watchdog_lock:
+            if generation != self._generation:
+                # That browser is already gone; this one belongs to a later render
+                return
+            self._hung.set()
+            _kill_processes(_descendants(_process_table(), self._driver_pids))
+
+    def _restart_browser(self):
+        with tracer.span("browser_restart"):
+            self.close()
+        self.stats['browser_restarts'] += 1
+
+    def _retire_page(self, key: Tuple[str, int]):
+        page = self._pages.pop(key, None)
+        self._page_uses.pop(key, None)
+        if page is not None:
+            with tracer.span("page_recycle", kind=key[0]):
+                try:
+                    page.close()
+                except Exception:
+                    pass
+            self.stats['pages_recycled'] += 1
+
+    def _after_render(self, key: Tuple[str, int]):
+        """Count a render on the page for ``key``; recycle it or the browser when due."""
+        self.stats['renders'] += 1
+        uses = self._page_uses[key] = self._page_uses.get(key, 0) + 1
+        if self.max_page_renders and uses >= self.max_page_renders:
+            self._retire_page(key)
+
+        if not self.max_rss_mb or time.monotonic() - self._memory_checked < self.MEMORY_CHECK_INTERVAL:
+            return
+        self._memory_checked = time.monotonic()
+        rss_mb = self.stats['rss_mb'] = _tree_rss_mb(_process_table(), self._driver_pids)
+        if rss_mb is None or rss_mb <= self.max_rss_mb:
+            self._memory_pressure = False
+        elif self._memory_pressure:
+            # Fresh pages did not help: the browser process itself grew
+            self._restart_browser()
+            self._memory_pressure = False
+        else:
+            for page_key in list(self._pages):
+                self._retire_page(page_key)
+            self._memory_pressure = True
+
+    def render(self, kind: str, source: DiagramSource, options: Optional[Dict[str, Any]] = None) -> bytes:
+        """
+        Render a diagram.
+
+        Args:
+            kind: 'mermaid' or 'excalidraw'
+            source: Mermaid code, or Excalidraw scene as JSON text/bytes, dict or file Path
+            options: Render options (see module docstring)
+
+        Returns:
+            Rendered image bytes in the requested format
+
+        Raises:
+            RenderError: If the kind/format is unknown or rendering fails
+        """
+        source, options, output_format, scale = _prepare(kind, source, options)
+
+        if options.get('raster') == 'canvas':
+            # Scale is applied by the canvas export, so one page serves every scale
+            return self._guarded(kind, 1, lambda page: self._export_excalidraw_png(page, source, scale))
+
+        def call(page) -> bytes:
+            if kind == 'mermaid':
+                result = self._render_mermaid(page, source, options)
+            else:
+                result = self._render_excalidraw(page, source)
+            return self._export(page, result, output_format, options)
+
+        return self._guarded(kind, scale, call)
+
+    def render_variants(
+        self,
+        source: DiagramSource,
+        themes: List[str],
+        formats: List[str],
+        options: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Tuple[str, str, bytes]]:
+        """
+        Render a Mermaid diagram once per theme and export every format from that render.
+
+        Args:
+            source: Mermaid code (str/bytes) or .mmd file Path
+            themes: Mermaid themes to render
+            formats: Output formats to export for each theme
+            options: Render options shared by all variants (see module docstring)
+
+        Yields:
+            (theme, format, data) for each variant, as soon as its theme is rendered
+
+        Raises:
+            RenderError: If a format is unknown or rendering fails
+        """
+        for output_format in formats:
+            if output_format not in self.FORMATS:
+                raise RenderError(f"Unknown format '{output_format}' (expected one of {', '.join(self.FORMATS)})")
+
+        if isinstance(source, bytes):
+            source = source.decode('utf-8')
+        if isinstance(source, Path):
+            source = source.read_text(encoding='utf-8')
+
+        options = dict(options or {})
+        scale = int(options.get('scale') or self.DEFAULT_SCALE['mermaid'])
+        for theme in themes:
+            def call(page, theme=theme) -> List[Tuple[str, bytes]]:
+                result = self._render_mermaid(page, source, {**options, 'theme': theme})
+                return [(output_format, self._export(page, result, output_format, options)) for output_format in formats]
+
+            for output_format, data in self._guarded('mermaid', scale, call):
+                yield theme, output_format, data
+
+    def _render_mermaid(self, page, source: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        page.set_viewport_size(_mermaid_viewport(options))
+        with tracer.span("render", kind='mermaid'):
+            result = page.evaluate(RENDER_MERMAID_JS, [source, _mermaid_page_options(options)])
+        return _checked(result, 'renderMermaid')
+
+    def _call_scene(self, page, function: str, source: Union[str, Dict, Path], *args: Any) -> Any:
+        """Call ``window.<function>(scene, ...args)`` in the page, or its FromUrl variant for a Path."""
+        if isinstance(source, Path):
+            # Zero-copy: Playwright serves the file, the page fetches and parses it
+            page.route(SCENE_URL, lambda route: route.fulfill(path=str(source), **SCENE_RESPONSE))
+            try:
+                return page.evaluate(
+                    f"([url, args]) => window.{function}FromUrl(url, ...args)", [SCENE_URL, list(args)]
+                )
+            finally:
+                page.unroute(SCENE_URL)
+        # Passed as an evaluate argument: the template parses JSON text itself
+        return page.evaluate(f"([data, args]) => window.{function}(data, ...args)", [source, list(args)])
+
+    def _render_excalidraw(self, page, source: Union[str, Dict, Path]) -> Dict[str, Any]:
+        with tracer.span("render", kind='excalidraw'):
+            result = _checked(self._call_scene(page, 'renderDiagram', source), 'renderDiagram')
+        return {**result, 'svg': page.evaluate(OUTER_SVG_JS)}
+
+    def _export_excalidraw_png(self, page, source: Union[str, Dict, Path], scale: int) -> bytes:
+        with tracer.span("render", kind='excalidraw', raster='canvas'):
+            result = _checked(self._call_scene(page, 'exportDiagramPng', source, {'scale': scale}), 'exportDiagramPng')
+        with tracer.span("decode_png"):
+            return base64.b64decode(result['png'])
+
+    def render_figures(self, figures: List[Figure], options: Optional[Dict[str, Any]] = None) -> List[bytes]:
+        """
+        Render several Excalidraw figures with one page call.
+
+        Args:
+            figures: (scene, frame_id) pairs; a frame_id of None exports the whole scene
+            options: format (png or svg) and scale
+
+        Returns:
+            One image per figure, in order
+
+        Raises:
+            RenderError: If the format is unsupported or any figure fails
+        """
+        options = dict(options or {})
+        output_format = options.get('format', 'png')
+        if output_format not in ('png', 'svg'):
+            raise RenderError(f"Unknown figure format '{output_format}' (use render_figures_pdf() for PDF)")
+
+        scale = int(options.get('scale') or self.DEFAULT_SCALE['excalidraw'])
+        results = self._guarded('excalidraw', 1, lambda page: self._export_figures(page, figures, output_format, scale))
+        with tracer.span("decode_figures", count=len(results)):
+            if output_format == 'png':
+                return [base64.b64decode(result['png']) for result in results]
+            return [result['svg'].encode('utf-8') for result in results]
+
+    def render_figures_pdf(self, figures: List[Figure]) -> bytes:
+        """
+        Render several Excalidraw figures into one PDF, one page per figure.
+
+        Args:
+            figures: (scene, frame_id) pairs; a frame_id of None exports the whole scene
+
+        Returns:
+            PDF bytes with each page sized to its figure
+        """
+        def call(page) -> bytes:
+            self._export_figures(page, figures, 'pdf', 1)
+            with tracer.span("pdf", pages=len(figures)):
+                return page.pdf(prefer_css_page_size=True, print_background=True)
+
+        return self._guarded('excalidraw', 1, call)
+
+    def _export_figures(self, page, figures: List[Figure], output_format: str, scale: int) -> List[Dict[str, Any]]:
+        """Run window.exportFigures() for ``figures``, serving file-backed scenes by routing."""
+        if not figures:
+            return []
+
+        specs = []
+        urls: Dict[Path, str] = {}
+        for source, frame_id in figures:
+            if isinstance(source, bytes):
+                source = source.decode('utf-8')
+            if isinstance(source, Path):
+                # A scene exported frame by frame is routed and fetched once
+                url = urls.setdefault(source, f"{SCENE_BASE}{len(urls)}.json")
+                specs.append({'url': url, 'frameId': frame_id})
+            else:
+                specs.append({'scene': source, 'frameId': frame_id})
+
+        paths = {url: path for path, url in urls.items()}
+
+        def serve(route):
+            path = paths.get(route.request.url)
+            if path is None:
+                route.abort()
+                return
+            route.fulfill(path=str(path), **SCENE_RESPONSE)
+
+        if paths:
+            page.route(SCENE_BASE + '**', serve)
+        try:
+            with tracer.span("render", kind='excalidraw', figures=len(specs), format=output_format):
+                result = page.evaluate(
+                    "([specs, options]) => window.exportFigures(specs, options)",
+                    [specs, {'format': output_format, 'scale': scale}]
+                )
+        finally:
+            if paths:
+                page.unroute(SCENE_BASE + '**')
+
+        return _checked(result, 'exportFigures')['figures']
+
+    def _export(self, page, result: Dict[str, Any], output_format: str, options: Dict[str, Any]) -> bytes:
+        if output_format == 'svg':
+            return result['svg'].encode('utf-8')
+
+        width, height, viewport = _export_viewport(result, page.viewport_size, _screenshot_max_width(options))
+        page.set_viewport_size(viewport)
+
+        if output_format == 'pdf':
+            with tracer.span("pdf"):
+                return page.pdf(width=f"{width}px", height=f"{height}px", print_background=True,
+                                page_ranges='1')
+
+        svg_el = page.query_selector('#root svg')
+        if svg_el is None:
+            raise RenderError("No SVG element found after render.")
+        with tracer.span("screenshot"):
+            return svg_el.screenshot(type='png', omit_background=options.get('background') == 'transparent')
+
+
+def _prepare(kind: str, source: DiagramSource, options: Optional[Dict[str, Any]]) -> Tuple[Any, Dict[str, Any], str, int]:
+    """Validate a render request. Returns (source, options, format, scale); options['raster'] is set for Excalidraw PNG."""
+    options = dict(options or {})
+    if kind not in RenderEngine.KINDS:
+        raise RenderError(f"Unknown diagram kind '{kind}' (expected one of {', '.join(RenderEngine.KINDS)})")
+
+    output_format = options.get('format', 'png')
+    if output_format not in RenderEngine.FORMATS:
+        raise RenderError(f"Unknown format '{output_format}' (expected one of {', '.join(RenderEngine.FORMATS)})")
+
+    if isinstance(source, bytes):
+        source = source.decode('utf-8')
+    if isinstance(source, Path) and kind == 'mermaid':
+        source = source.read_text(encoding='utf-8')
+
+    scale = int(options.get('scale') or RenderEngine.DEFAULT_SCALE[kind])
+
+    if kind == 'excalidraw' and output_format == 'png':
+        options['raster'] = options.get('raster') or 'canvas'
+        if options['raster'] not in RenderEngine.RASTERS:
+            raise RenderError(
+                f"Unknown raster mode '{options['raster']}' (expected one of {', '.join(RenderEngine.RASTERS)})"
+            )
+    else:
+        options.pop('raster', None)
+
+    return source, options, output_format, scale
+
+
+def _checked(result: Optional[Dict[str, Any]], function: str) -> Dict[str, Any]:
+    """Return a template call's result, or raise its error."""
+    if not result or not result.get('success'):
+        raise RenderError(result.get('error', 'Unknown render error') if result else f'{function} returned null')
+    return result
+
+
+def _mermaid_viewport(options: Dict[str, Any]) -> Dict[str, int]:
+    return {'width': int(options.get('width') or 800), 'height': int(options.get('height') or 600)}
+
+
+def _mermaid_page_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'theme': options.get('theme', 'default'),
+        'background': options.get('background', 'transparent'),
+        'config': options.get('config') or {},
+    }
+
+
+def _screenshot_max_width(options: Dict[str, Any]) -> Optional[int]:
+    """Viewport width cap of an Excalidraw screenshot (the 'width' option), None otherwise."""
+    if options.get('raster') != 'screenshot' or not options.get('width'):
+        return None
+    return int(options['width'])
+
+
+def _export_viewport(
+    result: Dict[str, Any],
+    viewport: Optional[Dict[str, int]],
+    max_width: Optional[int] = None
+) -> Tuple[int, int, Dict[str, int]]:
+    """Diagram size from a render result and a viewport large enough to capture it, at most ``max_width`` wide."""
+    width = min(int(float(result.get('width') or 0)) or 1, RenderEngine.MAX_VIEWPORT)
+    height = min(int(float(result.get('height') or 0)) or 1, RenderEngine.MAX_VIEWPORT)
+    viewport = viewport or {}
+    viewport_width = max(width, viewport.get('width', 0))
+    if max_width:
+        viewport_width = min(width, max_width)
+    return width, height, {
+        'width': viewport_width,
+        'height': max(height, viewport.get('height', 0)),
+    }
+
+
+_engine: Optional[RenderEngine] = None
+
+
+def get_engine() -> RenderEngine:
+    """Return the process-wide engine, closed automatically at exit."""
+    global _engine
+    if _engine is None:
+        _engine = RenderEngine()
+        atexit.register(_engine.close)
+    return _engine
+
+
+def render(kind: str, source: DiagramSource, options: Optional[Dict[str, Any]] = None) -> bytes:
+    """Render a diagram with the shared engine. See RenderEngine.render()."""
+    return get_engine().render(kind, source, options)
+
+
+class AsyncRenderEngine:
+    """
+    Async counterpart of RenderEngine for use from an event loop.
+
+    One headless Chromium driven by Playwright's async API. Concurrent renders
+    each take a warm page for their kind and scale from a pool, bounded by
+    ``max_concurrency``; further renders wait for a free page. A render whose
+    task is cancelled (or that fails outside the template, or misses its
+    deadline) closes its page, since it may still be busy, so the pool only
+    ever holds idle pages.
+    """
+
+    # Seconds to wait for a page to close before restarting the browser instead
+    PAGE_CLOSE_TIMEOUT = 5.0
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        timeout_ms: int = 30000,
+        max_page_renders: int = 200,
+        max_rss_mb: Optional[int] = 2048,
+        retries: int = 1
+    ):
+        """
+        Initialize the engine. The browser starts lazily on first render.
+
+        Args:
+            max_concurrency: Maximum renders in flight, i.e. pages in use at once
+            timeout_ms: Timeout for template load, and deadline for each render
+            max_page_renders: Replace a page after this many renders (0: never)
+            max_rss_mb: Memory cap for the driver and browser processes (None: no cap)
+            retries: Times a render that missed its deadline is retried
+        """
+        self.max_concurrency = max_concurrency
+        self.timeout_ms = timeout_ms
+        self.max_page_renders = max_page_renders
+        self.max_rss_mb = max_rss_mb
+        self.retries = retries
+        self._playwright = None
+        self._browser = None
+        self._start_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._idle: Dict[Tuple[str, int], List[Any]] = {}
+        # Page -> [pool generation it was created in, renders done]
+        self._page_state: Dict[Any, List[int]] = {}
+        self._generation = 0
+        self._driver_pids: Set[int] = set()
+        self._maintenance = asyncio.Lock()
+        self._memory_checked = 0.0
+        self._memory_pressure = False
+        self._restart_needed = False
+        self.stats = _pool_stats()
+
+    async def __aenter__(self) -> 'AsyncRenderEngine':
+        return self
+
+    async def __aexit__(self, *exc) -> bool:
+        await self.close()
+        return False
+
+    async def start(self):
+        """Launch the shared browser if it is not running yet."""
+        async with self._start_lock:
+            if self._browser is not None:
+                return
+
+            try:
+                from playwright.async_api import async_playwright
+            except ImportError:
+                raise RenderError(f"playwright not installed. {INSTALL_HINT}")
+
+            children = _child_pids(await _process_table_async())
+            self._playwright = await async_playwright().start()
+            try:
+                with tracer.span("browser_launch"):
+                    self._browser = await self._playwright.chromium.launch(headless=True)
+            except Exception as e:
+                await self._playwright.stop()
+                self._playwright = None
+                if "Executable doesn't exist" in str(e):
+                    raise RenderError(f"Chromium not installed for Playwright. {INSTALL_HINT}")
+                raise RenderError(f"Browser launch failed: {e}")
+            self._driver_pids = _child_pids(await _process_table_async()) - children
+
+    async def close(self):
+        """Close all idle pages and the browser."""
+        for pages in self._idle.values():
+            for page in pages:
+                await _close_page(page, self.PAGE_CLOSE_TIMEOUT)
+        self._idle.clear()
+        self._page_state.clear()
+
+        if self._browser is not None:
+            with tracer.span("browser_close"):
+                try:
+                    await self._browser.close()
+                except Exception:
+                    pass
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        self._driver_pids = set()
+
+    async def _new_page(self, kind: str, scale: int):
+        template = RenderEngine.TEMPLATES[kind]
+        if not template.exists():
+            raise RenderError(f"Template not found at {template}")
+
+        await self.start()
+        with tracer.span("new_page", kind=kind):
+            page = await self._browser.new_page(device_scale_factor=scale)
+        try:
+            with tracer.span("template_load", kind=kind):
+                await page.goto(template.as_uri())
+                await page.wait_for_function("window.__moduleReady === true", timeout=self.timeout_ms)
+        except BaseException:
+            await _close_page(page, self.PAGE_CLOSE_TIMEOUT)
+            raise
+        self._page_state[page] = [self._generation, 0]
+        return page
+
+    @asynccontextmanager
+    async def _page(self, kind: str, scale: int):
+        """Borrow a warm page for ``kind`` at ``scale`` for one render."""
+        async with self._slots:
+            idle = self._idle.setdefault((kind, scale), [])
+            page = idle.pop() if idle else await self._new_page(kind, scale)
+            try:
+                yield page
+            except RenderError:
+                # The template reported the error; the page is still usable
+                await self._release(page, idle)
+                raise
+            except BaseException:
+                await self._discard(page)
+                raise
+            await self._release(page, idle)
+
+    async def _release(self, page, idle: List[Any]):
+        """Return a page after a render, or replace it if it is due for recycling."""
+        self.stats['renders'] += 1
+        state = self._page_state.setdefault(page, [self._generation, 0])
+        state[1] += 1
+        if state[0] != self._generation or (self.max_page_renders and state[1] >= self.max_page_renders):
+            with tracer.span("page_recycle"):
+                await self._discard(page)
+            self.stats['pages_recycled'] += 1
+        else:
+            idle.append(page)
+
+    async def _discard(self, page):
+        self._page_state.pop(page, None)
+        if not await _close_page(page, self.PAGE_CLOSE_TIMEOUT):
+            # A renderer that does not even close: start over with a new browser
+            self._restart_needed = True
+
+    async def _guarded(self, kind: str, scale: int, call: Callable[[Any], Awaitable[T]]) -> T:
+        """
+        Run ``await call(page)`` on a pooled page within the render deadline.
+
+        A render that misses the deadline is cancelled, its page closed, and
+        the render retried on a fresh page.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._page(kind, scale) as page:
+                    result = await asyncio.wait_for(call(page), self.timeout_ms / 1000)
+            except asyncio.TimeoutError:
+                self.stats['hung_renders'] += 1
+                if attempt == self.retries:
+                    raise RenderError(f"Render did not finish within {self.timeout_ms} ms ({attempt + 1} attempts)")
+                self.stats['retries'] += 1
+                await self._maintain()
+                continue
+            await self._maintain()
+            return result
+
+    async def _maintain(self):
+        """Check browser memory now and then, and restart the browser when needed."""
+        if self._maintenance.locked():
+            return
+        async with self._maintenance:
+            due = time.monotonic() - self._memory_checked >= RenderEngine.MEMORY_CHECK_INTERVAL
+            if self.max_rss_mb and due and not self._restart_needed:
+                self._memory_checked = time.monotonic()
+                rss_mb = self.stats['rss_mb'] = _tree_rss_mb(await _process_table_async(), self._driver_pids)
+                if rss_mb is None or rss_mb <= self.max_rss_mb:
+                    self._memory_pressure = False
+                elif self._memory_pressure:
+                    # Fresh pages did not help: the browser process itself grew
+                    self._restart_needed = True
+                else:
+                    # Retire every page: idle ones now, busy ones when they are returned
+                    self._generation += 1
+                    for pages in self._idle.values():
+                        while pages:
+                            await self._discard(pages.pop())
+                            self.stats['pages_recycled'] += 1
+                    self._memory_pressure = True
+
+            if self._restart_needed:
+                await self._restart()
+
+    async def _restart(self):
+        """Restart the browser once the renders in flight have finished."""
+        acquired = 0
+        try:
+            for _ in range(self.max_concurrency):
+                await self._slots.acquire()
+                acquired += 1
+            with tracer.span("browser_restart"):
+                await self.close()
+            self.stats['browser_restarts'] += 1
+            self._restart_needed = False
+            self._memory_pressure = False
+        finally:
+            for _ in range(acquired):
+                self._slots.release()
+
+    async def render(self, kind: str, source: DiagramSource, options: Optional[Dict[str, Any]] = None) -> bytes:
+        """
+        Render a diagram. Same contract as RenderEngine.render().
+
+        Raises:
+            RenderError: If the kind/format is unknown or rendering fails
+            asyncio.CancelledError: If the awaiting task is cancelled
+        """
+        source, options, output_format, scale = _prepare(kind, source, options)
+
+        if options.get('raster') == 'canvas':
+            async def export_png(page) -> bytes:
+                with tracer.span("render", kind='excalidraw', raster='canvas'):
+                    result = await self._call_scene(page, 'exportDiagramPng', source, {'scale': scale})
+                return base64.b64decode(_checked(result, 'exportDiagramPng')['png'])
+
+            return await self._guarded(kind, 1, export_png)
+
+        async def call(page) -> bytes:
+            if kind == 'mermaid':
+                await page.set_viewport_size(_mermaid_viewport(options))
+                with tracer.span("render", kind='mermaid'):
+                    result = _checked(
+                        await page.evaluate(RENDER_MERMAID_JS, [source, _mermaid_page_options(options)]),
+                        'renderMermaid'
+                    )
+            else:
+                with tracer.span("render", kind='excalidraw'):
+                    result = _checked(await self._call_scene(page, 'renderDiagram', source), 'renderDiagram')
+                result = {**result, 'svg': await page.evaluate(OUTER_SVG_JS)}
+
+            return await self._export(page, result, output_format, options)
+
+        return await self._guarded(kind, scale, call)
+
+    async def _call_scene(self, page, function: str, source: Union[str, Dict, Path], *args: Any) -> Any:
+        """Async RenderEngine._call_scene()."""
+        if isinstance(source, Path):
+            async def serve(route):
+                await route.fulfill(path=str(source), **SCENE_RESPONSE)
+
+            await page.route(SCENE_URL, serve)
+            try:
+                return await page.evaluate(
+                    f"([url, args]) => window.{function}FromUrl(url, ...args)", [SCENE_URL, list(args)]
+                )
+            finally:
+                await page.unroute(SCENE_URL)
+        return await page.evaluate(f"([data, args]) => window.{function}(data, ...args)", [source, list(args)])
+
+    async def _export(self, page, result: Dict[str, Any], output_format: str, options: Dict[str, Any]) -> bytes:
+        if output_format == 'svg':
+            return result['svg'].encode('utf-8')
+
+        width, height, viewport = _export_viewport(result, page.viewport_size, _screenshot_max_width(options))
+        await page.set_viewport_size(viewport)
+
+        if output_format == 'pdf':
+            with tracer.span("pdf"):
+                return await page.pdf(width=f"{width}px", height=f"{height}px", print_background=True,
+                                      page_ranges='1')
+
+        svg_el = await page.query_selector('#root svg')
+        if svg_el is None:
+            raise RenderError("No SVG element found after render.")
+        with tracer.span("screenshot"):
+            return await svg_el.screenshot(type='png', omit_background=options.get('background') == 'transparent')
+
+
+async def _close_page(page, timeout: float) -> bool:
+    """Close a page; False if it did not close within ``timeout`` seconds."""
+    try:
+        await asyncio.wait_for(page.close(), timeout)
+    except asyncio.TimeoutError:
+        return False
+    except Exception:
+        pass
+    return True
+
+
+def _pool_stats() -> Dict[str, Any]:
+    return {
+        'renders': 0,
+        'pages_recycled': 0,
+        'browser_restarts': 0,
+        'hung_renders': 0,
+        'retries': 0,
+        'rss_mb': None,
+    }
+
+
+def _parse_ps(output: str) -> Dict[int, Tuple[int, int]]:
+    table = {}
+    for line in output.splitlines():
+        fields = line.split(None, 3)
+        if len(fields) < 4 or not all(field.isdigit() for field in fields[:3]):
+            continue
+        # Leave out the ps process itself, a short-lived child of ours
+        if os.path.basename(fields[3].strip()) != 'ps':
+            table[int(fields[0])] = (int(fields[1]), int(fields[2]))
+    return table
+
+
+def _process_table() -> Dict[int, Tuple[int, int]]:
+    """pid -> (parent pid, RSS in KiB) of every process; empty where ps is unavailable."""
+    try:
+        return _parse_ps(subprocess.run(PS_COMMAND, capture_output=True, text=True, timeout=10).stdout)
+    except (OSError, subprocess.TimeoutExpired):
+        return {}
+
+
+async def _process_table_async() -> Dict[int, Tuple[int, int]]:
+    """Async _process_table()."""
+    try:
+        return _parse_ps((await run_process(PS_COMMAND, 10)).stdout)
+    except (OSError, subprocess.TimeoutExpired):
+        return {}
+
+
+def _child_pids(table: Dict[int, Tuple[int, int]]) -> Set[int]:
+    """Direct child processes of this process, e.g. the Playwright driver once started."""
+    return {pid for pid, (ppid, _) in table.items() if ppid == os.getpid()}
+
+
+def _descendants(table: Dict[int, Tuple[int, int]], roots: Set[int]) -> List[int]:
+    children: Dict[int, List[int]] = {}
+    for pid, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    found: List[int] = []
+    stack = [pid for root in roots for pid in children.get(root, [])]
+    while stack:
+        pid = stack.pop()
+        found.append(pid)
+        stack.extend(children.get(pid, []))
+    return found
+
+
+def _tree_rss_mb(table: Dict[int, Tuple[int, int]], roots: Set[int]) -> Optional[float]:
+    """Total RSS of ``roots`` and their descendants in MiB, None if unknown."""
+    pids = [pid for pid in roots if pid in table] + _descendants(table, roots)
+    if not pids:
+        return None
+    return round(sum(table[pid][1] for pid in pids) / 1024, 1)
+
+
+def _kill_processes(pids: List[int]):
+    for pid in pids:
+        try:
+            os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+        except OSError:
+            pass
+
+
+# Playwright async objects and semaphores belong to one event loop
+_async_engines: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncRenderEngine]' = weakref.WeakKeyDictionary()
+_process_limits: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]' = weakref.WeakKeyDictionary()
+
+
+def get_async_engine() -> AsyncRenderEngine:
+    """Return the running event loop's shared async engine. Close it with close_async_engine()."""
+    loop = asyncio.get_running_loop()
+    engine = _async_engines.get(loop)
+    if engine is None:
+        engine = _async_engines[loop] = AsyncRenderEngine()
+    return engine
+
+
+async def close_async_engine():
+    """Close the running event loop's shared async engine, if it was started."""
+    engine = _async_engines.pop(asyncio.get_running_loop(), None)
+    if engine is not None:
+        await engine.close()
+
+
+def process_limit() -> asyncio.Semaphore:
+    """Default bound on concurrent run_process() calls in the running loop: one per CPU."""
+    loop = asyncio.get_running_loop()
+    limit = _process_limits.get(loop)
+    if limit is None:
+        limit = _process_limits[loop] = asyncio.Semaphore(os.cpu_count() or 4)
+    return limit
+
+
+async def run_process(
+    cmd: List[str],
+    timeout: float,
+    limit: Optional[asyncio.Semaphore] = None
+) -> subprocess.CompletedProcess:
+    """
+    Run a command without blocking the event loop.
+
+    Async counterpart of ``subprocess.run(cmd, capture_output=True, text=True,
+    timeout=timeout)``. The process is killed if it times out or the awaiting
+    task is cancelled, so no orphaned mmdc (and its Chromium) is left behind.
+
+    Args:
+        cmd: Command and arguments
+        timeout: Seconds before the process is killed
+        limit: Semaphore bounding concurrent processes (default: process_limit())
+
+    Returns:
+        CompletedProcess with decoded stdout and stderr
+
+    Raises:
+        subprocess.TimeoutExpired: If the process ran longer than ``timeout``
+        FileNotFoundError: If the command does not exist
+    """
+    async with limit or process_limit():
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            await _kill(process)
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        except BaseException:
+            await _kill(process)
+            raise
+
+    return subprocess.CompletedProcess(
+        cmd, process.returncode, stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace')
+    )
+
+
+async def _kill(process):
+    if process.returncode is None:
+        process.kill()
+        await process.wait()
+
+
+def kind_for_path(path: Path) -> str:
+    """Infer the diagram kind from a file extension."""
+    return 'excalidraw' if path.suffix == '.excalidraw' else 'mermaid'
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Render Mermaid or Excalidraw diagrams with the shared browser engine'
+    )
+    parser.add_argument('input', type=Path, help='Input .mmd or .excalidraw file')
+    parser.add_argument('output', type=Path, help='Output file (.png, .svg or .pdf)')
+    parser.add_argument('--kind', choices=RenderEngine.KINDS,
+                        help='Diagram kind (default: inferred from the input extension)')
+    parser.add_argument('--scale', '-s', type=int, help='Device scale factor')
+    parser.add_argument('--theme', '-t', default='default', help='Mermaid theme (default: default)')
+    parser.add_argument('--background', '-b', default='transparent',
+                        help='Mermaid background color (default: transparent)')
+    parser.add_argument('--width', '-w', type=int, help='Mermaid viewport width in pixels')
+    parser.add_argument('--raster', choices=RenderEngine.RASTERS, default='canvas',
+                        help='Excalidraw PNG path: canvas export or SVG screenshot (default: canvas)')
+    args = parser.parse_args()
+
+    if not args.input.exists():
+        print(f"ERROR: File not found: {args.input}", file=sys.stderr)
+        sys.exit(1)
+
+    options = {
+        'format': args.output.suffix.lstrip('.') or 'png',
+        'scale': args.scale,
+        'theme': args.theme,
+        'background': args.background,
+        'width': args.width,
+        'raster': args.raster,
+    }
+
+    try:
+        data = render(args.kind or kind_for_path(args.input), args.input, options)
+    except RenderError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_bytes(data)
+    print(json.dumps({"output": str(args.output), "bytes": len(data)}))
+
+
+if __name__ == '__main__':
+    main()
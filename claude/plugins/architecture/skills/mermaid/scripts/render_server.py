@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Localhost HTTP render service shared by every tool on a build host.
+
+The docs server, preview bot and CI often render the same diagrams at the
+same time. Pointing them at one service makes that work happen once:
+
+- Identical requests (same canonical source and render options) that
+  arrive while a render is in flight wait for that render instead of
+  starting another (singleflight, keyed by ArtifactWriter.render_key()).
+- Finished images are kept in a content-addressed disk cache, so repeats are
+  served without touching the browser, also across service restarts.
+- At most ``--max-queue`` distinct renders are pending; beyond that new work
+  is refused with 503 and Retry-After instead of piling up. Cached and
+  coalesced requests are still answered.
+
+Rendering uses the async shared browser (render_engine.AsyncRenderEngine) on
+one event loop; HTTP requests are handled by a threaded stdlib server bound
+to a loopback address only.
+
+Usage:
+    python render_server.py --port 8765
+
+    # Raw source, options in the query string
+    curl --data-binary @diagram.mmd 'http://127.0.0.1:8765/render?kind=mermaid&format=svg&theme=dark' -o out.svg
+    curl --data-binary @scene.excalidraw 'http://127.0.0.1:8765/render?kind=excalidraw&scale=2' -o out.png
+
+    # JSON body
+    curl -H 'Content-Type: application/json' \\
+         -d '{"kind": "mermaid", "source": "graph TD; A-->B", "options": {"format": "png"}}' \\
+         http://127.0.0.1:8765/render -o out.png
+
+    # From Python
+    from render_server import request_render
+    png = request_render('http://127.0.0.1:8765', 'mermaid', code, {'format': 'png'})
+
+Endpoints:
+    POST /render   Image bytes; X-Render-Cache is hit, coalesced or miss
+    GET  /health   {"ok": true}
+    GET  /stats    Request, cache, coalescing and queue counters
+
+Requirements:
+    - playwright (pip install playwright && playwright install chromium)
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import ipaddress
+import json
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from diagram_canonical import canonical_source
+import render_engine
+from resilient_diagram import ArtifactWriter
+
+
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'diagram-render-service'
+
+# Large enough for Excalidraw scenes with embedded images
+MAX_BODY_BYTES = 256 * 1024 * 1024
+
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml', 'pdf': 'application/pdf'}
+
+# Options accepted from clients, with their types; everything else is rejected
+OPTION_TYPES = {
+    'format': str,
+    'scale': int,
+    'theme': str,
+    'background': str,
+    'width': int,
+    'height': int,
+    'raster': str,
+    'config': dict,
+}
+
+LOOPBACK_NAMES = {'localhost', 'localhost.'}
+
+
+class QueueFull(Exception):
+    """Raised when the service already has ``max_queue`` distinct renders pending."""
+
+
+def is_loopback(host: str) -> bool:
+    """True for localhost and loopback IP addresses."""
+    host = host.strip('[]')
+    if host.lower() in LOOPBACK_NAMES:
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def normalize_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate client options and coerce query-string values to their types.
+
+    Raises:
+        ValueError: On an unknown option or a value of the wrong type
+    """
+    normalized = {}
+    for name, value in options.items():
+        expected = OPTION_TYPES.get(name)
+        if expected is None:
+            raise ValueError(f"Unknown option '{name}' (expected one of {', '.join(OPTION_TYPES)})")
+        try:
+            if expected is int:
+                value = int(value)
+            elif expected is dict and isinstance(value, str):
+                value = json.loads(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Option '{name}' must be {expected.__name__}")
+        if not isinstance(value, expected):
+            raise ValueError(f"Option '{name}' must be {expected.__name__}")
+        normalized[name] = value
+    normalized.setdefault('format', 'png')
+    return normalized
+
+
+class RenderService:
+    """Singleflight, cached, bounded rendering on top of one AsyncRenderEngine."""
+
+    def __init__(
+        self,
+        cache_dir: Path = DEFAULT_CACHE_DIR,
+        max_queue: int = 64,
+        max_concurrency: int = 4,
+        engine_options: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Args:
+            cache_dir: Directory for rendered images, addressed by render key
+            max_queue: Maximum distinct renders pending (running or waiting for a page)
+            max_concurrency: Renders running in the browser at once
+            engine_options: Extra AsyncRenderEngine arguments (max_page_renders, max_rss_mb, ...)
+        """
+        self.cache_dir = cache_dir
+        self.max_queue = max_queue
+        self.max_concurrency = max_concurrency
+        self.engine_options = engine_options or {}
+        self.writer = ArtifactWriter()
+        self._engine: Optional[render_engine.AsyncRenderEngine] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            'requests': 0, 'cache_hits': 0, 'coalesced': 0, 'rendered': 0, 'rejected': 0, 'errors': 0,
+        }
+
+    @staticmethod
+    def key(kind: str, source: str, options: Dict[str, Any]) -> str:
+        """Render key of a request: canonical source plus every option that affects the output."""
+        return ArtifactWriter.render_key(canonical_source(kind, source).encode('utf-8'), kind=kind, **options)
+
+    def cache_path(self, key: str, output_format: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.{output_format}"
+
+    async def render(self, kind: str, source: str, options: Dict[str, Any]) -> Tuple[bytes, str, str]:
+        """
+        Render a diagram, reusing cached and in-flight results.
+
+        Args:
+            kind: 'mermaid' or 'excalidraw'
+            source: Mermaid code or Excalidraw scene JSON
+            options: Normalized render options (see normalize_options())
+
+        Returns:
+            Tuple of (image bytes, 'hit' | 'coalesced' | 'miss', render key)
+
+        Raises:
+            QueueFull: If the render would exceed the pending limit
+            render_engine.RenderError: If the diagram cannot be rendered
+        """
+        self.stats['requests'] += 1
+        key = self.key(kind, source, options)
+        cache_path = self.cache_path(key, options['format'])
+
+        try:
+            data = cache_path.read_bytes()
+            self.stats['cache_hits'] += 1
+            return data, 'hit', key
+        except OSError:
+            pass
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(task), 'coalesced', key
+
+        if len(self._inflight) >= self.max_queue:
+            self.stats['rejected'] += 1
+            raise QueueFull(f"{len(self._inflight)} renders pending")
+
+        # The render runs as its own task, so a caller that goes away does
+        # not cancel it for the others waiting on the same key
+        task = asyncio.ensure_future(self._render(kind, source, options, cache_path))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task), 'miss', key
+
+    async def _render(self, kind: str, source: str, options: Dict[str, Any], cache_path: Path) -> bytes:
+        if self._engine is None:
+            self._engine = render_engine.AsyncRenderEngine(max_concurrency=self.max_concurrency, **self.engine_options)
+        try:
+            data = await self._engine.render(kind, source, options)
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+        self.stats['rendered'] += 1
+
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.writer.write_bytes(cache_path, data)
+        return data
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'pending': len(self._inflight),
+            'max_queue': self.max_queue,
+            'engine': dict(self._engine.stats) if self._engine else None,
+        }
+
+    async def close(self):
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self._engine is not None:
+            await self._engine.close()
+            self._engine = None
+
+
+class RenderServer(ThreadingHTTPServer):
+    """Threaded HTTP front end; renders run on the service's event loop thread."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: RenderService, timeout: float = 120):
+        if not is_loopback(address[0]):
+            raise ValueError(f"Refusing to listen on non-loopback address {address[0]}")
+        super().__init__(address, RenderHandler)
+        self.service = service
+        self.timeout_s = timeout
+        self.verbose = False
+        self.loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self.loop.run_forever, name='render-loop', daemon=True)
+        self._loop_thread.start()
+
+    def run(self, coroutine):
+        """Run a coroutine on the event loop thread and wait for its result."""
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            return future.result(self.timeout_s)
+        except concurrent.futures.TimeoutError:
+            # Stops this request waiting; a shared render keeps going for the others
+            future.cancel()
+            raise
+
+    def server_close(self):
+        super().server_close()
+        self.run(self.service.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._loop_thread.join()
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    server: RenderServer
+
+    def do_GET(self):
+        if not self._allowed():
+            return
+        path = urlsplit(self.path).path
+        if path == '/health':
+            self._send_json(200, {'ok': True})
+        elif path == '/stats':
+            self._send_json(200, self.server.run(self._snapshot()))
+        else:
+            self._send_json(404, {'error': f"Not found: {path}"})
+
+    def do_POST(self):
+        if not self._allowed():
+            return
+        url = urlsplit(self.path)
+        if url.path != '/render':
+            self._send_json(404, {'error': f"Not found: {url.path}"})
+            return
+
+        try:
+            kind, source, options = self._parse_render_request(url.query)
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+
+        try:
+            data, cache, key = self.server.run(self.server.service.render(kind, source, options))
+        except QueueFull as e:
+            self._send_json(503, {'error': f"Render queue full: {e}"}, {'Retry-After': '1'})
+            return
+        except render_engine.RenderError as e:
+            self._send_json(422, {'error': str(e)})
+            return
+        except concurrent.futures.TimeoutError:
+            self._send_json(504, {'error': "Render timed out"})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES[options['format']])
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('X-Render-Cache', cache)
+        self.send_header('X-Render-Key', key)
+        self.end_headers()
+        self.wfile.write(data)
+
+    async def _snapshot(self) -> Dict[str, Any]:
+        return self.server.service.snapshot()
+
+    def _allowed(self) -> bool:
+        # Loopback clients only, and a loopback Host header so a web page
+        # cannot reach the service through DNS rebinding
+        host = self.headers.get('Host', '')
+        hostname = urlsplit(f"//{host}").hostname or ''
+        if is_loopback(self.client_address[0]) and is_loopback(hostname):
+            return True
+        self._send_json(403, {'error': "The render service only accepts localhost requests"})
+        return False
+
+    def _parse_render_request(self, query: str) -> Tuple[str, str, Dict[str, Any]]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length < 0:
+            raise ValueError("Content-Length must not be negative")
+        if length > MAX_BODY_BYTES:
+            raise ValueError(f"Request body larger than {MAX_BODY_BYTES} bytes")
+        body = self.rfile.read(length)
+
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            request = json.loads(body)
+            if not isinstance(request, dict):
+                raise ValueError("JSON body must be an object")
+            kind = request.get('kind', 'mermaid')
+            source = request.get('source')
+            options = request.get('options') or {}
+            if not isinstance(options, dict):
+                raise ValueError("'options' must be an object")
+            if isinstance(source, dict):
+                source = json.dumps(source)
+        else:
+            options = dict(parse_qsl(query))
+            kind = options.pop('kind', 'mermaid')
+            source = body.decode('utf-8')
+
+        if kind not in render_engine.RenderEngine.KINDS:
+            raise ValueError(f"Unknown diagram kind '{kind}'")
+        if not isinstance(source, str) or not source.strip():
+            raise ValueError("Empty diagram source")
+        options = normalize_options(options)
+        if options['format'] not in CONTENT_TYPES:
+            raise ValueError(f"Unknown format '{options['format']}'")
+        return kind, source, options
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def request_render(
+    url: str,
+    kind: str,
+    source: str,
+    options: Optional[Dict[str, Any]] = None,
+    timeout: float = 120
+) -> bytes:
+    """
+    Render through a running service.
+
+    Args:
+        url: Service base URL, e.g. http://127.0.0.1:8765
+        kind: 'mermaid' or 'excalidraw'
+        source: Mermaid code or Excalidraw scene JSON
+        options: Render options (format, scale, theme, ...)
+        timeout: Seconds to wait for the response
+
+    Returns:
+        Image bytes
+
+    Raises:
+        render_engine.RenderError: If the service rejects or fails the render
+    """
+    query = urlencode({'kind': kind, **{k: v for k, v in (options or {}).items() if k != 'config'}})
+    if options and 'config' in options:
+        query += '&' + urlencode({'config': json.dumps(options['config'])})
+    request = urllib.request.Request(f"{url.rstrip('/')}/render?{query}", data=source.encode('utf-8'))
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read()
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get('error')
+        except ValueError:
+            message = None
+        raise render_engine.RenderError(f"HTTP {e.code}: {message or e.reason}")
+    except urllib.error.URLError as e:
+        raise render_engine.RenderError(f"Render service unavailable: {e.reason}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Localhost HTTP service rendering Mermaid and Excalidraw with one shared browser',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Start the service
+  python render_server.py --port 8765
+
+  # Render through it
+  curl --data-binary @diagram.mmd 'http://127.0.0.1:8765/render?kind=mermaid&format=svg' -o diagram.svg
+  curl http://127.0.0.1:8765/stats
+        """
+    )
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Loopback address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', '-p', type=int, default=DEFAULT_PORT, help=f'Port (default: {DEFAULT_PORT})')
+    parser.add_argument('--cache-dir', type=Path, default=DEFAULT_CACHE_DIR,
+                        help=f'Rendered image cache (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--max-queue', type=int, default=64,
+                        help='Distinct renders pending before new work gets 503 (default: 64)')
+    parser.add_argument('--concurrency', '-j', type=int, default=4,
+                        help='Renders running in the browser at once (default: 4)')
+    parser.add_argument('--timeout', type=float, default=120, help='Seconds per request (default: 120)')
+    parser.add_argument('--render-timeout', type=float, default=30,
+                        help='Seconds before a render is considered hung and retried on a new page (default: 30)')
+    parser.add_argument('--max-page-renders', type=int, default=200,
+                        help='Replace a browser page after this many renders (default: 200)')
+    parser.add_argument('--max-rss-mb', type=int, default=2048,
+                        help='Recycle pages, then the browser, above this much memory (default: 2048, 0: no cap)')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    service = RenderService(
+        args.cache_dir,
+        max_queue=args.max_queue,
+        max_concurrency=args.concurrency,
+        engine_options={
+            'timeout_ms': int(args.render_timeout * 1000),
+            'max_page_renders': args.max_page_renders,
+            'max_rss_mb': args.max_rss_mb or None,
+        }
+    )
+    try:
+        server = RenderServer((args.host, args.port), service, timeout=args.timeout)
+    except (ValueError, OSError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    server.verbose = args.verbose
+
+    print(f"Serving diagram renders on http://{args.host}:{server.server_address[1]} (cache: {args.cache_dir})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,8 @@ The script enables resilient diagram generation by:
 - Automatically detecting diagram types
 - Following consistent file naming: <markdown>_<num>_<type>_<title>.<ext>
 - Parsing troubleshooting.md to find error fixes
+- Remembering, per normalized error signature and diagram type, which
+  guide entries matched and which fixes led to a successful re-render
 - Generating search queries for external tools when no local fix exists
 
 Usage:
@@ -27,22 +29,48 @@ Usage:
     cat diagram.mmd | python resilient_diagram.py --stdin \\
         --markdown-file doc --diagram-num 2 --title "flow" --json
 
+    # Apply rule-based fixes and retry on failure
+    python resilient_diagram.py --code "flowchart TD; start --> end" --auto-repair
+
+    # Render in the shared headless browser instead of spawning mmdc
+    python resilient_diagram.py --mmd-file diagram.mmd --engine browser
+
 Requirements:
     - mermaid-cli (npm install -g @mermaid-js/mermaid-cli)
+      or, for --engine browser, playwright (see render_engine.py)
     - Python 3.7+ (stdlib only, no external dependencies)
 """
 
 import argparse
+import asyncio
+import contextlib
+import contextvars
+import difflib
+import hashlib
 import json
 import os
 import re
 import subprocess
 import sys
 import tempfile
+import time
 from dataclasses import dataclass, asdict, field
 from enum import Enum
 from pathlib import Path
-from typing import Optional, List, Dict, Tuple, Any
+from typing import Callable, Optional, List, Dict, Tuple, Any
+
+from diagram_canonical import canonical_mermaid
+from diagram_trace import tracer, add_profile_arguments, configure_profiling
+import render_engine
+
+try:
+    import fcntl
+except ImportError:  # Windows: manifest updates are not locked
+    fcntl = None
+
+
+# Error signature -> troubleshooting matches and fix outcomes (see FixCache)
+DEFAULT_FIX_CACHE = Path.home() / '.cache' / 'mermaid-fix-cache.json'
 
 
 class DiagramType(Enum):
@@ -60,6 +88,16 @@ class DiagramType(Enum):
     REQUIREMENT = "requirement"
     JOURNEY = "journey"
     C4 = "c4"
+    GITGRAPH = "gitgraph"
+    SANKEY = "sankey"
+    XYCHART = "xychart"
+    BLOCK = "block"
+    PACKET = "packet"
+    KANBAN = "kanban"
+    ARCHITECTURE = "architecture"
+    RADAR = "radar"
+    TREEMAP = "treemap"
+    ZENUML = "zenuml"
     UNKNOWN = "unknown"
 
 
@@ -97,6 +135,13 @@ class DiagramResult:
     troubleshooting_matches: List[Dict] = field(default_factory=list)
     suggested_fix: Optional[str] = None
     search_recommendation: Optional[str] = None
+    repair_attempts: int = 0
+    applied_fixes: List[Dict] = field(default_factory=list)
+    repair_diff: Optional[str] = None
+    artifacts_written: int = 0
+    artifacts_skipped: int = 0
+    error_signature: Optional[str] = None
+    known_error: bool = False
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -107,7 +152,14 @@ class DiagramResult:
             "error_message": self.error_message,
             "troubleshooting_matches": self.troubleshooting_matches,
             "suggested_fix": self.suggested_fix,
-            "search_recommendation": self.search_recommendation
+            "search_recommendation": self.search_recommendation,
+            "repair_attempts": self.repair_attempts,
+            "applied_fixes": self.applied_fixes,
+            "repair_diff": self.repair_diff,
+            "artifacts_written": self.artifacts_written,
+            "artifacts_skipped": self.artifacts_skipped,
+            "error_signature": self.error_signature,
+            "known_error": self.known_error
         }
 
 
@@ -131,7 +183,8 @@ class TroubleshootingParser:
         self.path = troubleshooting_path
         self.entries: List[TroubleshootingMatch] = []
         if self.path and self.path.exists():
-            self._parse()
+            with tracer.span("guide_parse"):
+                self._parse()
 
     def _parse(self):
         """Parse the troubleshooting.md file."""
@@ -257,6 +310,520 @@ class TroubleshootingParser:
         return [entry for _, entry in matches[:5]]  # Return top 5 matches
 
 
+# Noise in mmdc output that differs between occurrences of the same error
+SIGNATURE_DROP_LINES = re.compile(
+    r'^\s*(?:\.\.\.|-*\^|at\s|mermaid version\b)|\(file://|\.m?js:\d+', re.IGNORECASE
+)
+SIGNATURE_PATH = re.compile(r'(?:file://)?(?:[A-Za-z]:\\|/)[^\s:\'"()]+')
+SIGNATURE_QUOTED = re.compile(r"'([^'\n]*)'|\"([^\"\n]*)\"")
+SIGNATURE_PARENTHESIZED = re.compile(r'\(([A-Za-z_][\w-]*)\)')
+SIGNATURE_NUMBER = re.compile(r'\d+(?:\.\d+)*')
+SIGNATURE_TOKEN = re.compile(r'[A-Z][A-Z0-9_]*')
+
+
+def error_signature(error_message: str) -> str:
+    """
+    Normalize mmdc stderr to a stable signature of the error.
+
+    The same mistake produces different messages depending on where it is
+    and what the nodes are called. Source excerpts and caret lines, stack
+    frames, paths, line and column numbers and quoted identifiers are
+    removed; grammar token names (AMP, NEWLINE, ...) and reserved words
+    (end, default, ...) are kept, since they tell errors apart.
+
+    Args:
+        error_message: Error output from mmdc or the browser engine
+
+    Returns:
+        Signature text, at most three lines; empty only for empty error output
+    """
+    reserved = {word.lower() for word in DiagramRepairer.RESERVED_IDS}
+
+    def quoted(match) -> str:
+        text = match.group(1) if match.group(1) is not None else match.group(2)
+        if SIGNATURE_TOKEN.fullmatch(text) or text.lower() in reserved:
+            return f"'{text}'"
+        return "'ID'"
+
+    lines = []
+    raw_lines = [line for line in re.sub(r'\x1b\[[0-9;]*m', '', error_message).splitlines() if line.strip()]
+    for line in raw_lines:
+        if SIGNATURE_DROP_LINES.search(line):
+            continue
+        line = SIGNATURE_PATH.sub('PATH', line)
+        line = SIGNATURE_QUOTED.sub(quoted, line)
+        line = SIGNATURE_PARENTHESIZED.sub('(ID)', line)
+        line = SIGNATURE_NUMBER.sub('N', line)
+        line = re.sub(r'^Error:\s*', '', re.sub(r'\s+', ' ', line).strip())
+        if line and line not in lines:
+            lines.append(line)
+        if len(lines) == 3:
+            break
+    if not lines and raw_lines:
+        # Nothing but a stack trace: its first line still tells errors apart
+        line = SIGNATURE_NUMBER.sub('N', SIGNATURE_PATH.sub('PATH', raw_lines[0]))
+        lines.append(re.sub(r'\s+', ' ', line).strip())
+    return '\n'.join(lines)
+
+
+class FixCache:
+    """
+    Persistent memo of troubleshooting results per error signature and diagram type.
+
+    For each (signature, DiagramType) it keeps the troubleshooting guide
+    entries the error matched and, per entry, how often its repair rules
+    were followed by a successful re-render. A known error skips the guide
+    search, and the fixes that worked before are tried and suggested first.
+    Matches are only reused while troubleshooting.md is unchanged.
+    """
+
+    VERSION = 1
+    # Entries kept on save; the most recently updated win
+    MAX_ENTRIES = 2000
+
+    def __init__(self, path: Optional[Path] = DEFAULT_FIX_CACHE):
+        """
+        Args:
+            path: JSON cache file; None keeps the cache in memory only
+        """
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.writer = ArtifactWriter()
+        self._dirty = False
+        if path is not None:
+            try:
+                data = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                data = {}
+            if isinstance(data, dict) and data.get('version') == self.VERSION \
+                    and isinstance(data.get('entries'), dict):
+                self.entries = data['entries']
+
+    @staticmethod
+    def key(signature: str, diagram_type: DiagramType) -> str:
+        return f"{diagram_type.value}:{hashlib.sha256(signature.encode('utf-8')).hexdigest()[:16]}"
+
+    def _entry(self, signature: str, diagram_type: DiagramType) -> Dict[str, Any]:
+        entry = self.entries.setdefault(self.key(signature, diagram_type), {
+            "signature": signature,
+            "diagram_type": diagram_type.value,
+            "seen": 0,
+            "guide": None,
+            "matches": [],
+            "fixes": {},
+        })
+        entry["updated"] = int(time.time())
+        self._dirty = True
+        return entry
+
+    def seen(self, signature: str, diagram_type: DiagramType) -> int:
+        """How often this error was seen before."""
+        entry = self.entries.get(self.key(signature, diagram_type))
+        return entry["seen"] if entry else 0
+
+    def matches(self, signature: str, diagram_type: DiagramType, guide: Optional[str]) -> Optional[List[int]]:
+        """Cached troubleshooting error numbers for this error, None if unknown or the guide changed."""
+        entry = self.entries.get(self.key(signature, diagram_type))
+        if entry is None or entry["guide"] != guide:
+            return None
+        return list(entry["matches"])
+
+    def store(self, signature: str, diagram_type: DiagramType, guide: Optional[str], numbers: List[int]):
+        """Remember the troubleshooting matches of an error."""
+        entry = self._entry(signature, diagram_type)
+        entry["guide"] = guide
+        entry["matches"] = list(numbers)
+
+    def hit(self, signature: str, diagram_type: DiagramType):
+        """Count an occurrence of this error."""
+        self._entry(signature, diagram_type)["seen"] += 1
+
+    def rank(self, signature: str, diagram_type: DiagramType, numbers: List[int]) -> List[int]:
+        """
+        Order troubleshooting error numbers by how well their fixes worked for this error.
+
+        Entries whose fixes succeeded before come first, even if the guide
+        search did not match them; untried entries keep their search rank
+        ahead of ones that only failed.
+        """
+        entry = self.entries.get(self.key(signature, diagram_type))
+        fixes = entry["fixes"] if entry else {}
+        learned = [int(n) for n, stats in fixes.items() if stats["fixed"] and int(n) not in numbers]
+
+        def success_rate(number: int) -> float:
+            stats = fixes.get(str(number))
+            if not stats:
+                return 0.5
+            # Laplace-smoothed, so one lucky fix does not outrank a reliable one
+            return (stats["fixed"] + 1) / (stats["fixed"] + stats["failed"] + 2)
+
+        return sorted(numbers + learned, key=lambda number: -success_rate(number))
+
+    def record(self, signature: str, diagram_type: DiagramType, numbers: List[int], fixed: bool):
+        """Record whether applying the fixes for ``numbers`` made the diagram render."""
+        entry = self._entry(signature, diagram_type)
+        for number in numbers:
+            stats = entry["fixes"].setdefault(str(number), {"fixed": 0, "failed": 0})
+            stats["fixed" if fixed else "failed"] += 1
+
+    def save(self):
+        """
+        Write the cache if it changed, keeping the most recent MAX_ENTRIES
+        (atomically; concurrent runs keep the last write).
+        """
+        if self.path is None or not self._dirty:
+            return
+        if len(self.entries) > self.MAX_ENTRIES:
+            newest = sorted(self.entries.items(), key=lambda item: item[1].get("updated", 0), reverse=True)
+            self.entries = dict(newest[:self.MAX_ENTRIES])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.writer.write_text(self.path, json.dumps({"version": self.VERSION, "entries": self.entries},
+                                                     indent=1, sort_keys=True) + '\n')
+        self._dirty = False
+
+
+@dataclass
+class RepairRule:
+    """A rule-based rewrite for one troubleshooting guide entry."""
+    error_numbers: List[int]
+    title: str
+    diagram_types: List[DiagramType]
+    apply: Callable[[str], str]
+
+    def applies_to(self, diagram_type: DiagramType) -> bool:
+        return not self.diagram_types or diagram_type in self.diagram_types
+
+
+class DiagramRepairer:
+    """
+    Apply rule-based fixes derived from troubleshooting.md entries.
+
+    Each rule is keyed by the guide's error number, so troubleshooting
+    matches for a render failure select which rewrites to try first.
+    """
+
+    RESERVED_IDS = ['end', 'default', 'style', 'class', 'click', 'call', 'graph', 'subgraph',
+                    'interpolate', 'classDef', 'linkStyle']
+
+    # Label spans that identifier rewrites must not touch
+    LABEL_SPAN = re.compile(r'"[^"]*"|\|[^|]*\||\[[^\]]*\]|\([^)]*\)|\{[^}]*\}')
+
+    FLOWCHART_HEADER = re.compile(r'^(\s*(?:flowchart|graph)\s+(?:TB|TD|BT|RL|LR))\s+([^;\s].*)$',
+                                  re.IGNORECASE)
+    FLOWCHART_EDGE = re.compile(r'--|==|-\.|\s-\s|->')
+    # A statement keyword followed by an edge or a shape is a (reserved) node id, not a statement
+    FLOWCHART_STATEMENT = re.compile(
+        r'^\s*(?:end\s*;?\s*$|%%|(?:subgraph|classDef|class|style|linkStyle|click|direction)\b'
+        r'(?![ \t]*(?:--|==|-\.|->|&|[\[({])))'
+    )
+    # Statements whose first argument lists node ids
+    FLOWCHART_NODE_REFERENCE = re.compile(r'^(\s*(?:class|style|click)[ \t]+)([\w,-]+)')
+    SQUARE_LABEL = re.compile(r'(\b[\w-]+)\[(?![\["(/\\])([^\[\]]*)\]')
+    SPECIAL_LABEL_CHARS = re.compile(r'["():;,#%@\\]')
+    CLASSDEF_BLOCK = re.compile(r'^(\s*classDef\s+[\w,-]+)\s*\{(.*?)\}', re.MULTILINE | re.DOTALL)
+    CLASSDEF_LINE = re.compile(r'^(\s*classDef\s+[\w,-]+\s+)(.*;.*)$', re.MULTILINE)
+    SEQUENCE_MESSAGE = re.compile(r'^(\s*[\w-]+\s*(?:-->>|->>|-->|->|--x|-x|--\)|-\))\s*[+-]?[\w-]+)\s+([^:\s].*)$')
+    SEQUENCE_BLOCK = re.compile(r'^\s*(?:alt|opt|loop|par|rect|break|critical)\b')
+
+    def __init__(self):
+        flowchart = [DiagramType.FLOWCHART]
+        sequence = [DiagramType.SEQUENCE]
+        self.rules: List[RepairRule] = [
+            RepairRule([4], "Empty Comments", [], self._drop_empty_comments),
+            RepairRule([9], "Diagram Direction on Same Line as Nodes", flowchart, self._split_header),
+            RepairRule([3], "Invalid classDef Syntax", [DiagramType.FLOWCHART, DiagramType.STATE],
+                       self._fix_classdef),
+            RepairRule([7], "Incorrect Arrow/Link Syntax", flowchart, self._normalize_arrows),
+            RepairRule([2], "Unescaped Special Characters", flowchart, self._quote_labels),
+            RepairRule([1, 5], "Reserved Words as Identifiers", flowchart, self._rename_reserved_ids),
+            RepairRule([12], "Missing Space in Participant Declaration", sequence, self._space_participants),
+            RepairRule([11], "Missing Colon Before Message Text", sequence, self._add_message_colons),
+            RepairRule([13], "Missing \"end\" in alt/opt/loop Blocks", sequence, self._close_blocks),
+        ]
+
+    def repair(
+        self,
+        mermaid_code: str,
+        diagram_type: DiagramType,
+        preferred: Optional[List[int]] = None
+    ) -> Tuple[str, List[RepairRule]]:
+        """
+        Apply applicable rules to the diagram.
+
+        Rules whose error numbers appear in ``preferred`` (the troubleshooting
+        matches for the current failure) are tried first; the remaining rules
+        only run when none of the preferred ones changed anything.
+
+        Args:
+            mermaid_code: Mermaid diagram code
+            diagram_type: Detected diagram type
+            preferred: Troubleshooting error numbers ranked by relevance
+
+        Returns:
+            Tuple of (repaired_code, rules_that_changed_it)
+        """
+        applicable = [rule for rule in self.rules if rule.applies_to(diagram_type)]
+        preferred = preferred or []
+        first = [rule for rule in applicable if set(rule.error_numbers) & set(preferred)]
+        first.sort(key=lambda rule: min(preferred.index(n) for n in rule.error_numbers if n in preferred))
+        rest = [rule for rule in applicable if rule not in first]
+
+        for group in (first, rest):
+            code = mermaid_code
+            applied = []
+            for rule in group:
+                rewritten = rule.apply(code)
+                if rewritten != code:
+                    applied.append(rule)
+                    code = rewritten
+            if applied:
+                return code, applied
+
+        return mermaid_code, []
+
+    @classmethod
+    def _outside_labels(cls, line: str, rewrite: Callable[[str], str]) -> str:
+        """Apply ``rewrite`` to the parts of a line that are not label text."""
+        parts = []
+        pos = 0
+        for match in cls.LABEL_SPAN.finditer(line):
+            parts.append(rewrite(line[pos:match.start()]))
+            parts.append(match.group(0))
+            pos = match.end()
+        parts.append(rewrite(line[pos:]))
+        return ''.join(parts)
+
+    @staticmethod
+    def _drop_empty_comments(code: str) -> str:
+        return re.sub(r'^[ \t]*%%[ \t]*\n', '', code, flags=re.MULTILINE)
+
+    def _split_header(self, code: str) -> str:
+        lines = code.split('\n')
+        for i, line in enumerate(lines):
+            match = self.FLOWCHART_HEADER.match(line)
+            if match:
+                lines[i] = f"{match.group(1)}\n    {match.group(2)}"
+                break
+        return '\n'.join(lines)
+
+    def _fix_classdef(self, code: str) -> str:
+        def props(text: str) -> str:
+            items = [p.strip().replace(': ', ':') for p in re.split(r'[;\n]', text)]
+            return ','.join(p for p in items if p)
+
+        code = self.CLASSDEF_BLOCK.sub(lambda m: f"{m.group(1)} {props(m.group(2))}", code)
+        return self.CLASSDEF_LINE.sub(lambda m: m.group(1) + props(m.group(2)), code)
+
+    def _normalize_arrows(self, code: str) -> str:
+        def rewrite(segment: str) -> str:
+            segment = re.sub(r'(?<![-.=<])\.->', '-.->', segment)
+            segment = re.sub(r'(?<![-.=<])->(?!>)', '-->', segment)
+            return re.sub(r'(?<=\s)-(?=\s)', '-->', segment)
+
+        return '\n'.join(
+            line if self.FLOWCHART_STATEMENT.match(line) else self._outside_labels(line, rewrite)
+            for line in code.split('\n')
+        )
+
+    def _quote_labels(self, code: str) -> str:
+        def quote(match):
+            label = match.group(2)
+            if not self.SPECIAL_LABEL_CHARS.search(label):
+                return match.group(0)
+            return f'{match.group(1)}["{label.replace(chr(34), "#quot;")}"]'
+
+        return self.SQUARE_LABEL.sub(quote, code)
+
+    def _rename_reserved_ids(self, code: str) -> str:
+        reserved = re.compile(r'(?<![\w"#-])(' + '|'.join(self.RESERVED_IDS) + r')(?![\w"-])')
+        labelled = set()
+
+        def rewrite(segment: str) -> str:
+            def rename(match):
+                word = match.group(1)
+                new_id = f"{word}_node"
+                # Keep the visible text on first use when the node has no label. Lines
+                # end in '\n' here, so a segment ending at the match is cut at a shape
+                rest = segment[match.end():]
+                if word not in labelled and rest and not rest.startswith(('[', '(', '{')):
+                    labelled.add(word)
+                    return f'{new_id}["{word}"]'
+                labelled.add(word)
+                return new_id
+            return reserved.sub(rename, segment)
+
+        lines = code.split('\n')
+        for i, line in enumerate(lines):
+            if self.FLOWCHART_STATEMENT.match(line):
+                continue
+            if self.FLOWCHART_EDGE.search(line) or reserved.match(line.lstrip()):
+                lines[i] = self._outside_labels(line + '\n', rewrite)[:-1]
+
+        # Point class, style and click statements at the renamed nodes
+        def rename_references(match) -> str:
+            ids = [f"{node}_node" if node in labelled else node for node in match.group(2).split(',')]
+            return match.group(1) + ','.join(ids)
+
+        if labelled:
+            lines = [self.FLOWCHART_NODE_REFERENCE.sub(rename_references, line) for line in lines]
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _space_participants(code: str) -> str:
+        return re.sub(r'^(\s*)(participant|actor)(?=[A-Za-z0-9_])', r'\1\2 ', code, flags=re.MULTILINE)
+
+    def _add_message_colons(self, code: str) -> str:
+        return '\n'.join(
+            self.SEQUENCE_MESSAGE.sub(r'\1: \2', line) for line in code.split('\n')
+        )
+
+    def _close_blocks(self, code: str) -> str:
+        lines = code.rstrip('\n').split('\n')
+        depth = 0
+        for line in lines:
+            if self.SEQUENCE_BLOCK.match(line):
+                depth += 1
+            elif line.strip() == 'end':
+                depth = max(0, depth - 1)
+        return '\n'.join(lines + ['    end'] * depth) + ('\n' if code.endswith('\n') else '')
+
+
+class ArtifactWriter:
+    """
+    Write generated artifacts atomically, skipping unchanged content.
+
+    Files are only replaced when their content hash differs from what is on
+    disk, and always via a temp file in the same directory plus ``os.replace``
+    so readers never observe a partial file. Rendered images are stamped in a
+    per-directory manifest with the hash of their source and render options,
+    so an up-to-date image can be reused without rendering again.
+    """
+
+    MANIFEST_NAME = ".render-manifest.json"
+
+    def __init__(self):
+        self.written = 0
+        self.skipped = 0
+
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @classmethod
+    def file_hash(cls, path: Path) -> Optional[str]:
+        try:
+            return cls.content_hash(path.read_bytes())
+        except OSError:
+            return None
+
+    @staticmethod
+    def temp_path(path: Path) -> Path:
+        """Empty temp file next to ``path`` for an atomic replace."""
+        fd, name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}.", suffix=path.suffix)
+        os.close(fd)
+        # mkstemp creates 0600 files; give them the usual umask-derived mode
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(name, 0o666 & ~umask)
+        return Path(name)
+
+    def write_bytes(self, path: Path, data: bytes) -> bool:
+        """
+        Atomically write ``data`` to ``path`` unless it is already identical.
+
+        Returns:
+            True if the file was written, False if it was skipped
+        """
+        if self.file_hash(path) == self.content_hash(data):
+            self.skipped += 1
+            return False
+
+        temp_path = self.temp_path(path)
+        try:
+            temp_path.write_bytes(data)
+            os.replace(temp_path, path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+        self.written += 1
+        return True
+
+    def write_text(self, path: Path, text: str) -> bool:
+        return self.write_bytes(path, text.encode('utf-8'))
+
+    def commit(self, temp_path: Path, path: Path) -> bool:
+        """
+        Move a freshly produced temp file into place unless it is unchanged.
+
+        Returns:
+            True if ``path`` was replaced, False if the existing file was kept
+        """
+        if self.file_hash(path) == self.file_hash(temp_path):
+            temp_path.unlink()
+            self.skipped += 1
+            return False
+
+        os.replace(temp_path, path)
+        self.written += 1
+        return True
+
+    @staticmethod
+    def render_key(source: bytes, **options: Any) -> str:
+        """Hash of the diagram source plus every option that affects the output."""
+        payload = json.dumps(options, sort_keys=True).encode('utf-8') + b'\0' + source
+        return hashlib.sha256(payload).hexdigest()
+
+    def is_up_to_date(self, image_path: Path, key: str) -> bool:
+        """True if ``image_path`` exists, is non-empty and was rendered from ``key``."""
+        if not image_path.exists() or image_path.stat().st_size == 0:
+            return False
+        return self._load_manifest(image_path.parent).get(image_path.name) == key
+
+    def record(self, image_path: Path, key: str):
+        """
+        Stamp ``image_path`` as rendered from ``key``.
+
+        The manifest is read, updated and replaced under an exclusive lock on
+        its directory, so parallel renders into one directory keep each
+        other's entries.
+        """
+        manifest_path = image_path.parent / self.MANIFEST_NAME
+        with self._manifest_lock(image_path.parent):
+            manifest = self._load_manifest(image_path.parent)
+            if manifest.get(image_path.name) == key:
+                return
+            manifest[image_path.name] = key
+            temp_path = self.temp_path(manifest_path)
+            try:
+                temp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+                os.replace(temp_path, manifest_path)
+            finally:
+                if temp_path.exists():
+                    temp_path.unlink()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _manifest_lock(directory: Path):
+        """Hold an exclusive flock on ``directory`` (no lock file to clean up)."""
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+
+    def _load_manifest(self, directory: Path) -> Dict[str, str]:
+        try:
+            return json.loads((directory / self.MANIFEST_NAME).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+
 class ResilientDiagramGenerator:
     """
     Generate Mermaid diagrams with resilient error recovery.
@@ -270,35 +837,81 @@ class ResilientDiagramGenerator:
     6. Return structured result with recovery info
     """
 
-    # Patterns to detect diagram type from first line
+    # Keyword patterns for the first significant line of each diagram type
     DIAGRAM_TYPE_PATTERNS = {
-        DiagramType.FLOWCHART: [
-            r'^flowchart\s+(TB|TD|BT|RL|LR)',
-            r'^graph\s+(TB|TD|BT|RL|LR)',
-        ],
-        DiagramType.SEQUENCE: [r'^sequenceDiagram'],
-        DiagramType.CLASS: [r'^classDiagram'],
-        DiagramType.STATE: [r'^stateDiagram(-v2)?'],
-        DiagramType.ER: [r'^erDiagram'],
-        DiagramType.GANTT: [r'^gantt'],
-        DiagramType.PIE: [r'^pie'],
-        DiagramType.MINDMAP: [r'^mindmap'],
-        DiagramType.TIMELINE: [r'^timeline'],
-        DiagramType.QUADRANT: [r'^quadrantChart'],
-        DiagramType.REQUIREMENT: [r'^requirementDiagram'],
-        DiagramType.JOURNEY: [r'^journey'],
-        DiagramType.C4: [r'^C4Context', r'^C4Container', r'^C4Component', r'^C4Deployment'],
+        DiagramType.FLOWCHART: [r'flowchart(?:-elk)?\b', r'graph\b'],
+        DiagramType.SEQUENCE: [r'sequenceDiagram\b'],
+        DiagramType.CLASS: [r'classDiagram(?:-v2)?\b'],
+        DiagramType.STATE: [r'stateDiagram(?:-v2)?\b'],
+        DiagramType.ER: [r'erDiagram\b'],
+        DiagramType.GANTT: [r'gantt\b'],
+        DiagramType.PIE: [r'pie\b'],
+        DiagramType.MINDMAP: [r'mindmap\b'],
+        DiagramType.TIMELINE: [r'timeline\b'],
+        DiagramType.QUADRANT: [r'quadrantChart\b'],
+        DiagramType.REQUIREMENT: [r'requirementDiagram\b'],
+        DiagramType.JOURNEY: [r'journey\b'],
+        DiagramType.C4: [r'C4(?:Context|Container|Component|Dynamic|Deployment)\b'],
+        DiagramType.GITGRAPH: [r'gitGraph\b'],
+        DiagramType.SANKEY: [r'sankey(?:-beta)?\b'],
+        DiagramType.XYCHART: [r'xychart(?:-beta)?\b'],
+        DiagramType.BLOCK: [r'block(?:-beta)?\b'],
+        DiagramType.PACKET: [r'packet(?:-beta)?\b'],
+        DiagramType.KANBAN: [r'kanban\b'],
+        DiagramType.ARCHITECTURE: [r'architecture(?:-beta)?\b'],
+        DiagramType.RADAR: [r'radar(?:-beta)?\b'],
+        DiagramType.TREEMAP: [r'treemap(?:-beta)?\b'],
+        DiagramType.ZENUML: [r'zenuml\b'],
     }
 
-    def __init__(self, troubleshooting_path: Optional[Path] = None):
+    # Everything mermaid allows before the type keyword: a YAML front-matter
+    # block, %%{init}%% directives and %% comments. Whitespace is consumed by
+    # one \s* per item and every item starts with a fixed token, so no two
+    # quantifiers compete for the same characters; a comment runs to the end
+    # of its line and a directive cannot run past its own '}%%'. Without that,
+    # a line of '%' or a run of blank lines with no keyword after backtracks
+    # quadratically or worse.
+    DIAGRAM_PREAMBLE = (
+        r'\s*(?:---[ \t]*\r?\n.*?\n[ \t]*---[ \t]*(?:\r?\n|\Z)\s*)?'
+        r'(?:(?:%%\{(?:(?!\}%%).)*\}%%|%%(?!\{)[^\n]*(?:\n|\Z))\s*)*'
+    )
+
+    # Single precompiled pattern: skips the preamble and matches the type
+    # keyword in one pass, stopping at the first significant line. Each type
+    # is a named group so ``match.lastgroup`` maps straight back to the enum.
+    DIAGRAM_TYPE_RE = re.compile(
+        DIAGRAM_PREAMBLE + '(?:' + '|'.join(
+            f"(?P<{diagram_type.name}>{'|'.join(patterns)})"
+            for diagram_type, patterns in DIAGRAM_TYPE_PATTERNS.items()
+        ) + ')',
+        re.IGNORECASE | re.DOTALL
+    )
+
+    BACKGROUND = 'transparent'
+    MMDC_MISSING = "mmdc not found. Install with: npm install -g @mermaid-js/mermaid-cli"
+
+    def __init__(
+        self,
+        troubleshooting_path: Optional[Path] = None,
+        engine: str = 'mmdc',
+        fix_cache: Optional[FixCache] = None
+    ):
         """
         Initialize generator.
 
         Args:
             troubleshooting_path: Path to troubleshooting.md guide (auto-detected if not provided)
+            engine: 'mmdc' to spawn mermaid-cli per render, 'browser' to render
+                in the shared headless browser (render_engine.py)
+            fix_cache: Error signature cache (default: in memory for this generator)
         """
+        self.engine = engine
         self.troubleshooting_path = troubleshooting_path or self._find_troubleshooting_guide()
         self.troubleshooting = TroubleshootingParser(self.troubleshooting_path) if self.troubleshooting_path else None
+        self.guide_hash = ArtifactWriter.file_hash(self.troubleshooting_path) if self.troubleshooting_path else None
+        self.fix_cache = fix_cache if fix_cache is not None else FixCache(None)
+        self.repairer = DiagramRepairer()
+        self.writer = ArtifactWriter()
 
     def _find_troubleshooting_guide(self) -> Optional[Path]:
         """Find troubleshooting.md relative to script location."""
@@ -310,27 +923,19 @@ class ResilientDiagramGenerator:
         """
         Detect diagram type from Mermaid code.
 
+        Skips front-matter, %%{init}%% directives and comments, then matches
+        the first significant line against every known type in one pass.
+
         Args:
             mermaid_code: Raw Mermaid diagram code
 
         Returns:
             DiagramType enum value
         """
-        # Get first non-empty, non-comment line
-        lines = mermaid_code.strip().split('\n')
-        first_line = ""
-        for line in lines:
-            stripped = line.strip()
-            if stripped and not stripped.startswith('%%'):
-                first_line = stripped
-                break
-
-        for diagram_type, patterns in self.DIAGRAM_TYPE_PATTERNS.items():
-            for pattern in patterns:
-                if re.match(pattern, first_line, re.IGNORECASE):
-                    return diagram_type
-
-        return DiagramType.UNKNOWN
+        match = self.DIAGRAM_TYPE_RE.match(mermaid_code)
+        if match is None:
+            return DiagramType.UNKNOWN
+        return DiagramType[match.lastgroup]
 
     def generate_filename(
         self,
@@ -373,6 +978,9 @@ class ResilientDiagramGenerator:
         """
         Save diagram to .mmd file.
 
+        The file is written atomically and left untouched if its content
+        is already identical.
+
         Args:
             mermaid_code: Mermaid diagram code
             output_dir: Directory for output files
@@ -384,7 +992,8 @@ class ResilientDiagramGenerator:
         output_dir.mkdir(parents=True, exist_ok=True)
 
         mmd_path = output_dir / f"{base_filename}.mmd"
-        mmd_path.write_text(mermaid_code.strip() + '\n', encoding='utf-8')
+        with tracer.span("write_mmd"):
+            self.writer.write_text(mmd_path, mermaid_code.strip() + '\n')
 
         return mmd_path
 
@@ -394,7 +1003,12 @@ class ResilientDiagramGenerator:
         image_format: str = "png"
     ) -> Tuple[bool, Optional[Path], Optional[str]]:
         """
-        Render diagram to image using mmdc.
+        Render diagram to image using mmdc or the shared browser engine.
+
+        Skips rendering when the image is already up to date for the same
+        canonical source (see diagram_canonical.py) and options. Otherwise
+        renders to a temp file and only replaces the existing image if the
+        output differs.
 
         Args:
             mmd_path: Path to .mmd file
@@ -404,49 +1018,193 @@ class ResilientDiagramGenerator:
             Tuple of (success, image_path, error_message)
         """
         image_path = mmd_path.with_suffix(f".{image_format}")
+        key = self._render_key(mmd_path, image_format)
+        if self.writer.is_up_to_date(image_path, key):
+            self.writer.skipped += 1
+            return True, image_path, None
 
         # Check mmdc is installed
-        if not self._check_mmdc_installed():
-            return False, None, "mmdc not found. Install with: npm install -g @mermaid-js/mermaid-cli"
+        if self.engine == 'mmdc' and not self._check_mmdc_installed():
+            return False, None, self.MMDC_MISSING
 
+        temp_path = self.writer.temp_path(image_path)
         try:
-            result = subprocess.run(
-                ['mmdc', '-i', str(mmd_path), '-o', str(image_path), '-b', 'transparent'],
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
+            if self.engine == 'browser':
+                data = render_engine.render(
+                    'mermaid',
+                    mmd_path.read_text(encoding='utf-8'),
+                    {'format': image_format, 'background': self.BACKGROUND}
+                )
+                temp_path.write_bytes(data)
+            else:
+                with tracer.span("mmdc", output=str(image_path)):
+                    result = subprocess.run(
+                        self._mmdc_command(mmd_path, temp_path),
+                        capture_output=True,
+                        text=True,
+                        timeout=60
+                    )
+
+                if result.returncode != 0:
+                    return False, None, self._mmdc_error(result)
+
+            return self._commit_image(temp_path, image_path, key)
 
-            if result.returncode != 0:
-                error_msg = result.stderr.strip() or result.stdout.strip() or "Unknown rendering error"
-                return False, None, error_msg
+        except subprocess.TimeoutExpired:
+            return False, None, "Rendering timed out after 60 seconds"
+        except render_engine.RenderError as e:
+            return False, None, str(e) or "Unknown rendering error"
+        except Exception as e:
+            return False, None, str(e)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
 
-            if not image_path.exists():
-                return False, None, f"Output file not created: {image_path}"
+    async def render_image_async(
+        self,
+        mmd_path: Path,
+        image_format: str = "png",
+        limit: Optional[asyncio.Semaphore] = None
+    ) -> Tuple[bool, Optional[Path], Optional[str]]:
+        """
+        Async render_image(): same contract, without blocking the event loop.
+
+        mmdc runs through render_engine.run_process() and is killed if the task
+        is cancelled; the browser engine renders in a page of the event loop's
+        shared AsyncRenderEngine. A cancelled render leaves the existing image
+        untouched and removes its temp file.
 
-            if image_path.stat().st_size == 0:
-                return False, None, f"Output file is empty: {image_path}"
+        Args:
+            mmd_path: Path to .mmd file
+            image_format: Output format (png, svg, pdf)
+            limit: Semaphore bounding concurrent mmdc processes
+                (default: render_engine.process_limit())
 
+        Returns:
+            Tuple of (success, image_path, error_message)
+        """
+        image_path = mmd_path.with_suffix(f".{image_format}")
+        key = self._render_key(mmd_path, image_format)
+        if self.writer.is_up_to_date(image_path, key):
+            self.writer.skipped += 1
             return True, image_path, None
 
+        # run_in_executor rather than asyncio.to_thread (3.9+); the copied context keeps the trace label
+        loop = asyncio.get_running_loop()
+        if self.engine == 'mmdc' and not await loop.run_in_executor(
+                None, contextvars.copy_context().run, self._check_mmdc_installed):
+            return False, None, self.MMDC_MISSING
+
+        temp_path = self.writer.temp_path(image_path)
+        try:
+            if self.engine == 'browser':
+                data = await render_engine.get_async_engine().render(
+                    'mermaid',
+                    mmd_path.read_text(encoding='utf-8'),
+                    {'format': image_format, 'background': self.BACKGROUND}
+                )
+                temp_path.write_bytes(data)
+            else:
+                with tracer.span("mmdc", output=str(image_path)):
+                    result = await render_engine.run_process(
+                        self._mmdc_command(mmd_path, temp_path), timeout=60, limit=limit
+                    )
+
+                if result.returncode != 0:
+                    return False, None, self._mmdc_error(result)
+
+            return self._commit_image(temp_path, image_path, key)
+
         except subprocess.TimeoutExpired:
             return False, None, "Rendering timed out after 60 seconds"
+        except render_engine.RenderError as e:
+            return False, None, str(e) or "Unknown rendering error"
         except Exception as e:
             return False, None, str(e)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+    def _render_key(self, mmd_path: Path, image_format: str) -> str:
+        return self.writer.render_key(
+            canonical_mermaid(mmd_path.read_text(encoding='utf-8')).encode('utf-8'),
+            format=image_format, background=self.BACKGROUND, engine=self.engine
+        )
+
+    def _mmdc_command(self, mmd_path: Path, output_path: Path) -> List[str]:
+        return ['mmdc', '-i', str(mmd_path), '-o', str(output_path), '-b', self.BACKGROUND]
+
+    @staticmethod
+    def _mmdc_error(result: subprocess.CompletedProcess) -> str:
+        return result.stderr.strip() or result.stdout.strip() or "Unknown rendering error"
+
+    def _commit_image(
+        self,
+        temp_path: Path,
+        image_path: Path,
+        key: str
+    ) -> Tuple[bool, Optional[Path], Optional[str]]:
+        """Check a rendered temp file and move it into place."""
+        if not temp_path.exists():
+            return False, None, f"Output file not created: {image_path}"
+
+        if temp_path.stat().st_size == 0:
+            return False, None, f"Output file is empty: {image_path}"
+
+        with tracer.span("write_image"):
+            self.writer.commit(temp_path, image_path)
+            self.writer.record(image_path, key)
+        return True, image_path, None
 
     @staticmethod
     def _check_mmdc_installed() -> bool:
         """Check if mermaid-cli (mmdc) is installed."""
         try:
-            result = subprocess.run(
-                ['mmdc', '--version'],
-                capture_output=True,
-                timeout=5
-            )
+            with tracer.span("mmdc_version_check"):
+                result = subprocess.run(
+                    ['mmdc', '--version'],
+                    capture_output=True,
+                    timeout=5
+                )
             return result.returncode == 0
         except (FileNotFoundError, subprocess.TimeoutExpired):
             return False
 
+    def troubleshoot(
+        self,
+        error_message: str,
+        diagram_type: DiagramType
+    ) -> Tuple[str, List[TroubleshootingMatch], bool]:
+        """
+        Troubleshooting matches for an error, ranked by the fixes that worked before.
+
+        Errors with a known signature reuse the cached matches instead of
+        searching the guide.
+
+        Returns:
+            Tuple of (error signature, ranked matches, whether the error was seen before)
+        """
+        signature = error_signature(error_message)
+        if not signature:
+            # No error text to key on: search the guide and leave the cache alone
+            if not self.troubleshooting:
+                return signature, [], False
+            return signature, self.troubleshooting.search(error_message, diagram_type), False
+        known = self.fix_cache.seen(signature, diagram_type) > 0
+        self.fix_cache.hit(signature, diagram_type)
+        if not self.troubleshooting:
+            return signature, [], known
+
+        by_number = {entry.error_number: entry for entry in self.troubleshooting.entries}
+        numbers = self.fix_cache.matches(signature, diagram_type, self.guide_hash)
+        if numbers is None or any(number not in by_number for number in numbers):
+            with tracer.span("troubleshooting_search"):
+                numbers = [match.error_number for match in self.troubleshooting.search(error_message, diagram_type)]
+            self.fix_cache.store(signature, diagram_type, self.guide_hash, numbers)
+
+        ranked = self.fix_cache.rank(signature, diagram_type, numbers)
+        return signature, [by_number[number] for number in ranked if number in by_number], known
+
     def get_search_recommendation(
         self,
         error_message: str,
@@ -477,7 +1235,9 @@ class ResilientDiagramGenerator:
         diagram_num: int,
         title: str,
         output_dir: Path,
-        image_format: str = "png"
+        image_format: str = "png",
+        auto_repair: bool = False,
+        max_repair_attempts: int = 3
     ) -> DiagramResult:
         """
         Execute full resilient generation workflow.
@@ -489,12 +1249,17 @@ class ResilientDiagramGenerator:
             title: Diagram title
             output_dir: Output directory
             image_format: png, svg, or pdf
+            auto_repair: Apply rule-based fixes and re-render on failure
+            max_repair_attempts: Maximum number of fix-and-retry rounds
 
         Returns:
             DiagramResult with full status and error recovery info
         """
+        written_before, skipped_before = self.writer.written, self.writer.skipped
+
         # Step 1: Detect diagram type
-        diagram_type = self.detect_diagram_type(mermaid_code)
+        with tracer.span("detect_type"):
+            diagram_type = self.detect_diagram_type(mermaid_code)
 
         # Step 2: Generate filename
         base_filename = self.generate_filename(
@@ -507,21 +1272,82 @@ class ResilientDiagramGenerator:
         # Step 4: Render image
         success, image_path, error_message = self.render_image(mmd_path, image_format)
 
+        # One troubleshooting lookup (and fix cache count) per distinct error
+        troubleshot: Dict[str, Tuple[str, List[TroubleshootingMatch], bool]] = {}
+
+        def troubleshoot(message: str) -> Tuple[str, List[TroubleshootingMatch], bool]:
+            if message not in troubleshot:
+                troubleshot[message] = self.troubleshoot(message, diagram_type)
+            return troubleshot[message]
+
+        # Step 4b: Optionally apply rule-based fixes and re-render
+        repaired_code = mermaid_code
+        applied_fixes = []
+        repair_attempts = 0
+        if auto_repair:
+            while not success and repair_attempts < max_repair_attempts:
+                signature, preferred = None, []
+                if error_message:
+                    signature, found, _ = troubleshoot(error_message)
+                    preferred = [match.error_number for match in found]
+                    if not self.troubleshooting:
+                        # No guide, but fixes that worked for this error before still count
+                        preferred = self.fix_cache.rank(signature, diagram_type, [])
+
+                with tracer.span("repair"):
+                    candidate, rules = self.repairer.repair(repaired_code, diagram_type, preferred)
+                if not rules:
+                    break
+
+                repair_attempts += 1
+                repaired_code = candidate
+                applied_fixes.extend(
+                    {"attempt": repair_attempts, "error_number": rule.error_numbers[0], "title": rule.title}
+                    for rule in rules
+                )
+                self.save_mmd_file(repaired_code, output_dir, base_filename)
+                success, image_path, error_message = self.render_image(mmd_path, image_format)
+                if signature:
+                    # Learn which fixes resolve this error
+                    self.fix_cache.record(signature, diagram_type,
+                                          [number for rule in rules for number in rule.error_numbers], success)
+
+            # Keep the original source when the repairs did not help
+            if applied_fixes and not success:
+                self.save_mmd_file(mermaid_code, output_dir, base_filename)
+
+        repair_diff = None
+        if applied_fixes:
+            repair_diff = ''.join(difflib.unified_diff(
+                (mermaid_code.strip() + '\n').splitlines(keepends=True),
+                (repaired_code.strip() + '\n').splitlines(keepends=True),
+                fromfile=f"a/{mmd_path.name}",
+                tofile=f"b/{mmd_path.name}"
+            ))
+
         if success:
+            self.fix_cache.save()
             return DiagramResult(
                 success=True,
                 mmd_path=str(mmd_path),
                 image_path=str(image_path),
                 diagram_type=diagram_type.value,
-                error_message=None
+                error_message=None,
+                repair_attempts=repair_attempts,
+                applied_fixes=applied_fixes,
+                repair_diff=repair_diff,
+                artifacts_written=self.writer.written - written_before,
+                artifacts_skipped=self.writer.skipped - skipped_before
             )
 
-        # Step 5: On error, search troubleshooting guide
+        # Step 5: On error, search troubleshooting guide (or reuse what this error matched before)
         matches = []
         suggested_fix = None
+        signature = None
+        known = False
 
-        if self.troubleshooting and error_message:
-            found_matches = self.troubleshooting.search(error_message, diagram_type)
+        if error_message:
+            signature, found_matches, known = troubleshoot(error_message)
             matches = [m.to_dict() for m in found_matches]
 
             if found_matches:
@@ -535,6 +1361,7 @@ class ResilientDiagramGenerator:
         if not matches or (matches and matches[0].get('error_number', 0) == 0):
             search_rec = self.get_search_recommendation(error_message, diagram_type)
 
+        self.fix_cache.save()
         return DiagramResult(
             success=False,
             mmd_path=str(mmd_path),
@@ -543,7 +1370,14 @@ class ResilientDiagramGenerator:
             error_message=error_message,
             troubleshooting_matches=matches,
             suggested_fix=suggested_fix,
-            search_recommendation=search_rec
+            search_recommendation=search_rec,
+            repair_attempts=repair_attempts,
+            applied_fixes=applied_fixes,
+            repair_diff=repair_diff,
+            artifacts_written=self.writer.written - written_before,
+            artifacts_skipped=self.writer.skipped - skipped_before,
+            error_signature=signature,
+            known_error=known
         )
 
 
@@ -584,6 +1418,17 @@ Error Recovery:
      - brave_web_search MCP (secondary)
      - gemini skill (tertiary)
      - WebSearch tool (fallback)
+
+  With --auto-repair, rule-based fixes derived from troubleshooting.md
+  (quoting labels, renaming reserved ids, normalizing arrows, ...) are
+  applied and the diagram is re-rendered, up to --max-repair-attempts
+  times. The applied diff is reported in the result.
+
+  Errors are normalized to a signature (no line numbers, node ids or
+  paths). The fix cache remembers each signature's troubleshooting
+  matches per diagram type and which fixes made the re-render succeed,
+  so a recurring error skips the search and gets the fixes that worked
+  first. Use --no-fix-cache to disable it.
         """
     )
 
@@ -605,15 +1450,32 @@ Error Recovery:
     parser.add_argument('--format', '-f', choices=['png', 'svg', 'pdf'], default='png',
                         help='Image format (default: png)')
 
+    # Error recovery
+    parser.add_argument('--auto-repair', action='store_true',
+                        help='Apply rule-based fixes from troubleshooting.md and re-render on failure')
+    parser.add_argument('--max-repair-attempts', type=int, default=3,
+                        help='Maximum fix-and-retry rounds with --auto-repair (default: 3)')
+
     # Output format
     parser.add_argument('--json', '-j', action='store_true',
                         help='Output result as JSON (recommended for programmatic use)')
 
+    # Renderer
+    parser.add_argument('--engine', '-e', choices=['mmdc', 'browser'], default='mmdc',
+                        help='Renderer: mmdc per render, or one shared headless browser (default: mmdc)')
+
     # Troubleshooting guide override
     parser.add_argument('--troubleshooting', type=Path,
                         help='Path to troubleshooting.md (auto-detected if not specified)')
+    parser.add_argument('--fix-cache', type=Path, default=DEFAULT_FIX_CACHE,
+                        help=f'Error signature cache of matches and fixes that worked (default: {DEFAULT_FIX_CACHE})')
+    parser.add_argument('--no-fix-cache', action='store_true',
+                        help='Do not read or update the fix cache')
+
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
+    configure_profiling(args)
 
     # Get mermaid code from input source
     if args.code:
@@ -631,17 +1493,24 @@ Error Recovery:
         sys.exit(1)
 
     # Initialize generator
-    generator = ResilientDiagramGenerator(troubleshooting_path=args.troubleshooting)
+    generator = ResilientDiagramGenerator(
+        troubleshooting_path=args.troubleshooting,
+        engine=args.engine,
+        fix_cache=FixCache(None if args.no_fix_cache else args.fix_cache)
+    )
 
     # Generate diagram
-    result = generator.generate(
-        mermaid_code=mermaid_code,
-        markdown_file=args.markdown_file,
-        diagram_num=args.diagram_num,
-        title=args.title,
-        output_dir=args.output_dir,
-        image_format=args.format
-    )
+    with tracer.diagram(f"{args.markdown_file}#{args.diagram_num}"):
+        result = generator.generate(
+            mermaid_code=mermaid_code,
+            markdown_file=args.markdown_file,
+            diagram_num=args.diagram_num,
+            title=args.title,
+            output_dir=args.output_dir,
+            image_format=args.format,
+            auto_repair=args.auto_repair,
+            max_repair_attempts=args.max_repair_attempts
+        )
 
     # Output result
     if args.json:
@@ -652,10 +1521,24 @@ Error Recovery:
             print(f"  MMD file:   {result.mmd_path}")
             print(f"  Image file: {result.image_path}")
             print(f"  Type:       {result.diagram_type}")
+            print(f"  Artifacts:  {result.artifacts_written} written, {result.artifacts_skipped} unchanged")
+            if result.applied_fixes:
+                print(f"\nAuto-repaired in {result.repair_attempts} attempt(s):")
+                for fix in result.applied_fixes:
+                    print(f"  - Error {fix['error_number']}: {fix['title']}")
+                print()
+                print(result.repair_diff)
         else:
             print(f"FAILED: {result.error_message}", file=sys.stderr)
             print(f"  MMD file: {result.mmd_path}")
             print(f"  Type:     {result.diagram_type}")
+            if result.known_error and result.error_signature:
+                print(f"  Known error, suggestions ranked by past fixes: {result.error_signature.splitlines()[0]}")
+
+            if result.applied_fixes:
+                print(f"\nAuto-repair tried {result.repair_attempts} attempt(s) without success:")
+                for fix in result.applied_fixes:
+                    print(f"  - Error {fix['error_number']}: {fix['title']}")
 
             if result.troubleshooting_matches:
                 print(f"\nTroubleshooting matches found ({len(result.troubleshooting_matches)}):")
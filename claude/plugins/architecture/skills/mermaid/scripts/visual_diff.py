@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Visual-diff gate: keep an existing PNG when a re-render looks the same.
+
+Re-rendering an unchanged (or trivially changed) diagram rarely gives the
+same bytes: deflate settings, timestamps and antialiasing differ from run
+to run, so every render churns git and invalidates CDN caches. The gate
+compares a fresh render with the image on disk and only replaces it when
+the pixels really changed:
+
+1. identical bytes: kept
+2. with NumPy and Pillow: both images are decoded and diffed in one
+   vectorized pass. Colors are weighted by alpha (two fully transparent
+   pixels always match); a pixel counts as changed when a channel differs
+   by more than the tolerance (default 16 of 255, above antialiasing
+   jitter). Images with no changed pixels (or at most --diff-max-changed
+   of them, as a fraction) are visually identical. Real changes can leave
+   a heatmap: the new image faded to gray, changed pixels in red
+3. without them: the decompressed and unfiltered pixel data (IDAT) and
+   the header, palette and transparency chunks are compared exactly, which
+   still catches re-encodes that only differ in compression, scanline
+   filters or metadata (interlaced PNGs always count as changed)
+
+SVG and PDF outputs are compared byte for byte (see ArtifactWriter.commit).
+
+Usage:
+    # Compare two renders; exit status 1 if they differ visually
+    python visual_diff.py old.png new.png --heatmap diff.png
+
+    # From another script
+    from visual_diff import VisualGate
+
+    gate = VisualGate(heatmap_dir=Path('diffs'))
+    gate.commit(temp_path, image_path)   # False: the old image was kept
+
+    # As part of a render (on by default, --no-visual-diff to turn off)
+    python mermaid_to_image.py diagrams/ output/ --diff-dir diffs/
+    python build_diagrams.py docs/ --output build/ --diff-dir diffs/
+
+Requirements:
+    - Python 3.7+ (exact pixel-data comparison is stdlib only)
+    - Optional: numpy and Pillow, for the tolerant diff and heatmaps
+"""
+
+import argparse
+import io
+import json
+import os
+import struct
+import sys
+import threading
+import zlib
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple
+
+from diagram_trace import tracer
+from resilient_diagram import ArtifactWriter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+# Per-channel difference (0-255) still counted as the same pixel
+DEFAULT_TOLERANCE = 16
+
+# Fraction of pixels allowed over the tolerance in a visually identical image
+DEFAULT_MAX_CHANGED = 0.0
+
+HEATMAP_SUFFIX = '.diff.png'
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Chunks that, with the decompressed IDAT, determine the pixels
+PNG_PIXEL_CHUNKS = (b'IHDR', b'PLTE', b'tRNS')
+
+# Samples per pixel of each PNG color type
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+@dataclass
+class VisualDiff:
+    """Outcome of comparing two renders of one image."""
+    identical: bool
+    method: str
+    changed_pixels: int = 0
+    total_pixels: int = 0
+    max_delta: int = 0
+    heatmap: Optional[Path] = None
+
+    @property
+    def changed_fraction(self) -> float:
+        return self.changed_pixels / self.total_pixels if self.total_pixels else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['heatmap'] = str(self.heatmap) if self.heatmap else None
+        data['changed_fraction'] = round(self.changed_fraction, 6)
+        return data
+
+
+def png_pixel_data(data: bytes) -> Optional[bytes]:
+    """
+    Header, palette, transparency and decompressed, unfiltered image data of a PNG.
+
+    Two PNGs with equal pixel data show the same pixels, however they were
+    compressed and filtered and whatever metadata they carry.
+
+    Returns:
+        Bytes to compare, or None if data is not a readable, non-interlaced PNG
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        return None
+    header = None
+    kept = []
+    idat = []
+    position = len(PNG_SIGNATURE)
+    while position + 8 <= len(data):
+        length, kind = struct.unpack('>I4s', data[position:position + 8])
+        body = data[position + 8:position + 8 + length]
+        if kind == b'IDAT':
+            idat.append(body)
+        elif kind in PNG_PIXEL_CHUNKS:
+            kept.append(kind + body)
+            if kind == b'IHDR' and len(body) == 13:
+                header = struct.unpack('>IIBBBBB', body)
+        elif kind == b'IEND':
+            break
+        position += length + 12
+    if header is None:
+        return None
+    width, height, bit_depth, color_type, _, _, interlace = header
+    if interlace or color_type not in PNG_CHANNELS:
+        return None
+    try:
+        pixels = unfilter_scanlines(zlib.decompress(b''.join(idat)), width, height,
+                                    PNG_CHANNELS[color_type] * bit_depth)
+    except zlib.error:
+        return None
+    if pixels is None:
+        return None
+    return b'\0'.join(kept) + b'\0' + pixels
+
+
+def unfilter_scanlines(raw: bytes, width: int, height: int, bits_per_pixel: int) -> Optional[bytes]:
+    """
+    Undo the per-scanline filters (None, Sub, Up, Average, Paeth) of non-interlaced PNG data.
+
+    Args:
+        raw: Decompressed IDAT stream, one filter-type byte before each scanline
+        width: Image width in pixels
+        height: Image height in pixels
+        bits_per_pixel: Channels times bit depth
+
+    Returns:
+        The raw scanlines without filter bytes, or None if the data is malformed
+    """
+    stride = (width * bits_per_pixel + 7) // 8
+    if len(raw) < (stride + 1) * height:
+        return None
+    # Filters work on bytes: the left neighbor is one pixel (at least one byte) back
+    left = max(1, bits_per_pixel // 8)
+    out = bytearray()
+    prior = bytearray(stride)
+    for row in range(height):
+        start = row * (stride + 1)
+        kind = raw[start]
+        line = bytearray(raw[start + 1:start + 1 + stride])
+        if kind == 1:
+            for i in range(left, stride):
+                line[i] = (line[i] + line[i - left]) & 0xFF
+        elif kind == 2:
+            for i in range(stride):
+                line[i] = (line[i] + prior[i]) & 0xFF
+        elif kind == 3:
+            for i in range(stride):
+                a = line[i - left] if i >= left else 0
+                line[i] = (line[i] + ((a + prior[i]) >> 1)) & 0xFF
+        elif kind == 4:
+            for i in range(stride):
+                a = line[i - left] if i >= left else 0
+                b = prior[i]
+                c = prior[i - left] if i >= left else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                predictor = a if pa <= pb and pa <= pc else b if pb <= pc else c
+                line[i] = (line[i] + predictor) & 0xFF
+        elif kind != 0:
+            return None
+        out += line
+        prior = line
+    return bytes(out)
+
+
+def decode_png(data: bytes) -> 'np.ndarray':
+    """RGBA pixels of a PNG as an (height, width, 4) uint8 array (needs numpy and Pillow)."""
+    with Image.open(io.BytesIO(data)) as image:
+        return np.asarray(image.convert('RGBA'))
+
+
+def _premultiplied(pixels: 'np.ndarray') -> 'np.ndarray':
+    """Alpha-weighted int32 copy of RGBA pixels (any leading shape)."""
+    weighted = pixels.astype(np.int32)
+    weighted[..., :3] = weighted[..., :3] * weighted[..., 3:] // 255
+    return weighted
+
+
+def _padded(pixels: 'np.ndarray', height: int, width: int) -> 'np.ndarray':
+    """RGBA pixels on a transparent height x width canvas."""
+    canvas = np.zeros((height, width, 4), dtype=np.uint8)
+    canvas[:pixels.shape[0], :pixels.shape[1]] = pixels
+    return canvas
+
+
+def pixel_delta(old: 'np.ndarray', new: 'np.ndarray') -> 'np.ndarray':
+    """
+    Largest per-channel difference of every pixel, as a (height, width) array.
+
+    Images of different sizes are compared on the larger canvas, so the
+    area only one of them covers counts as changed (when not transparent).
+    """
+    if old.shape != new.shape:
+        height = max(old.shape[0], new.shape[0])
+        width = max(old.shape[1], new.shape[1])
+        old, new = _padded(old, height, width), _padded(new, height, width)
+    # Only pixels whose raw bytes differ need the alpha-weighted comparison
+    differs = np.any(old != new, axis=2)
+    delta = np.zeros(differs.shape, dtype=np.int32)
+    if differs.any():
+        delta[differs] = np.abs(_premultiplied(old[differs]) - _premultiplied(new[differs])).max(axis=1)
+    return delta
+
+
+def heatmap(new: 'np.ndarray', delta: 'np.ndarray', tolerance: int) -> 'np.ndarray':
+    """
+    Heatmap of a diff: the new image faded to light gray, changed pixels in
+    red, darker the larger the difference.
+
+    Returns:
+        (height, width, 3) uint8 RGB array the size of delta
+    """
+    height, width = delta.shape
+    pixels = _premultiplied(_padded(new, height, width)).astype(np.float32)
+    # Luminance over white, faded so the red stands out
+    alpha = pixels[..., 3] / 255
+    luminance = pixels[..., 0] * 0.299 + pixels[..., 1] * 0.587 + pixels[..., 2] * 0.114 + 255 * (1 - alpha)
+    gray = 255 - (255 - luminance) * 0.25
+
+    image = np.repeat(gray[..., None], 3, axis=2)
+    changed = delta > tolerance
+    strength = np.clip(delta[changed].astype(np.float32) * 2, 96, 255)
+    image[changed] = np.stack([np.full_like(strength, 255), 255 - strength, 255 - strength], axis=1)
+    return image.astype(np.uint8)
+
+
+class VisualGate:
+    """
+    Replace a rendered PNG only when the new render looks different.
+
+    Thread-safe: batch renders share one gate, whose ``results`` list every
+    comparison as (path, VisualDiff).
+    """
+
+    def __init__(
+        self,
+        tolerance: int = DEFAULT_TOLERANCE,
+        max_changed: float = DEFAULT_MAX_CHANGED,
+        heatmap_dir: Optional[Path] = None
+    ):
+        """
+        Initialize the gate.
+
+        Args:
+            tolerance: Per-channel difference (0-255) still counted as the same pixel
+            max_changed: Fraction of pixels that may exceed the tolerance in a
+                visually identical image
+            heatmap_dir: Write <image name>.diff.png here for real changes
+                (needs numpy and Pillow); None writes no heatmaps
+        """
+        self.tolerance = tolerance
+        self.max_changed = max_changed
+        self.heatmap_dir = heatmap_dir
+        self.results: List[Tuple[Path, VisualDiff]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def tolerant(self) -> bool:
+        """True if the vectorized diff is available (numpy and Pillow installed)."""
+        return np is not None and Image is not None
+
+    def compare(self, old: bytes, new: bytes, name: str = 'image') -> VisualDiff:
+        """
+        Compare two PNG renders.
+
+        Args:
+            old: Existing PNG
+            new: Fresh PNG
+            name: Image name, for the heatmap file
+
+        Returns:
+            VisualDiff; images that cannot be decoded are never identical
+        """
+        if old == new:
+            return VisualDiff(True, 'bytes')
+        if not self.tolerant:
+            old_pixels, new_pixels = png_pixel_data(old), png_pixel_data(new)
+            identical = old_pixels is not None and old_pixels == new_pixels
+            return VisualDiff(identical, 'pixel-data' if old_pixels is not None else 'unreadable')
+
+        with tracer.span("visual_diff"):
+            try:
+                old_image, new_image = decode_png(old), decode_png(new)
+            except (OSError, ValueError):
+                return VisualDiff(False, 'unreadable')
+            delta = pixel_delta(old_image, new_image)
+            changed = int(np.count_nonzero(delta > self.tolerance))
+            same_size = old_image.shape == new_image.shape
+            diff = VisualDiff(
+                same_size and changed <= self.max_changed * delta.size,
+                'pixels' if same_size else 'size',
+                changed_pixels=changed,
+                total_pixels=int(delta.size),
+                max_delta=int(delta.max()) if delta.size else 0,
+            )
+            if not diff.identical and self.heatmap_dir is not None:
+                diff.heatmap = self.heatmap_dir / f"{name}{HEATMAP_SUFFIX}"
+                with tracer.span("heatmap"):
+                    self.heatmap_dir.mkdir(parents=True, exist_ok=True)
+                    buffer = io.BytesIO()
+                    Image.fromarray(heatmap(new_image, delta, self.tolerance), 'RGB').save(buffer, format='PNG')
+                    ArtifactWriter().write_bytes(diff.heatmap, buffer.getvalue())
+        return diff
+
+    @staticmethod
+    def applies(path: Path) -> bool:
+        """True if a render to ``path`` can be gated: an existing, non-empty PNG."""
+        return path.suffix.lower() == '.png' and path.is_file() and path.stat().st_size > 0
+
+    def commit(self, temp_path: Path, path: Path) -> bool:
+        """
+        Move a fresh render into place unless it looks the same as ``path``.
+
+        Like ArtifactWriter.commit(), which is used as is for other formats.
+
+        Returns:
+            True if ``path`` was replaced, False if the existing image was kept
+        """
+        if not self.applies(path):
+            return ArtifactWriter().commit(temp_path, path)
+
+        diff = self.compare(path.read_bytes(), temp_path.read_bytes(), path.stem)
+        with self._lock:
+            self.results.append((path, diff))
+        if diff.identical:
+            temp_path.unlink()
+            return False
+        os.replace(temp_path, path)
+        return True
+
+    def write_bytes(self, path: Path, data: bytes) -> bool:
+        """
+        Write a rendered image unless it looks the same as ``path``.
+
+        Returns:
+            True if ``path`` was written, False if the existing image was kept
+        """
+        temp_path = ArtifactWriter.temp_path(path)
+        try:
+            temp_path.write_bytes(data)
+            return self.commit(temp_path, path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+    def summary(self) -> Optional[str]:
+        """One line on the comparisons so far; None if there were none."""
+        if not self.results:
+            return None
+        kept = sum(1 for _, diff in self.results if diff.identical)
+        changed = len(self.results) - kept
+        summary = f"Visual diff: {kept} unchanged image(s) kept, {changed} changed"
+        heatmaps = sum(1 for _, diff in self.results if diff.heatmap)
+        if heatmaps:
+            summary += f" ({heatmaps} heatmap(s) in {self.heatmap_dir})"
+        if not self.tolerant:
+            summary += "; exact pixel comparison (install numpy and Pillow for a tolerant diff)"
+        return summary
+
+
+def add_visual_diff_arguments(parser: argparse.ArgumentParser):
+    """Add the --no-visual-diff, --diff-tolerance, --diff-max-changed and --diff-dir options."""
+    group = parser.add_argument_group('visual diff')
+    group.add_argument('--no-visual-diff', action='store_true',
+                       help='Always replace existing PNGs, even when the new render looks the same')
+    group.add_argument('--diff-tolerance', type=int, default=DEFAULT_TOLERANCE, metavar='N',
+                       help=f'Per-channel difference (0-255) still counted as the same pixel (default: {DEFAULT_TOLERANCE})')
+    group.add_argument('--diff-max-changed', type=float, default=DEFAULT_MAX_CHANGED, metavar='FRACTION',
+                       help='Fraction of pixels over the tolerance still counted as unchanged (default: 0)')
+    group.add_argument('--diff-dir', type=Path, metavar='DIR',
+                       help='Write a <name>.diff.png heatmap here for every changed image')
+
+
+def visual_gate_from_args(args: argparse.Namespace) -> Optional[VisualGate]:
+    """The VisualGate configured by add_visual_diff_arguments() options, or None if disabled."""
+    if args.no_visual_diff:
+        return None
+    return VisualGate(tolerance=args.diff_tolerance, max_changed=args.diff_max_changed, heatmap_dir=args.diff_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare two PNG renders the way the render visual-diff gate does',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Exit status 0 if the renders look the same, 1 if not
+  python visual_diff.py old.png new.png
+
+  # Heatmap of the changes, stricter tolerance
+  python visual_diff.py old.png new.png --heatmap diff.png --tolerance 4
+        """
+    )
+    parser.add_argument('old', type=Path, help='Existing PNG')
+    parser.add_argument('new', type=Path, help='New PNG')
+    parser.add_argument('--tolerance', type=int, default=DEFAULT_TOLERANCE,
+                        help=f'Per-channel difference still counted as the same pixel (default: {DEFAULT_TOLERANCE})')
+    parser.add_argument('--max-changed', type=float, default=DEFAULT_MAX_CHANGED,
+                        help='Fraction of pixels over the tolerance still counted as unchanged (default: 0)')
+    parser.add_argument('--heatmap', type=Path, help='Write a heatmap of the changes to this PNG')
+    parser.add_argument('--json', action='store_true', help='Print the comparison as JSON')
+    args = parser.parse_args()
+
+    try:
+        old, new = args.old.read_bytes(), args.new.read_bytes()
+    except OSError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    gate = VisualGate(args.tolerance, args.max_changed,
+                      heatmap_dir=args.heatmap.parent if args.heatmap else None)
+    if args.heatmap and not gate.tolerant:
+        print("⚠️  Heatmaps need numpy and Pillow (pip install numpy Pillow)", file=sys.stderr)
+    diff = gate.compare(old, new, args.new.stem)
+    if diff.heatmap and diff.heatmap != args.heatmap:
+        os.replace(diff.heatmap, args.heatmap)
+        diff.heatmap = args.heatmap
+
+    if args.json:
+        print(json.dumps(diff.to_dict(), indent=2))
+    elif diff.identical:
+        print(f"✅ Visually identical ({diff.method})")
+    elif diff.total_pixels:
+        print(f"❌ Changed ({diff.method}): {diff.changed_pixels:,} of {diff.total_pixels:,} pixel(s), "
+              f"max channel difference {diff.max_delta}")
+    else:
+        print(f"❌ Changed ({diff.method})")
+    if not args.json and not diff.identical and diff.heatmap:
+        print(f"   Heatmap: {diff.heatmap}")
+    sys.exit(0 if diff.identical else 1)
+
+
+if __name__ == '__main__':
+    main()